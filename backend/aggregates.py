@@ -0,0 +1,389 @@
+# Materialized dashboard views over the tourism CSVs in Data/.
+# Each view is a vectorized pandas rollup written once to AGGREGATE_CACHE_DIR as
+# compact JSON and rebuilt only when one of its source files changes.
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data"))
+AGGREGATE_CACHE_DIR = os.getenv("AGGREGATE_CACHE_DIR", "./aggregates")
+# Rows kept by the top-N views
+AGGREGATE_TOP_N = int(os.getenv("AGGREGATE_TOP_N", "10"))
+
+# Source name -> (file in DATA_DIR, read_csv dtypes); only the listed columns are read
+SOURCES = {
+    "tourism": ("tourism_dataset.csv", {
+        "Location": "string", "Country": "category", "Category": "category", "Visitors": "int64",
+        "Rating": "float64", "Revenue": "float64", "Accommodation_Available": "category",
+    }),
+    "monthly": ("Monthly Wise FFA FFE - processed.csv", {
+        "year": "int16", "month": "category", "month_num": "int8", "quarter": "int8",
+        "tourist_arrivals": "float64", "exchange_earnings": "float64", "period": "category",
+    }),
+    "states": ("top_10_states_combined.csv", {
+        "year": "int16", "rank": "int8", "state": "category", "visitors": "int64", "type": "category",
+        "period": "category",
+    }),
+    "age": ("yearwise_AgeDemographics.csv", {
+        "Year": "int16", "FTAs": "int64", "0-14": "float64", "15-24": "float64", "25-34": "float64",
+        "35-44": "float64", "45-54": "float64", "55-64": "float64", "65 and Above": "float64",
+        "Not Reported": "float64",
+    }),
+    "arrival_modes": ("yearwise_ArrivalModes.csv", {
+        "Year": "int16", "Arrivals": "int64", "Air": "float64", "Sea": "float64", "Land": "float64",
+    }),
+    "fee": ("yearwise_FEE_Rupee.csv", {"Year": "int16", "FEE_Rupee_Crore": "int64"}),
+    "gender": ("yearwise_GenderDemographics.csv", {
+        "Year": "int16", "Arrivals": "int64", "Male": "float64", "Female": "float64",
+        "OthersOrNotReported": "float64",
+    }),
+}
+
+# View name -> (source names, function of those frames returning a DataFrame)
+VIEWS: Dict[str, Tuple[Tuple[str, ...], Callable]] = {}
+
+def view(name: str, *sources: str):
+    """Register a materialized view computed from the given sources."""
+    def register(fn):
+        VIEWS[name] = (sources, fn)
+        return fn
+    return register
+
+def growth(values: pd.Series) -> pd.Series:
+    """Percentage change against the previous row, rounded for display."""
+    return (values.pct_change(fill_method=None) * 100).round(2)
+
+def _summarize_tourism(frame: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    grouped = frame.assign(accommodation=frame["Accommodation_Available"].eq("Yes")).groupby(keys, observed=True)
+    summary = grouped.agg(locations=("Location", "size"), visitors=("Visitors", "sum"),
+                          revenue=("Revenue", "sum"), rating=("Rating", "mean"),
+                          accommodation_share=("accommodation", "mean"))
+    summary["revenue"] = summary["revenue"].round(2)
+    summary[["rating", "accommodation_share"]] = summary[["rating", "accommodation_share"]].round(3)
+    return summary.sort_values("visitors", ascending=False).reset_index()
+
+@view("tourism_by_country", "tourism")
+def tourism_by_country(tourism):
+    return _summarize_tourism(tourism, ["Country"])
+
+@view("tourism_by_category", "tourism")
+def tourism_by_category(tourism):
+    return _summarize_tourism(tourism, ["Category"])
+
+@view("tourism_country_category", "tourism")
+def tourism_country_category(tourism):
+    return _summarize_tourism(tourism, ["Country", "Category"])
+
+@view("tourism_top_locations", "tourism")
+def tourism_top_locations(tourism):
+    top = tourism.nlargest(AGGREGATE_TOP_N, "Visitors")
+    return top[["Location", "Country", "Category", "Visitors", "Revenue", "Rating"]].reset_index(drop=True)
+
+@view("arrivals_by_year", "monthly")
+def arrivals_by_year(monthly):
+    yearly = monthly.groupby("year").agg(tourist_arrivals=("tourist_arrivals", "sum"),
+                                         exchange_earnings=("exchange_earnings", "sum"),
+                                         months=("month_num", "size"))
+    yearly["arrivals_growth"] = growth(yearly["tourist_arrivals"])
+    yearly["earnings_growth"] = growth(yearly["exchange_earnings"])
+    yearly["exchange_earnings"] = yearly["exchange_earnings"].round(3)
+    return yearly.reset_index()
+
+@view("arrivals_by_month", "monthly")
+def arrivals_by_month(monthly):
+    rows = monthly.sort_values(["year", "month_num"])[
+        ["year", "month_num", "month", "period", "tourist_arrivals", "exchange_earnings"]].reset_index(drop=True)
+    # Same month a year earlier, so seasonality does not show up as growth
+    by_month = rows.groupby("month_num")
+    rows["arrivals_growth"] = (by_month["tourist_arrivals"].pct_change(fill_method=None) * 100).round(2)
+    rows["earnings_growth"] = (by_month["exchange_earnings"].pct_change(fill_method=None) * 100).round(2)
+    return rows
+
+@view("arrivals_by_quarter", "monthly")
+def arrivals_by_quarter(monthly):
+    quarterly = monthly.groupby(["year", "quarter"]).agg(tourist_arrivals=("tourist_arrivals", "sum"),
+                                                         exchange_earnings=("exchange_earnings", "sum"))
+    quarterly["exchange_earnings"] = quarterly["exchange_earnings"].round(3)
+    return quarterly.reset_index()
+
+@view("states_by_year", "states")
+def states_by_year(states):
+    rows = states.sort_values(["type", "year", "rank"])[
+        ["year", "type", "rank", "state", "visitors", "period"]].reset_index(drop=True)
+    # Growth of each state against its own previous year in the list (NaN when it was not ranked)
+    ordered = rows.sort_values("year")
+    previous = ordered.groupby(["state", "type"], observed=True)
+    gap = previous["year"].diff()
+    rows["visitors_growth"] = (previous["visitors"].pct_change(fill_method=None) * 100).where(gap == 1).round(2)
+    return rows
+
+@view("top_states", "states")
+def top_states(states):
+    totals = states.groupby(["type", "state"], observed=True).agg(
+        visitors=("visitors", "sum"), years_ranked=("year", "nunique"), best_rank=("rank", "min"))
+    totals = totals.reset_index().sort_values(["type", "visitors"], ascending=[True, False])
+    return totals.groupby("type", observed=True).head(AGGREGATE_TOP_N).reset_index(drop=True)
+
+@view("yearwise", "age", "arrival_modes", "fee", "gender")
+def yearwise(age, arrival_modes, fee, gender):
+    frame = (arrival_modes.rename(columns={"Air": "air_share", "Sea": "sea_share", "Land": "land_share"})
+             .merge(fee, on="Year", how="outer")
+             .merge(gender.drop(columns="Arrivals").rename(columns={
+                 "Male": "male_share", "Female": "female_share", "OthersOrNotReported": "other_gender_share"}),
+                 on="Year", how="outer")
+             .merge(age.drop(columns="FTAs"), on="Year", how="outer")
+             .sort_values("Year").reset_index(drop=True))
+    frame["arrivals_growth"] = growth(frame["Arrivals"])
+    frame["fee_growth"] = growth(frame["FEE_Rupee_Crore"])
+    leading = ["Year", "Arrivals", "arrivals_growth", "FEE_Rupee_Crore", "fee_growth"]
+    return frame[leading + [column for column in frame.columns if column not in leading]]
+
+def file_signature(path: str) -> Tuple[int, int]:
+    """(size, mtime_ns): the cheap check; content is only hashed when this changes."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def to_json(name: str, frame: pd.DataFrame) -> bytes:
+    """Serialize a view as {"view", "columns", "data"}: rows as arrays, no repeated keys."""
+    body = frame.to_json(orient="split", index=False, double_precision=6)
+    return ('{"view":' + json.dumps(name) + ',' + body[1:]).encode('utf-8')
+
+class AggregateStore:
+    """
+    Loads the Data/ CSVs into typed frames and serves the views in VIEWS as JSON bytes.
+
+    A built view is kept in memory and in cache_dir as <view>.json, next to
+    <view>.sources.json recording the size, mtime and SHA-256 of every
+    source file. A request re-stats the sources; only when a size or mtime
+    differs is the file hashed, and only when a hash differs is the view
+    recomputed. Touching a file without changing it therefore costs one
+    hash, not a rebuild.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR, cache_dir: str = AGGREGATE_CACHE_DIR):
+        """
+        Args:
+            data_dir: Directory holding the CSVs named in SOURCES
+            cache_dir: Directory for the materialized views
+        """
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+        self.builds = 0
+        # source -> (signature, frame)
+        self._frames: Dict[str, Tuple[Tuple[int, int], pd.DataFrame]] = {}
+        # view -> (source signatures, JSON bytes)
+        self._views: Dict[str, Tuple[Tuple, bytes]] = {}
+        # path -> (signature, sha256), so a file is hashed once per change
+        self._digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+    def source_path(self, source: str) -> str:
+        return os.path.join(self.data_dir, SOURCES[source][0])
+
+    def frame(self, source: str) -> pd.DataFrame:
+        """Typed frame of one source CSV, re-read only when the file changes."""
+        path = self.source_path(source)
+        signature = file_signature(path)
+        cached = self._frames.get(source)
+        if cached is None or cached[0] != signature:
+            dtypes = SOURCES[source][1]
+            frame = pd.read_csv(path, usecols=list(dtypes), dtype=dtypes)
+            self._frames[source] = cached = (signature, frame)
+        return cached[1]
+
+    def _digest(self, path: str, signature: Tuple[int, int]) -> str:
+        cached = self._digests.get(path)
+        if cached is None or cached[0] != signature:
+            self._digests[path] = cached = (signature, file_digest(path))
+        return cached[1]
+
+    def _paths(self, name: str) -> Tuple[str, str]:
+        return (os.path.join(self.cache_dir, f"{name}.json"),
+                os.path.join(self.cache_dir, f"{name}.sources.json"))
+
+    def _write(self, path: str, data: bytes) -> None:
+        # Written next to the target and renamed, so readers (server.js too) never see half a file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _load_materialized(self, name: str, signatures: Dict[str, Tuple[int, int]]) -> Optional[bytes]:
+        """The view from cache_dir if its recorded sources still match, else None."""
+        view_path, sources_path = self._paths(name)
+        try:
+            with open(sources_path, 'r', encoding='utf-8') as f:
+                recorded = json.load(f)["sources"]
+            with open(view_path, 'rb') as f:
+                data = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        touched = False
+        for path, signature in signatures.items():
+            entry = recorded.get(os.path.basename(path))
+            if entry is None:
+                return None
+            if (entry["size"], int(entry["mtime_ns"])) == signature:
+                continue
+            if entry["sha256"] != self._digest(path, signature):
+                return None
+            entry["size"], entry["mtime_ns"] = signature[0], str(signature[1])
+            touched = True
+        if touched:
+            self._write(sources_path, json.dumps({"sources": recorded}).encode('utf-8'))
+        return data
+
+    def build(self, name: str) -> bytes:
+        """Compute one view from the source frames and materialize it."""
+        sources, fn = VIEWS[name]
+        data = to_json(name, fn(*(self.frame(source) for source in sources)))
+        recorded = {}
+        for source in sources:
+            path = self.source_path(source)
+            signature = file_signature(path)
+            recorded[os.path.basename(path)] = {"size": signature[0], "mtime_ns": str(signature[1]),
+                                                "sha256": self._digest(path, signature)}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        view_path, sources_path = self._paths(name)
+        self._write(view_path, data)
+        self._write(sources_path, json.dumps({"sources": recorded, "built": time.time()}).encode('utf-8'))
+        self.builds += 1
+        return data
+
+    def get(self, name: str, force: bool = False) -> bytes:
+        """
+        JSON bytes of a view, rebuilt only if a source file's content changed.
+
+        Args:
+            name: A key of VIEWS
+            force: Rebuild even if the materialized view is current
+
+        Returns:
+            The view as compact JSON
+        """
+        if name not in VIEWS:
+            raise KeyError(f"Unknown view {name!r}, expected one of {', '.join(VIEWS)}")
+        paths = [self.source_path(source) for source in VIEWS[name][0]]
+        signatures = {path: file_signature(path) for path in paths}
+        key = tuple(signatures.values())
+        cached = self._views.get(name)
+        if not force and cached is not None and cached[0] == key:
+            return cached[1]
+        data = None if force else self._load_materialized(name, signatures)
+        if data is None:
+            data = self.build(name)
+        self._views[name] = (key, data)
+        return data
+
+    def refresh(self, names: Optional[List[str]] = None, force: bool = False) -> Dict[str, bool]:
+        """Bring views up to date; returns view -> whether it was rebuilt."""
+        rebuilt = {}
+        for name in names or VIEWS:
+            before = self.builds
+            self.get(name, force=force)
+            rebuilt[name] = self.builds > before
+        return rebuilt
+
+def _raw_country_rollup(path: str) -> pd.DataFrame:
+    """What a view costs without the cache: parse the whole CSV and aggregate it."""
+    return tourism_by_country(pd.read_csv(path))
+
+def benchmark(sizes: List[int], repeats: int) -> List[Dict]:
+    """
+    Time tourism_by_country from raw CSV against the materialized view as tourism_dataset.csv grows.
+
+    The synthetic files resample the real rows, so each size has the same
+    countries and categories. "disk" is a fresh AggregateStore reading the
+    materialized view, as a new worker would; "memory" is a warm store.
+    """
+    seed = pd.read_csv(os.path.join(DATA_DIR, SOURCES["tourism"][0]))
+    rng = np.random.default_rng(0)
+    results = []
+    workdir = tempfile.mkdtemp(prefix="aggregates_benchmark_")
+    try:
+        data_dir, cache_dir = os.path.join(workdir, "data"), os.path.join(workdir, "cache")
+        os.makedirs(data_dir)
+        for size in sizes:
+            path = os.path.join(data_dir, SOURCES["tourism"][0])
+            seed.iloc[rng.integers(0, len(seed), size)].to_csv(path, index=False)
+
+            timings = {"raw": [], "build": [], "disk": [], "memory": []}
+            for _ in range(repeats):
+                start = time.perf_counter()
+                _raw_country_rollup(path)
+                timings["raw"].append(time.perf_counter() - start)
+
+                store = AggregateStore(data_dir, cache_dir)
+                start = time.perf_counter()
+                store.get("tourism_by_country", force=True)
+                timings["build"].append(time.perf_counter() - start)
+
+                fresh = AggregateStore(data_dir, cache_dir)
+                start = time.perf_counter()
+                fresh.get("tourism_by_country")
+                timings["disk"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                fresh.get("tourism_by_country")
+                timings["memory"].append(time.perf_counter() - start)
+            results.append({"rows": size, "csv_mb": os.path.getsize(path) / 2**20,
+                            **{f"{key}_ms": float(np.median(values)) * 1000 for key, values in timings.items()}})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialized aggregate views over the Data/ CSVs")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--cache-dir", default=AGGREGATE_CACHE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="List the views and their source files")
+    build = subparsers.add_parser("build", help="Rebuild views whose sources changed")
+    build.add_argument("views", nargs="*", help="Views to build (default: all)")
+    build.add_argument("--force", action="store_true", help="Rebuild even if current")
+    get = subparsers.add_parser("get", help="Print a view as JSON, building it if needed")
+    get.add_argument("view", choices=list(VIEWS))
+    bench = subparsers.add_parser("benchmark", help="Raw CSV aggregation vs materialized view by data size")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    bench.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+    store = AggregateStore(args.data_dir, args.cache_dir)
+    unknown = [name for name in getattr(args, "views", []) if name not in VIEWS]
+    if unknown:
+        parser.error(f"Unknown views {', '.join(unknown)}; see the list command")
+    if args.command == "list":
+        for name, (sources, _) in VIEWS.items():
+            print(f"{name:<26} {', '.join(SOURCES[source][0] for source in sources)}")
+    elif args.command == "build":
+        start = time.perf_counter()
+        rebuilt = store.refresh(args.views or None, force=args.force)
+        for name, was_rebuilt in rebuilt.items():
+            print(f"{name:<26} {'rebuilt' if was_rebuilt else 'current'}")
+        print(f"{sum(rebuilt.values())} of {len(rebuilt)} views rebuilt in {time.perf_counter() - start:.2f}s "
+              f"into {args.cache_dir}")
+    elif args.command == "get":
+        print(store.get(args.view).decode('utf-8'))
+    else:
+        print(f"{'rows':>10} {'csv MB':>8} {'raw ms':>10} {'build ms':>10} {'disk ms':>10} {'memory ms':>10}")
+        for r in benchmark(args.sizes, args.repeats):
+            print(f"{r['rows']:>10} {r['csv_mb']:>8.1f} {r['raw_ms']:>10.2f} {r['build_ms']:>10.2f} "
+                  f"{r['disk_ms']:>10.3f} {r['memory_ms']:>10.4f}")
+
+if __name__ == "__main__":
+    main()
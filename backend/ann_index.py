@@ -0,0 +1,237 @@
+import argparse
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+# Same file name FaissVectorStore.persist / from_persist_dir use inside ./storage
+VECTOR_STORE_FILE = "default__vector_store.json"
+
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw"]
+
+def default_nlist(n_vectors: int) -> int:
+    """Rule of thumb for the number of IVF lists: about 4 * sqrt(N), at least 1."""
+    return max(1, int(4 * math.sqrt(n_vectors)))
+
+def create_faiss_index(index_type: str,
+                       d: int,
+                       n_vectors: int,
+                       nlist: Optional[int] = None,
+                       nprobe: int = 16,
+                       pq_m: int = 64,
+                       pq_bits: int = 8,
+                       hnsw_m: int = 32,
+                       ef_construction: int = 200,
+                       ef_search: int = 64) -> faiss.Index:
+    """
+    Create an empty (untrained) FAISS index of the requested type.
+
+    Args:
+        index_type: One of "flat", "ivf_flat", "ivf_pq" or "hnsw"
+        d: Vector dimension
+        n_vectors: Number of vectors that will be added, used for the default nlist
+        nlist: Number of IVF lists
+        nprobe: Number of IVF lists searched per query
+        pq_m: Number of PQ sub-quantizers; must divide d
+        pq_bits: Bits per PQ sub-quantizer code
+        hnsw_m: Neighbours per HNSW node
+        ef_construction: HNSW candidate list size while building
+        ef_search: HNSW candidate list size while searching
+
+    Returns:
+        The FAISS index, with its search parameters set
+    """
+    nlist = nlist or default_nlist(n_vectors)
+    if index_type == "flat":
+        return faiss.IndexFlatL2(d)
+    if index_type == "ivf_flat":
+        index = faiss.index_factory(d, f"IVF{nlist},Flat")
+        index.nprobe = nprobe
+        return index
+    if index_type == "ivf_pq":
+        if d % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the vector dimension {d}")
+        index = faiss.index_factory(d, f"IVF{nlist},PQ{pq_m}x{pq_bits}")
+        index.nprobe = nprobe
+        return index
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        index.hnsw.efSearch = ef_search
+        return index
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+def build_faiss_index(vectors: np.ndarray, index_type: str, **params) -> faiss.Index:
+    """
+    Train (when needed) and fill an index of the requested type.
+
+    Vectors are added in order, so position i in the new index is the same
+    node as position i in the input. That keeps the index_store nodes_dict valid.
+
+    Args:
+        vectors: float32 matrix of shape (n, d)
+        index_type: One of INDEX_TYPES
+        **params: Passed to create_faiss_index
+
+    Returns:
+        The populated index
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = create_faiss_index(index_type, vectors.shape[1], len(vectors), **params)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+def load_vectors(persist_dir: str) -> np.ndarray:
+    """Read every stored vector back out of the FAISS index in persist_dir."""
+    index = faiss.read_index(os.path.join(persist_dir, VECTOR_STORE_FILE))
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def convert_storage(persist_dir: str, index_type: str, **params) -> faiss.Index:
+    """
+    Rebuild the FAISS index in persist_dir as a different index type, in place.
+
+    The docstore and index_store are untouched, so FaissVectorStore.from_persist_dir
+    and load_index_from_storage read the result exactly like the original flat index.
+    Convert from a full-precision index (flat, ivf_flat or hnsw): vectors read
+    back from IVF-PQ codes are only approximations.
+    """
+    vectors = load_vectors(persist_dir)
+    index = build_faiss_index(vectors, index_type, **params)
+    faiss.write_index(index, os.path.join(persist_dir, VECTOR_STORE_FILE))
+    print(f"Rebuilt {len(vectors)} vectors in {persist_dir} as {index_type}")
+    return index
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Override query-time search parameters on a loaded index, where they apply."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if nprobe is not None and ivf is not None:
+        ivf.nprobe = nprobe
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Size of the serialized index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
+
+def benchmark(vectors: np.ndarray,
+              queries: np.ndarray,
+              configs: List[Dict],
+              k: int = 10) -> List[Dict]:
+    """
+    Measure recall@k against the exact flat index, search latency and memory.
+
+    Args:
+        vectors: Corpus vectors, shape (n, d)
+        queries: Query vectors, shape (q, d)
+        configs: One dict per index to test, with "index_type" plus create_faiss_index params
+        k: Number of neighbours
+
+    Returns:
+        One result dict per config
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    flat = build_faiss_index(vectors, "flat")
+    _, truth = flat.search(queries, k)
+
+    results = []
+    for config in configs:
+        params = dict(config)
+        index_type = params.pop("index_type")
+        start = time.perf_counter()
+        index = build_faiss_index(vectors, index_type, **params)
+        build_seconds = time.perf_counter() - start
+
+        # One query at a time, the way the chat backend searches
+        latencies = []
+        found = np.empty_like(truth)
+        for i in range(len(queries)):
+            start = time.perf_counter()
+            _, found[i:i + 1] = index.search(queries[i:i + 1], k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+        results.append({
+            **config,
+            "recall_at_k": float(recall),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "memory_mb": index_memory_bytes(index) / 2**20,
+            "build_s": build_seconds,
+        })
+    return results
+
+def default_configs(args) -> List[Dict]:
+    nlist = args.nlist
+    return [
+        {"index_type": "flat"},
+        {"index_type": "ivf_flat", "nlist": nlist, "nprobe": args.nprobe},
+        {"index_type": "ivf_pq", "nlist": nlist, "nprobe": args.nprobe, "pq_m": args.pq_m, "pq_bits": args.pq_bits},
+        {"index_type": "hnsw", "hnsw_m": args.hnsw_m, "ef_search": args.ef_search},
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Build approximate FAISS indexes and benchmark them")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_index_args(p):
+        p.add_argument("--nlist", type=int, default=None, help="IVF lists (default 4*sqrt(N))")
+        p.add_argument("--nprobe", type=int, default=16, help="IVF lists searched per query")
+        p.add_argument("--pq-m", type=int, default=64, help="PQ sub-quantizers (must divide d)")
+        p.add_argument("--pq-bits", type=int, default=8, help="Bits per PQ code")
+        p.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbours per node")
+        p.add_argument("--ef-search", type=int, default=64, help="HNSW search candidate list size")
+
+    convert = subparsers.add_parser("convert", help="Rebuild ./storage with another index type")
+    convert.add_argument("--storage", default="./storage")
+    convert.add_argument("--type", choices=INDEX_TYPES, required=True)
+    add_index_args(convert)
+
+    bench = subparsers.add_parser("benchmark", help="Compare recall, latency and memory of index types")
+    bench.add_argument("--storage", default="./storage", help="Index to take vectors from")
+    bench.add_argument("--synthetic", type=int, default=None, help="Use N random vectors instead of --storage")
+    bench.add_argument("--dim", type=int, default=1536, help="Dimension of synthetic vectors")
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--output", default=None, help="Also write results to this JSON file")
+    add_index_args(bench)
+
+    args = parser.parse_args()
+    params = {
+        "nlist": args.nlist, "nprobe": args.nprobe, "pq_m": args.pq_m,
+        "pq_bits": args.pq_bits, "hnsw_m": args.hnsw_m, "ef_search": args.ef_search,
+    }
+
+    if args.command == "convert":
+        convert_storage(args.storage, args.type, **params)
+        return
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        vectors = rng.standard_normal((args.synthetic, args.dim), dtype=np.float32)
+    else:
+        vectors = load_vectors(args.storage)
+    # Queries are perturbed corpus vectors, so they have realistic near neighbours
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.01 * rng.standard_normal((len(picks), vectors.shape[1]), dtype=np.float32)
+
+    results = benchmark(vectors, queries, default_configs(args), k=args.k)
+    print(f"{len(vectors)} vectors, d={vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<10} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'MB':>9} {'build s':>8}")
+    for result in results:
+        print(f"{result['index_type']:<10} {result['recall_at_k']:>9.3f} {result['p50_ms']:>8.3f} "
+              f"{result['p99_ms']:>8.3f} {result['memory_mb']:>9.1f} {result['build_s']:>8.1f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+def storage_fingerprint(storage_dir: str) -> Tuple:
+    """
+    Return (relative path, size, mtime) for every file under the storage directory, used to detect re-indexing.
+
+    Subdirectories count too: shards and the lexical, metadata and geo
+    artifacts can be rebuilt without touching the top-level files.
+    """
+    path = Path(storage_dir)
+    if not path.exists():
+        return ()
+    fingerprint = []
+    for f in path.rglob("*"):
+        try:
+            if f.is_file():
+                stat = f.stat()
+                fingerprint.append((f.relative_to(path).as_posix(), stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            # Removed by a rebuild swapping files in while we walked
+            continue
+    return tuple(sorted(fingerprint))
+
+class AnswerCache:
+    """
+    Cache of finished recommendations keyed by query embedding and retrieved nodes.
+
+    A lookup is a hit when a previous query retrieved exactly the same node IDs
+    and its embedding has cosine similarity of at least similarity_threshold
+    with the new one. Entries expire after ttl_seconds, the least recently used
+    entry is dropped beyond max_size, and the whole cache is cleared when the
+    files under the storage directory change.
+    """
+
+    def __init__(self,
+                 storage_dir: str,
+                 similarity_threshold: float = 0.95,
+                 ttl_seconds: float = 3600,
+                 max_size: int = 1000):
+        """
+        Args:
+            storage_dir: Directory of the persisted index the answers were generated from
+            similarity_threshold: Minimum cosine similarity between query embeddings for a hit
+            ttl_seconds: Age after which an entry is no longer served
+            max_size: Maximum number of cached answers
+        """
+        self.storage_dir = storage_dir
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.next_id = 0
+        # entry id -> (node_key, unit embedding, answer, created)
+        self.entries = OrderedDict()
+        # node_key -> entry ids that retrieved exactly those nodes
+        self.by_nodes: Dict[Tuple[str, ...], List[int]] = {}
+        self.fingerprint = storage_fingerprint(storage_dir)
+
+    def clear(self):
+        """Drop every cached answer."""
+        self.entries.clear()
+        self.by_nodes.clear()
+
+    def _check_storage(self):
+        fingerprint = storage_fingerprint(self.storage_dir)
+        if fingerprint != self.fingerprint:
+            self.clear()
+            self.fingerprint = fingerprint
+
+    def _remove(self, entry_id: int):
+        node_key = self.entries.pop(entry_id)[0]
+        ids = self.by_nodes[node_key]
+        ids.remove(entry_id)
+        if not ids:
+            del self.by_nodes[node_key]
+
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, query_embedding: Sequence[float], node_ids: Sequence[str]) -> Optional[str]:
+        """
+        Look up a cached answer.
+
+        Args:
+            query_embedding: Embedding of the new query
+            node_ids: IDs of the nodes retrieved for the new query, in rank order
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        self._check_storage()
+        ids = self.by_nodes.get(tuple(node_ids), [])
+
+        now = time.time()
+        for entry_id in [i for i in ids if now - self.entries[i][3] > self.ttl_seconds]:
+            self._remove(entry_id)
+        ids = self.by_nodes.get(tuple(node_ids), [])
+        if not ids:
+            self.misses += 1
+            return None
+
+        candidates = np.stack([self.entries[i][1] for i in ids])
+        similarities = candidates @ self._unit(query_embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            self.misses += 1
+            return None
+
+        entry_id = ids[best]
+        self.entries.move_to_end(entry_id)
+        self.hits += 1
+        return self.entries[entry_id][2]
+
+    def put(self, query_embedding: Sequence[float], node_ids: Sequence[str], answer: str):
+        """Store an answer for a query embedding and its retrieved node IDs."""
+        self._check_storage()
+        node_key = tuple(node_ids)
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = (node_key, self._unit(query_embedding), answer, time.time())
+        self.by_nodes.setdefault(node_key, []).append(entry_id)
+        while len(self.entries) > self.max_size:
+            self._remove(next(iter(self.entries)))
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current number of entries."""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
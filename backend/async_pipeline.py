@@ -0,0 +1,398 @@
+# asyncio version of chat.query_vector_store, used by `chat.py --worker --async`:
+# async embedding and completion, retrieval off the event loop, per-stage
+# deadlines, cancellation of abandoned requests and hedged completions.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+
+import chat
+import telemetry
+
+# Per-stage deadlines in seconds; 0 turns a deadline off
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "5"))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "5"))
+COMPLETION_TIMEOUT = float(os.getenv("COMPLETION_TIMEOUT", "30"))
+
+# Send a second, hedged completion when the first has been running longer than
+# this percentile of recent completion latencies; 0 turns hedging off
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+
+class StageTimeout(TimeoutError):
+    """A pipeline stage ran past its deadline."""
+
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"{stage} timed out after {seconds:g}s")
+        self.stage = stage
+
+async def with_deadline(stage: str, awaitable: Awaitable, seconds: float):
+    """Await with a deadline, raising StageTimeout naming the stage; seconds=0 waits forever."""
+    if not seconds:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, seconds)
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage, seconds) from None
+
+class LatencyTracker:
+    """Sliding window of completion latencies, used to decide when to hedge."""
+
+    def __init__(self, window: int = HEDGE_WINDOW, percentile: float = HEDGE_PERCENTILE,
+                 min_samples: int = HEDGE_MIN_SAMPLES):
+        self.samples = deque(maxlen=window)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None until there are enough samples."""
+        if not self.percentile or len(self.samples) < self.min_samples:
+            return None
+        return float(np.percentile(self.samples, self.percentile))
+
+    def stats(self):
+        delay = self.hedge_delay()
+        return {
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedge_delay_ms': None if delay is None else delay * 1000,
+        }
+
+async def hedged(start: Callable[[], Awaitable], delay: Optional[float],
+                 discard: Optional[Callable] = None):
+    """
+    Run start(), and if it is still running after delay seconds, run it again.
+
+    The first call to succeed wins and the other is cancelled. A result
+    that finished but lost the race is passed to discard (e.g. to close a
+    stream). A failed call does not end the race while the other is running.
+
+    Args:
+        start: Coroutine factory for one request
+        delay: Seconds before the hedge is sent; None never hedges
+        discard: Called with the losing result, if any
+
+    Returns:
+        (result, hedge_sent, hedge_won) tuple
+    """
+    first = asyncio.ensure_future(start())
+    if delay is None:
+        return await first, False, False
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result(), False, False
+
+    second = asyncio.ensure_future(start())
+    pending = {first, second}
+    winner = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and winner is None:
+                    winner = task
+            if winner is not None:
+                return winner.result(), True, winner is second
+        # Both failed: report the original request's error
+        return first.result(), True, False
+    finally:
+        for task in (first, second):
+            if task is winner:
+                continue
+            if not task.done():
+                task.cancel()
+            elif discard is not None and not task.cancelled() and task.exception() is None:
+                discard(task.result())
+
+async def _open_stream(model, prompt: str):
+    """Start a streamed completion and wait for its first chunk."""
+    stream = await model.astream_complete(prompt)
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return first, stream
+
+def _close_stream(opened) -> None:
+    asyncio.ensure_future(opened[1].aclose())
+
+async def aquery_vector_store(query_str, top_k=4, index=None, model=None, embedding_cache=None, answer_cache=None,
+                              on_delta=None, filters=None, metadata_index=None, near=None, geo_index=None,
+                              latency_tracker=None):
+    """
+    Async query_vector_store with per-stage deadlines and hedged completions.
+
+    Retrieval (FAISS, lexical search) runs in a worker thread so the event
+    loop keeps serving other requests; if its deadline passes, the thread
+    finishes in the background and its result is dropped. Cancelling the
+    task stops the embedding and completion requests immediately.
+
+    Args:
+    - query_str, top_k, index, model, embedding_cache, answer_cache,
+      on_delta, filters, metadata_index, near, geo_index: See
+      chat.query_vector_store.
+    - latency_tracker (LatencyTracker, optional): Completion latencies shared
+      across requests; hedging is off without one.
+
+    Returns:
+    - str: The cleaned recommendation text.
+
+    Raises:
+    - StageTimeout: When embedding, retrieval or completion passes its deadline.
+    """
+    from llama_index.core import Settings
+
+    with telemetry.stage("recommendation", top_k=top_k, stream=on_delta is not None,
+                         filtered=bool(filters or near), mode="async") as request_span:
+        if index is None:
+            with telemetry.stage("storage_load", mmap=chat.STORAGE_MMAP):
+                index = await asyncio.to_thread(chat.load_index)
+        if model is None:
+            model = chat.load_llm()
+        if embedding_cache is None:
+            embedding_cache = chat.load_embedding_cache(embed_model=Settings.embed_model)
+
+        with telemetry.stage("embedding") as span:
+            query_embedding = embedding_cache.get(query_str)
+            span.set("cached", query_embedding is not None)
+            if query_embedding is None:
+                query_embedding = await with_deadline(
+                    "embedding", Settings.embed_model.aget_query_embedding(query_str), EMBED_TIMEOUT)
+                embedding_cache.put(query_str, query_embedding)
+
+        nodes = await with_deadline("retrieval", asyncio.to_thread(
+            chat.retrieve_nodes, query_str, query_embedding, index, top_k, filters, near, metadata_index, geo_index,
+        ), RETRIEVAL_TIMEOUT)
+        node_ids = [node.node.node_id for node in nodes]
+        if answer_cache is not None:
+            with telemetry.stage("answer_cache") as span:
+                cached_response = answer_cache.get(query_embedding, node_ids)
+                span.set("hit", cached_response is not None)
+            if cached_response is not None:
+                request_span.set("response_chars", len(cached_response))
+                if on_delta is not None:
+                    on_delta(cached_response)
+                return cached_response
+
+        with telemetry.stage("prompt", token_budget=chat.PROMPT_TOKEN_BUDGET) as span:
+            formatted_prompt, context = chat.build_prompt(query_str, nodes)
+            span.set("prompt_chars", len(formatted_prompt))
+            span.set("context_tokens", context.tokens)
+            span.set("packed_nodes", len(context.nodes))
+
+        delay = latency_tracker.hedge_delay() if latency_tracker is not None else None
+        with telemetry.stage("completion", stream=on_delta is not None) as span:
+            start = time.perf_counter()
+            if on_delta is None:
+                response, hedge_sent, hedge_won = await with_deadline("completion", hedged(
+                    lambda: model.acomplete(formatted_prompt), delay), COMPLETION_TIMEOUT)
+                cleaned_response = chat.clean_llm_output(response.text)
+                hedged_seconds = time.perf_counter() - start
+            else:
+                # Hedge on the first chunk; the deadline covers the whole stream
+                async def stream():
+                    (first, chunks), sent, won = await hedged(
+                        lambda: _open_stream(model, formatted_prompt), delay, discard=_close_stream)
+                    first_chunk_seconds = time.perf_counter() - start
+                    cleaner = chat.StreamingCleaner()
+                    try:
+                        if first is not None:
+                            cleaned = cleaner.feed(first.delta or "")
+                            if cleaned:
+                                on_delta(cleaned)
+                            async for response in chunks:
+                                cleaned = cleaner.feed(response.delta or "")
+                                if cleaned:
+                                    on_delta(cleaned)
+                    finally:
+                        await chunks.aclose()
+                    cleaned = cleaner.flush()
+                    if cleaned:
+                        on_delta(cleaned)
+                    return cleaner.text, sent, won, first_chunk_seconds
+
+                cleaned_response, hedge_sent, hedge_won, hedged_seconds = await with_deadline(
+                    "completion", stream(), COMPLETION_TIMEOUT)
+            span.set("hedged", hedge_sent)
+            span.set("hedge_won", hedge_won)
+            if latency_tracker is not None:
+                # The latency the hedge delay is compared with: the whole completion, or the first chunk of a stream
+                latency_tracker.record(hedged_seconds)
+                latency_tracker.requests += 1
+                latency_tracker.hedges += hedge_sent
+                latency_tracker.hedge_wins += hedge_won
+        request_span.set("response_chars", len(cleaned_response))
+        if answer_cache is not None:
+            answer_cache.put(query_embedding, node_ids, cleaned_response)
+
+        return cleaned_response
+
+async def serve(stdin=sys.stdin, stdout=sys.stdout):
+    """
+    The worker protocol of chat.run_worker, served concurrently.
+
+    Requests are handled as they arrive, so a worker can have several in
+    flight. A {"cancel": <id>} line cancels that request, which then gets
+    {"id": <id>, "error": "cancelled", "code": "cancelled"}. Deadline
+    failures are reported with "code": "timeout" and the "stage".
+    """
+    from llama_index.core import Settings
+
+    index = await asyncio.to_thread(chat.load_index)
+    model = chat.load_llm()
+    embedding_cache = chat.load_embedding_cache(embed_model=Settings.embed_model)
+    answer_cache = chat.load_answer_cache()
+    metadata_index = chat.load_metadata_index()
+    geo_index = chat.load_spatial_index()
+    latency_tracker = LatencyTracker()
+    tasks = {}
+
+    def respond(message):
+        stdout.write(json.dumps(message) + "\n")
+        stdout.flush()
+
+    async def handle(request):
+        request_id = request.get("id")
+        on_delta = None
+        if request.get("stream"):
+            on_delta = lambda delta: respond({"id": request_id, "delta": delta})
+        try:
+            with telemetry.trace_context(request.get("traceparent")):
+                result = await aquery_vector_store(
+                    request["query"],
+                    top_k=int(request.get("top_k", 4)),
+                    index=index,
+                    model=model,
+                    embedding_cache=embedding_cache,
+                    answer_cache=answer_cache,
+                    on_delta=on_delta,
+                    filters=request.get("filters"),
+                    metadata_index=metadata_index,
+                    near=request.get("near"),
+                    geo_index=geo_index,
+                    latency_tracker=latency_tracker,
+                )
+            respond({"id": request_id, "result": result})
+        except asyncio.CancelledError:
+            respond({"id": request_id, "error": "cancelled", "code": "cancelled"})
+        except StageTimeout as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            respond({"id": request_id, "error": str(e), "code": "timeout", "stage": e.stage})
+        except Exception as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            respond({"id": request_id, "error": str(e)})
+        finally:
+            tasks.pop(request_id, None)
+
+    respond({"ready": True})
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, stdin.readline)
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            respond({"id": None, "error": str(e)})
+            continue
+        if "cancel" in request:
+            task = tasks.get(request["cancel"])
+            if task is not None:
+                task.cancel()
+            continue
+        tasks[request.get("id")] = asyncio.ensure_future(handle(request))
+
+    if tasks:
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    print(f"Embedding cache stats: {embedding_cache.stats()}", file=sys.stderr)
+    print(f"Answer cache stats: {answer_cache.stats()}", file=sys.stderr)
+    print(f"Hedging stats: {latency_tracker.stats()}", file=sys.stderr)
+
+def run_async_worker(stdin=sys.stdin, stdout=sys.stdout):
+    """Entry point for `chat.py --worker --async`; see serve."""
+    # As in run_worker, stray library output must not reach the protocol stream
+    sys.stdout = sys.stderr
+    asyncio.run(serve(stdin, stdout))
+
+async def benchmark(requests: int, concurrency: int, hedge_percentile: float, latency_ms: float, jitter_ms: float,
+                    slow_probability: float, slow_ms: float, dim: int = 64) -> dict:
+    """
+    Completion latency percentiles with and without hedging, on FakeLLM with a slow tail.
+
+    Only the completion stage is exercised, on prompts of realistic size, so
+    the numbers show what hedging does to the tail by itself.
+    """
+    from local_models import FakeLLM
+
+    model = FakeLLM(latency_ms=latency_ms, jitter_ms=jitter_ms, slow_probability=slow_probability,
+                    slow_ms=slow_ms)
+    tracker = LatencyTracker(percentile=hedge_percentile)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = np.zeros(requests)
+
+    async def one(i):
+        async with semaphore:
+            prompt = chat.fill_prompt(f"query {i}", "context " * 200)
+            delay = tracker.hedge_delay()
+            start = time.perf_counter()
+            _, sent, won = await hedged(lambda: model.acomplete(prompt), delay)
+            elapsed = time.perf_counter() - start
+            tracker.record(elapsed)
+            tracker.requests += 1
+            tracker.hedges += sent
+            tracker.hedge_wins += won
+            latencies[i] = elapsed * 1000
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    # Skip the warm-up requests, which may have started before hedging could
+    measured = latencies[tracker.min_samples + concurrency:]
+    return {
+        "hedge_percentile": hedge_percentile,
+        "p50_ms": float(np.percentile(measured, 50)),
+        "p95_ms": float(np.percentile(measured, 95)),
+        "p99_ms": float(np.percentile(measured, 99)),
+        **tracker.stats(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Async query pipeline with deadlines and hedged completions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench = subparsers.add_parser("benchmark", help="Completion p50/p95/p99 with hedging off and on (FakeLLM)")
+    bench.add_argument("--requests", type=int, default=1000)
+    bench.add_argument("--concurrency", type=int, default=50)
+    bench.add_argument("--percentiles", type=float, nargs="+", default=[0, 90, 95],
+                       help="Hedge percentiles to compare; 0 is no hedging")
+    bench.add_argument("--latency-ms", type=float, default=800.0)
+    bench.add_argument("--jitter-ms", type=float, default=200.0)
+    bench.add_argument("--slow-probability", type=float, default=0.03, help="Share of calls in the slow tail")
+    bench.add_argument("--slow-ms", type=float, default=4000.0, help="Extra delay of a slow call")
+    args = parser.parse_args()
+
+    print(f"{'hedge at':>9} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'hedges':>8} {'wins':>6}")
+    for percentile in args.percentiles:
+        result = asyncio.run(benchmark(args.requests, args.concurrency, percentile, args.latency_ms,
+                                       args.jitter_ms, args.slow_probability, args.slow_ms))
+        label = f"p{percentile:g}" if percentile else "off"
+        print(f"{label:>9} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} "
+              f"{result['hedges']:>8} {result['hedge_wins']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+import chat
+
+def read_queries(path: str) -> Iterator[Dict]:
+    """
+    Read queries from a JSONL file.
+
+    Each line is either a JSON object with a "query" key (plus optional "id",
+    "top_k", "filters" and "near") or a bare JSON string. Lines without an id get their line number.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"query": record}
+            record.setdefault("id", line_number)
+            yield record
+
+def embed_queries(queries: List[str], embed_model, embedding_cache=None, batch_size: int = 100) -> np.ndarray:
+    """
+    Embed every query, sending cache misses to the model in batches.
+
+    text-embedding-3 models embed queries and documents with the same model,
+    so the batched text endpoint returns the same vectors as get_query_embedding.
+
+    Args:
+        queries: Query strings
+        embed_model: llama_index embedding model
+        embedding_cache: Optional EmbeddingCache; hits skip the model and misses are stored
+        batch_size: Number of texts per embedding request
+
+    Returns:
+        float32 matrix of shape (len(queries), d)
+    """
+    embeddings = [None] * len(queries)
+    if embedding_cache is not None:
+        embeddings = [embedding_cache.get(query) for query in queries]
+
+    # Embed each distinct missing query once
+    missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+    computed = {}
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        computed.update(zip(batch, embed_model.get_text_embedding_batch(batch)))
+    if embedding_cache is not None and computed:
+        embedding_cache.put_many(list(computed.items()))
+
+    embeddings = [e if e is not None else computed[q] for q, e in zip(queries, embeddings)]
+    return np.asarray(embeddings, dtype=np.float32)
+
+def search_batch(index, query_matrix: np.ndarray, top_k: int, queries: Optional[List[str]] = None) -> List[List]:
+    """
+    Run one FAISS search for the whole query matrix.
+
+    Works on the VectorStoreIndex, MmapIndex, HybridIndex and ShardedIndex
+    that chat.load_index returns, and scores nodes the same way their retrievers
+    do. A HybridIndex needs the query strings for its lexical side.
+
+    Returns:
+        For each query, its top_k NodeWithScore objects
+    """
+    from llama_index.core.schema import NodeWithScore
+    from lexical_index import HybridIndex, node_getter
+    from sharded_index import ShardedIndex
+
+    if isinstance(index, ShardedIndex):
+        # Each query routes to its own shards, so they are searched one by one
+        return [index.search(query, embedding.tolist(), top_k)
+                for query, embedding in zip(queries or [""] * len(query_matrix), query_matrix)]
+
+    hybrid_index = None
+    search_k = top_k
+    if isinstance(index, HybridIndex):
+        hybrid_index = index
+        index = hybrid_index.vector_index
+        search_k = hybrid_index.candidate_k(top_k)
+
+    query_matrix = np.ascontiguousarray(query_matrix, dtype=np.float32)
+    faiss_index = index.faiss_index if hasattr(index, "faiss_index") else index.vector_store.client
+    get_node = node_getter(index)
+
+    distances, positions = faiss_index.search(query_matrix, search_k)
+    results = [
+        [
+            NodeWithScore(node=get_node(int(position)), score=float(distance))
+            for distance, position in zip(row_distances, row_positions)
+            if position >= 0
+        ]
+        for row_distances, row_positions in zip(distances, positions)
+    ]
+    if hybrid_index is not None:
+        lexical_index = hybrid_index.lexical_index
+        results = [
+            hybrid_index.fuse(nodes, lexical_index.search(query, search_k), top_k)
+            for query, nodes in zip(queries, results)
+        ]
+    return results
+
+def run_batch(records: List[Dict],
+              index,
+              model,
+              embed_model,
+              output,
+              embedding_cache=None,
+              metadata_index=None,
+              geo_index=None,
+              top_k: int = 4,
+              concurrency: int = 8,
+              embed_batch_size: int = 100,
+              retrieve_only: bool = False) -> Dict[str, float]:
+    """
+    Answer a batch of queries and write one JSON line per query to output.
+
+    Queries are embedded in batches, searched with a single FAISS call and
+    then completed by the LLM with at most `concurrency` requests in flight.
+    Like chat.query_vector_store, each query retrieves chat.candidate_count
+    nodes and chat.build_prompt packs them, so prompts match the chat path;
+    queries with filters or near go through chat.retrieve_nodes instead of
+    the batched search; a record whose filter or near spec fails (e.g. an
+    unknown field or place) gets an "error" like a failed LLM call and the
+    rest of the batch goes on. Output lines keep the input order and carry
+    per-query timings in ms; embed_ms and search_ms are the batch stage time
+    divided over its queries, and node_ids are the nodes packed into the prompt.
+
+    Args:
+        records: Query records from read_queries
+        index: Loaded index from chat.load_index
+        model: LLM client from chat.load_llm (unused with retrieve_only)
+        embed_model: Embedding model
+        output: Text stream for the JSONL results
+        embedding_cache: Optional EmbeddingCache
+        metadata_index: MetadataIndex for records with a "filters" expression
+        geo_index: GeoIndex for records with a "near" spec
+        top_k: Default number of nodes per query, overridden by a record's "top_k"
+        concurrency: Maximum number of LLM requests in flight
+        embed_batch_size: Number of texts per embedding request
+        retrieve_only: Skip the LLM and only report retrieved node IDs
+
+    Returns:
+        Batch totals: query count, errors, seconds per stage and queries per second
+    """
+    start = time.perf_counter()
+    queries = [record["query"] for record in records]
+    if not queries:
+        return {"queries": 0, "errors": 0, "seconds": 0.0, "queries_per_second": 0.0}
+
+    query_matrix = embed_queries(queries, embed_model, embedding_cache, embed_batch_size)
+    embed_seconds = time.perf_counter() - start
+
+    search_start = time.perf_counter()
+    retrieve_ks = [chat.candidate_count(int(record.get("top_k", top_k))) for record in records]
+    results = [None] * len(records)
+    retrieve_errors = {}
+    # Filtered queries each need their own candidate set, so they are searched one by one
+    unfiltered = []
+    for i, record in enumerate(records):
+        if record.get("filters") or record.get("near"):
+            try:
+                results[i] = chat.retrieve_nodes(queries[i], query_matrix[i].tolist(), index,
+                                                 int(record.get("top_k", top_k)), record.get("filters"),
+                                                 record.get("near"), metadata_index, geo_index)
+            except Exception as e:
+                results[i] = []
+                retrieve_errors[i] = str(e)
+        else:
+            unfiltered.append(i)
+    if unfiltered:
+        batch_results = search_batch(index, query_matrix[unfiltered], max(retrieve_ks[i] for i in unfiltered),
+                                     [queries[i] for i in unfiltered])
+        for i, nodes in zip(unfiltered, batch_results):
+            results[i] = nodes[:retrieve_ks[i]]
+    search_seconds = time.perf_counter() - search_start
+
+    embed_ms = embed_seconds * 1000 / len(queries)
+    search_ms = search_seconds * 1000 / len(queries)
+
+    prompts = [chat.build_prompt(query, nodes) for query, nodes in zip(queries, results)]
+
+    def complete(prompt):
+        llm_start = time.perf_counter()
+        response = model.complete(prompt)
+        return chat.clean_llm_output(response.text), (time.perf_counter() - llm_start) * 1000
+
+    errors = 0
+    llm_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            None if retrieve_only or i in retrieve_errors else executor.submit(complete, prompt)
+            for i, (prompt, _) in enumerate(prompts)
+        ]
+        for i, (record, (_, context), future) in enumerate(zip(records, prompts, futures)):
+            line = {
+                "id": record["id"],
+                "query": record["query"],
+                "node_ids": [node.node.node_id for node in context.nodes],
+                "timings_ms": {"embed": embed_ms, "search": search_ms},
+            }
+            if i in retrieve_errors:
+                errors += 1
+                line["error"] = retrieve_errors[i]
+            elif future is not None:
+                try:
+                    line["result"], llm_ms = future.result()
+                    line["timings_ms"]["llm"] = llm_ms
+                except Exception as e:
+                    errors += 1
+                    line["error"] = str(e)
+            line["timings_ms"]["total"] = sum(line["timings_ms"].values())
+            output.write(json.dumps(line) + "\n")
+    llm_seconds = time.perf_counter() - llm_start
+
+    seconds = time.perf_counter() - start
+    return {
+        "queries": len(queries),
+        "errors": errors,
+        "embed_seconds": embed_seconds,
+        "search_seconds": search_seconds,
+        "llm_seconds": llm_seconds,
+        "seconds": seconds,
+        "queries_per_second": len(queries) / seconds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of travel queries in one process")
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("--output", default="-", help="JSONL file for results (default stdout)")
+    parser.add_argument("--storage", default=chat.STORAGE_DIR, help="Index directory")
+    parser.add_argument("--top-k", type=int, default=4, help="Number of nodes to retrieve per query")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum LLM requests in flight")
+    parser.add_argument("--embed-batch-size", type=int, default=100, help="Texts per embedding request")
+    parser.add_argument("--retrieve-only", action="store_true", help="Skip the LLM and only write retrieved node IDs")
+    args = parser.parse_args()
+
+    records = list(read_queries(args.input))
+    index = chat.load_index(args.storage)
+    model = None if args.retrieve_only else chat.load_llm()
+
+    from llama_index.core import Settings
+
+    output = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    try:
+        summary = run_batch(
+            records, index, model, Settings.embed_model, output,
+            embedding_cache=chat.load_embedding_cache(embed_model=Settings.embed_model),
+            metadata_index=chat.load_metadata_index(args.storage),
+            geo_index=chat.load_spatial_index(args.storage),
+            top_k=args.top_k,
+            concurrency=args.concurrency,
+            embed_batch_size=args.embed_batch_size,
+            retrieve_only=args.retrieve_only,
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Batch summary: {json.dumps(summary)}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
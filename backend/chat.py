@@ -1,267 +1,825 @@
-from llama_index.core import (
-    SimpleDirectoryReader,
-    load_index_from_storage,
-    VectorStoreIndex,
-    StorageContext,
-)
-from llama_index.vector_stores.faiss import FaissVectorStore
-from typing import List, Dict, Set
-from llama_index.core import Document
-# from langchain.embeddings import HuggingFaceEmbeddings
-# from llama_index.embeddings.langchain import LangchainEmbedding
-from llama_index.core import Settings
-import google.generativeai as genai
-import re
-import chromadb
-from llama_index.llms.gemini import Gemini
-import os
-import sys
-# from llama_index.retrievers.bm25 import BM25Retriever
-import Stemmer
-import qdrant_client
-# from llama_index.vector_stores.qdrant import QdrantVectorStore
-import faiss
-from dotenv import load_dotenv  # Add this import
-
-# Load environment variables from .env file
-load_dotenv()  # Add this line
-
-
-d = 1536
-faiss_index = faiss.IndexFlatL2(d)
-# Get the query from command-line arguments
-if len(sys.argv) > 1:
-    query_str = sys.argv[1]
-else:
-    # Default query for testing
-    query_str = "hey i want to travel to Vancouver, tell me something abou tit"
-
-# API keys and configuration
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-
-from llama_index.embeddings.openai import OpenAIEmbedding
-embed_model = OpenAIEmbedding(model="text-embedding-3-small", embed_batch_size=10)
-Settings.embed_model = embed_model
-Settings.chunk_size = 530
-# SYSTEM_PROMPT = '''
-# You are a friendly and knowledgeable AI travel assistant, designed to recommend tourist destinations based on user preferences. Your task is to analyze the user's query and the retrieved information about various tourist locations to provide personalized recommendations.
-
-# You will receive two inputs:
-
-# <user_query>
-# {{USER_QUERY}}
-# </user_query>
-
-# This is the user's request, containing their preferences and any specific requirements for their travel destination.
-
-# <retrieved_nodes>
-# {{RETRIEVED_NODES}}
-# </retrieved_nodes>
-
-# These are the retrieved information nodes about various tourist locations, based on the user's query. Each node contains details about a specific location, including its type, country, visitor statistics, ratings, and other relevant information.
-
-# Instructions:
-
-# 1. Carefully read and analyze the user's query to understand their preferences and requirements.
-
-# 2. Review the retrieved nodes and extract relevant information about each location.
-
-# 3. Compare the locations based on the following criteria:
-#    - Match with user's preferences
-#    - Visitor count
-#    - Rating
-#    - Revenue (as an indicator of popularity and facilities)
-#    - Accommodation availability
-#    - Type of destination
-
-# 4. Select the top 3 locations that best match the user's preferences.
-
-# 5. For each recommended location, prepare a brief, engaging description that highlights its unique features and why it matches the user's preferences.
-
-# 6. Present your recommendations in a friendly, conversational tone, as if you're chatting with a friend about exciting travel destinations.
-
-# 7. Format your response as follows:
-#    - Start with a brief, personalized greeting that acknowledges the user's preferences.
-#    - Present each recommendation in a separate paragraph, starting with the location name and country.
-#    - After the recommendations, provide a short conclusion with a friendly sign-off.
-
-# 8. Use the following XML tags to structure your response:
-#    <greeting></greeting>
-#    <recommendations></recommendations>
-#    <conclusion></conclusion>
-
-# Here's an example of how your response should be structured:
-
-# <greeting>
-# Hi there, beach lover! I've found some amazing seaside destinations that I think you'll absolutely adore. Check these out:
-# </greeting>
-
-# <recommendations>
-# 1. WuKBTAccuL, Egypt: This hidden gem on the Egyptian coast is a beach paradise that's been wowing visitors! With a fantastic rating of 4.6 out of 5, it's clear that travelers are falling in love with this spot. The golden sands and crystal-clear waters attract over 850,000 visitors annually, making it a lively yet not overcrowded destination. It's perfect if you're looking for a mix of relaxation and vibrant beach culture.
-
-# 2. NjBHTTgbPs, China: For a unique beach experience with an Asian twist, this Chinese coastal wonder is a must-visit. It boasts a solid 3.4 rating and draws nearly a million visitors each year. The combination of exotic landscapes and modern amenities makes it an intriguing destination for beach enthusiasts looking for something a bit different.
-
-# 3. MSuMvmHxbk, Brazil: If you're after a taste of South American beach life, this Brazilian hotspot is calling your name. While its rating of 1.3 might seem low, don't let that fool you – it attracts over 926,000 visitors annually and generates the highest revenue among our top picks. This suggests it's got plenty of attractions and activities to keep you entertained throughout your stay.
-# </recommendations>
-
-# <conclusion>
-# Each of these destinations offers a unique beach experience, from the ancient allure of Egypt to the exotic shores of China and the vibrant energy of Brazil. Whether you're looking to relax, explore, or party, there's something for everyone. Happy travels, and don't forget your sunscreen!
-# </conclusion>
-
-# Remember, always maintain a friendly and enthusiastic tone, and tailor your recommendations to the user's specific preferences as mentioned in their query. Your goal is to make the user excited about these destinations and help them find the perfect spot for their next beach getaway!'''
-
-
-SYSTEM_PROMPT = '''
-You are a friendly and knowledgeable AI travel assistant, designed to recommend tourist destinations based on user preferences. Your task is to analyze the user's query and the retrieved information about various tourist locations to provide personalized recommendations.
-
-You will receive two inputs:
-
-<retrieved_nodes>
-{{RETRIEVED_NODES}}
-</retrieved_nodes>
-
-These are the retrieved information nodes about various tourist locations, based on the user's query. Each node is a JSON object containing details about a specific location, including its type, name, location, category, price, rating, coordinates, and other relevant information.
-
-<user_query>
-{{USER_QUERY}}
-</user_query>
-
-This is the user's request, containing their preferences and any specific requirements for their travel destination.
-
-Instructions:
-
-1. Analyze the user's query and the retrieved nodes:
-<thought_process>
-a. Summarize the user's preferences:
-   - List key preferences and requirements mentioned in the user's query.
-
-b. Evaluate each retrieved location:
-   - For each location, consider and note down:
-     - Match with user's preferences
-     - Type of attraction
-     - Category (e.g., Recommended Experiences, Day Trips & Excursions)
-     - Price
-     - Rating
-     - Location (country, province/state, city)
-     - Unique features mentioned in the description
-
-c. Compare locations and select top 3:
-   - Based on the evaluation, rank the locations and select the top 3 that best match the user's preferences.
-
-d. Justify selections:
-   - For each selected location, explain why it was chosen and how it aligns with the user's preferences.
-
-e. Consider potential drawbacks:
-   - For each recommended location, note any potential limitations or drawbacks that the user should be aware of.
-</thought_process>
-
-2. Prepare your recommendations:
-<thought_process>
-- For each recommended location, draft a brief, engaging description that highlights its unique features and why it matches the user's preferences.
-- Include relevant details such as the attraction name, location, price, rating, and any standout characteristics.
-- Ensure that your descriptions are informative and enticing, encouraging the user to consider visiting these locations.
-- Incorporate the potential drawbacks or limitations identified earlier, presenting them in a balanced way.
-</thought_process>
-
-3. Format your response as follows:
-   a. Start with a brief, personalized greeting that acknowledges the user's preferences.
-   b. Present each recommendation in a separate paragraph within the <recommendations> tags, starting with the location name and country.
-   c. After the recommendations, provide a short conclusion with a friendly sign-off within the <conclusion> tags.
-   d. If you encounter a link in the retrieved documents, analyse it carefully and if its relevant to the user query, provide that link at the end specifiying that the user can find more info at that link.
-
-4. Maintain a friendly, conversational tone throughout your response, as if you're chatting with a friend about exciting travel destinations.
-
-5. Wrap your response in the following XML tags:
-   <greeting></greeting>
-   <recommendations></recommendations>
-   <conclusion></conclusion>
-
-Here's an example of how your response should be structured (note that this is a generic example and your actual response should be tailored to the specific user query and retrieved nodes):
-
-<greeting>
-[A personalized greeting based on the user's preferences]
-</greeting>
-
-<recommendations>
-1. [Attraction Name], [Country]: [Brief, engaging description highlighting unique features and relevance to user preferences. Include price, rating, and other relevant details.]
-
-2. [Attraction Name], [Country]: [Brief, engaging description highlighting unique features and relevance to user preferences. Include price, rating, and other relevant details.]
-
-3. [Attraction Name], [Country]: [Brief, engaging description highlighting unique features and relevance to user preferences. Include price, rating, and other relevant details.]
-</recommendations>
-
-<conclusion>
-[A brief summary of the recommendations and a friendly sign-off]
-</conclusion>
-
-Remember to tailor your recommendations to the user's specific preferences as mentioned in their query. Your goal is to make the user excited about these destinations and help them find the perfect spot for their next vacation!
-'''
-def clean_llm_output(text):
-    # Remove XML-style tags
-    text = re.sub(r'</?greeting>|</?recommendations>|</?conclusion>', '', text)
-
-    # Remove multiple newlines and trim surrounding whitespace
-    text = re.sub(r'\n\s*\n', '\n\n', text)  # Keep paragraph breaks clean
-    text = re.sub(r'[ \t]+', ' ', text)      # Collapse multiple spaces/tabs
-    text = text.strip()
-
-    # Optional: Ensure list items are consistently formatted (number. space Text)
-    text = re.sub(r'\n\s*(\d+)\.\s*', r'\n\n\1. ', text)
-
-    return text
-
-def query_vector_store(query_str, top_k=4):
-    """
-    Query the vector store through the query engine to find similar resumes.
-
-    Args:
-    - prompt (str): The input prompt to query for similar resumes.
-    - top_k (int): The number of similar resumes to retrieve.
-
-    Returns:
-    - list[str]: A list of similar resume texts.
-    """
-    # Initialize vector store
-    vector_store = FaissVectorStore.from_persist_dir("./storage")
-    storage_context = StorageContext.from_defaults(
-        vector_store=vector_store, persist_dir="./storage"
-    )
-    index = load_index_from_storage(storage_context=storage_context)
-
-    # Initialize Gemini model
-    model = Gemini(
-        model="models/gemini-2.0-flash",
-        api_key=GOOGLE_API_KEY
-    )
-    Settings.llm = model
-    Settings.chunk_size = 530
-
-    # # Initialize BM25 retriever
-    # bm25_retriever = BM25Retriever.from_defaults(
-    #     docstore=index.docstore,
-    #     similarity_top_k=10,
-    #     stemmer=Stemmer.Stemmer("english"),
-    #     language="english",
-    # )
-
-    # Use the query engine to query the index with your prompt
-    retriever = index.as_retriever(similarity_top_k=top_k)
-    nodes = retriever.retrieve(query_str)
-    retrieved_nodes = "\n".join(str(node) for node in nodes)
-    # print(f"Retrieved nodes: {nodes}")
-    
-    # Format prompt and get response
-    formatted_prompt = SYSTEM_PROMPT.replace("{{USER_QUERY}}", query_str).replace("{{RETRIEVED_NODES}}", retrieved_nodes)
-    response = model.complete(formatted_prompt)
-    cleaned_response = clean_llm_output(response.text)
-
-    return cleaned_response
-
-# Execute query and print result directly to stdout (for Node.js to capture)
-try:
-    result = query_vector_store(query_str)
-    print(result, end='')  # Print without trailing newline for cleaner Node.js output
-except Exception as e:
-    print(f"Error: {str(e)}", file=sys.stderr)
-    sys.exit(1)
\ No newline at end of file
+# Heavy backends (llama_index, faiss, Gemini, OpenAI) are imported lazily in
+# the functions that need them so that cold start stays cheap; see
+# import_profile.py for the startup budget check.
+import re
+import json
+import argparse
+import os
+import sys
+from dotenv import load_dotenv  # Add this import
+
+# Load environment variables from .env file
+load_dotenv()  # Add this line
+
+# Reads TELEMETRY_EXPORTER, so it is imported once .env has been loaded
+import telemetry
+
+# Default query for testing
+DEFAULT_QUERY = "hey i want to travel to Vancouver, tell me something abou tit"
+STORAGE_DIR = "./storage"
+EMBEDDING_CACHE_DIR = "./cache/embeddings"
+EMBED_MODEL_NAME = "text-embedding-3-small"
+
+# Semantic answer cache used by worker mode
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+
+# Optional query-time overrides for IVF / HNSW indexes built with ann_index.py
+FAISS_NPROBE = os.getenv("FAISS_NPROBE")
+FAISS_EF_SEARCH = os.getenv("FAISS_EF_SEARCH")
+
+# Search the compact codes written by quantized_index.py build, rescoring
+# QUANTIZED_RESCORE candidates per result against the full vectors on disk
+QUANTIZED_INDEX = os.getenv("QUANTIZED_INDEX") == "1"
+QUANTIZED_RESCORE = int(os.getenv("QUANTIZED_RESCORE", "10"))
+
+# Load ./storage through the memory-mapped tables written by mmap_store.py export
+STORAGE_MMAP = os.getenv("STORAGE_MMAP") == "1"
+
+# Search per-doc_type shards (storage/shards, see sharded_index.py) when present
+SHARDED_INDEX = os.getenv("SHARDED_INDEX", "1") == "1"
+
+# Fuse vector search with the BM25 index from lexical_index.py build, when present
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+
+# Compact prompt context (context_packing.py): token budget for the retrieved
+# nodes, per-node cap, and how many candidates per top_k slot to consider.
+# PROMPT_TOKEN_BUDGET=0 sends the full str(node) dump of top_k nodes instead.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "400"))
+PROMPT_NODE_MAX_TOKENS = int(os.getenv("PROMPT_NODE_MAX_TOKENS", "150"))
+PROMPT_CANDIDATE_MULTIPLIER = int(os.getenv("PROMPT_CANDIDATE_MULTIPLIER", "2"))
+
+# API keys and configuration
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+
+# SYSTEM_PROMPT = '''
+# You are a friendly and knowledgeable AI travel assistant, designed to recommend tourist destinations based on user preferences. Your task is to analyze the user's query and the retrieved information about various tourist locations to provide personalized recommendations.
+
+# You will receive two inputs:
+
+# <user_query>
+# {{USER_QUERY}}
+# </user_query>
+
+# This is the user's request, containing their preferences and any specific requirements for their travel destination.
+
+# <retrieved_nodes>
+# {{RETRIEVED_NODES}}
+# </retrieved_nodes>
+
+# These are the retrieved information nodes about various tourist locations, based on the user's query. Each node contains details about a specific location, including its type, country, visitor statistics, ratings, and other relevant information.
+
+# Instructions:
+
+# 1. Carefully read and analyze the user's query to understand their preferences and requirements.
+
+# 2. Review the retrieved nodes and extract relevant information about each location.
+
+# 3. Compare the locations based on the following criteria:
+#    - Match with user's preferences
+#    - Visitor count
+#    - Rating
+#    - Revenue (as an indicator of popularity and facilities)
+#    - Accommodation availability
+#    - Type of destination
+
+# 4. Select the top 3 locations that best match the user's preferences.
+
+# 5. For each recommended location, prepare a brief, engaging description that highlights its unique features and why it matches the user's preferences.
+
+# 6. Present your recommendations in a friendly, conversational tone, as if you're chatting with a friend about exciting travel destinations.
+
+# 7. Format your response as follows:
+#    - Start with a brief, personalized greeting that acknowledges the user's preferences.
+#    - Present each recommendation in a separate paragraph, starting with the location name and country.
+#    - After the recommendations, provide a short conclusion with a friendly sign-off.
+
+# 8. Use the following XML tags to structure your response:
+#    <greeting></greeting>
+#    <recommendations></recommendations>
+#    <conclusion></conclusion>
+
+# Here's an example of how your response should be structured:
+
+# <greeting>
+# Hi there, beach lover! I've found some amazing seaside destinations that I think you'll absolutely adore. Check these out:
+# </greeting>
+
+# <recommendations>
+# 1. WuKBTAccuL, Egypt: This hidden gem on the Egyptian coast is a beach paradise that's been wowing visitors! With a fantastic rating of 4.6 out of 5, it's clear that travelers are falling in love with this spot. The golden sands and crystal-clear waters attract over 850,000 visitors annually, making it a lively yet not overcrowded destination. It's perfect if you're looking for a mix of relaxation and vibrant beach culture.
+
+# 2. NjBHTTgbPs, China: For a unique beach experience with an Asian twist, this Chinese coastal wonder is a must-visit. It boasts a solid 3.4 rating and draws nearly a million visitors each year. The combination of exotic landscapes and modern amenities makes it an intriguing destination for beach enthusiasts looking for something a bit different.
+
+# 3. MSuMvmHxbk, Brazil: If you're after a taste of South American beach life, this Brazilian hotspot is calling your name. While its rating of 1.3 might seem low, don't let that fool you – it attracts over 926,000 visitors annually and generates the highest revenue among our top picks. This suggests it's got plenty of attractions and activities to keep you entertained throughout your stay.
+# </recommendations>
+
+# <conclusion>
+# Each of these destinations offers a unique beach experience, from the ancient allure of Egypt to the exotic shores of China and the vibrant energy of Brazil. Whether you're looking to relax, explore, or party, there's something for everyone. Happy travels, and don't forget your sunscreen!
+# </conclusion>
+
+# Remember, always maintain a friendly and enthusiastic tone, and tailor your recommendations to the user's specific preferences as mentioned in their query. Your goal is to make the user excited about these destinations and help them find the perfect spot for their next beach getaway!'''
+
+
+SYSTEM_PROMPT = '''
+You are a friendly and knowledgeable AI travel assistant, designed to recommend tourist destinations based on user preferences. Your task is to analyze the user's query and the retrieved information about various tourist locations to provide personalized recommendations.
+
+You will receive two inputs:
+
+<retrieved_nodes>
+{{RETRIEVED_NODES}}
+</retrieved_nodes>
+
+These are the retrieved information nodes about various tourist locations, based on the user's query. Each node is a JSON object containing details about a specific location, including its type, name, location, category, price, rating, coordinates, and other relevant information.
+
+<user_query>
+{{USER_QUERY}}
+</user_query>
+
+This is the user's request, containing their preferences and any specific requirements for their travel destination.
+
+Instructions:
+
+1. Analyze the user's query and the retrieved nodes:
+<thought_process>
+a. Summarize the user's preferences:
+   - List key preferences and requirements mentioned in the user's query.
+
+b. Evaluate each retrieved location:
+   - For each location, consider and note down:
+     - Match with user's preferences
+     - Type of attraction
+     - Category (e.g., Recommended Experiences, Day Trips & Excursions)
+     - Price
+     - Rating
+     - Location (country, province/state, city)
+     - Unique features mentioned in the description
+
+c. Compare locations and select top 3:
+   - Based on the evaluation, rank the locations and select the top 3 that best match the user's preferences.
+
+d. Justify selections:
+   - For each selected location, explain why it was chosen and how it aligns with the user's preferences.
+
+e. Consider potential drawbacks:
+   - For each recommended location, note any potential limitations or drawbacks that the user should be aware of.
+</thought_process>
+
+2. Prepare your recommendations:
+<thought_process>
+- For each recommended location, draft a brief, engaging description that highlights its unique features and why it matches the user's preferences.
+- Include relevant details such as the attraction name, location, price, rating, and any standout characteristics.
+- Ensure that your descriptions are informative and enticing, encouraging the user to consider visiting these locations.
+- Incorporate the potential drawbacks or limitations identified earlier, presenting them in a balanced way.
+</thought_process>
+
+3. Format your response as follows:
+   a. Start with a brief, personalized greeting that acknowledges the user's preferences.
+   b. Present each recommendation in a separate paragraph within the <recommendations> tags, starting with the location name and country.
+   c. After the recommendations, provide a short conclusion with a friendly sign-off within the <conclusion> tags.
+   d. If you encounter a link in the retrieved documents, analyse it carefully and if its relevant to the user query, provide that link at the end specifiying that the user can find more info at that link.
+
+4. Maintain a friendly, conversational tone throughout your response, as if you're chatting with a friend about exciting travel destinations.
+
+5. Wrap your response in the following XML tags:
+   <greeting></greeting>
+   <recommendations></recommendations>
+   <conclusion></conclusion>
+
+Here's an example of how your response should be structured (note that this is a generic example and your actual response should be tailored to the specific user query and retrieved nodes):
+
+<greeting>
+[A personalized greeting based on the user's preferences]
+</greeting>
+
+<recommendations>
+1. [Attraction Name], [Country]: [Brief, engaging description highlighting unique features and relevance to user preferences. Include price, rating, and other relevant details.]
+
+2. [Attraction Name], [Country]: [Brief, engaging description highlighting unique features and relevance to user preferences. Include price, rating, and other relevant details.]
+
+3. [Attraction Name], [Country]: [Brief, engaging description highlighting unique features and relevance to user preferences. Include price, rating, and other relevant details.]
+</recommendations>
+
+<conclusion>
+[A brief summary of the recommendations and a friendly sign-off]
+</conclusion>
+
+Remember to tailor your recommendations to the user's specific preferences as mentioned in their query. Your goal is to make the user excited about these destinations and help them find the perfect spot for their next vacation!
+'''
+def _strip_tags_and_spacing(text):
+    # Remove XML-style tags
+    text = re.sub(r'</?greeting>|</?recommendations>|</?conclusion>', '', text)
+
+    # Remove multiple newlines
+    text = re.sub(r'\n\s*\n', '\n\n', text)  # Keep paragraph breaks clean
+    text = re.sub(r'[ \t]+', ' ', text)      # Collapse multiple spaces/tabs
+    return text
+
+def _format_list_items(text):
+    # Optional: Ensure list items are consistently formatted (number. space Text)
+    return re.sub(r'\n\s*(\d+)\.\s*', r'\n\n\1. ', text)
+
+def clean_llm_output(text):
+    # Trim surrounding whitespace before formatting list items
+    text = _strip_tags_and_spacing(text).strip()
+    return _format_list_items(text)
+
+class StreamingCleaner:
+    """
+    Incremental version of clean_llm_output for streamed completions.
+
+    Text is only cleaned up to the last "safe" character: one that is not
+    whitespace, a digit, a '.', or part of a possibly unfinished tag. None of
+    the cleaning patterns can match across such a character, so each cleaned
+    segment is final and the concatenated output equals clean_llm_output of
+    the whole text.
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.started = False
+        self.text = ""
+
+    @staticmethod
+    def _safe_end(text):
+        """Index just past the last safe character in text, or 0 if there is none."""
+        for i in range(len(text) - 1, -1, -1):
+            c = text[i]
+            if c.isspace() or c.isdigit() or c in '.<>/':
+                continue
+            # Inside a tag that may still be closing, e.g. "<recommend"
+            if text.rfind('<', 0, i) > text.rfind('>', 0, i):
+                continue
+            return i + 1
+        return 0
+
+    def _clean(self, segment, final=False):
+        segment = _strip_tags_and_spacing(segment)
+        if not self.started:
+            segment = segment.lstrip()
+            self.started = bool(segment)
+        if final:
+            segment = segment.rstrip()
+        # Safe characters are never whitespace, so a list marker cannot span segments
+        return _format_list_items(segment)
+
+    def feed(self, chunk):
+        """Add a streamed chunk and return the newly finalized cleaned text (may be empty)."""
+        self.pending += chunk
+        end = self._safe_end(self.pending)
+        if end == 0:
+            return ""
+        segment, self.pending = self.pending[:end], self.pending[end:]
+        cleaned = self._clean(segment)
+        self.text += cleaned
+        return cleaned
+
+    def flush(self):
+        """Clean and return whatever is still held back once the stream has ended."""
+        cleaned = self._clean(self.pending, final=True)
+        self.pending = ""
+        self.text += cleaned
+        return cleaned
+
+def import_query_backends():
+    """
+    Import every backend module used on the query path.
+
+    Used by import_profile.py to measure the full cold start.
+    """
+    import llama_index.core  # noqa: F401
+    import llama_index.vector_stores.faiss  # noqa: F401
+    import llama_index.embeddings.openai  # noqa: F401
+    import llama_index.llms.gemini  # noqa: F401
+
+def load_embed_model():
+    """
+    Create the OpenAI embedding model and register it as the default.
+
+    Returns:
+    - OpenAIEmbedding: The model used to embed queries.
+    """
+    from llama_index.core import Settings
+    from llama_index.embeddings.openai import OpenAIEmbedding
+
+    embed_model = OpenAIEmbedding(model=EMBED_MODEL_NAME, embed_batch_size=10)
+    Settings.embed_model = embed_model
+    Settings.chunk_size = 530
+    return embed_model
+
+def load_embedding_cache(cache_dir=EMBEDDING_CACHE_DIR, embed_model=None):
+    """
+    Open the two-tier query embedding cache for the current embedding model.
+
+    Args:
+    - cache_dir (str): Directory holding the on-disk tier.
+    - embed_model (BaseEmbedding, optional): The query embedding model; its
+      dimension, when it declares one, picks the disk tier. Otherwise the
+      cache learns it from the first embedding stored.
+
+    Returns:
+    - EmbeddingCache: The cache.
+    """
+    from embedding_cache import EmbeddingCache
+
+    dim = getattr(embed_model, "dim", None) or getattr(embed_model, "dimensions", None)
+    return EmbeddingCache(cache_dir, EMBED_MODEL_NAME, dim=dim)
+
+def load_answer_cache(persist_dir=STORAGE_DIR):
+    """
+    Create the semantic answer cache for the index in persist_dir.
+
+    Args:
+    - persist_dir (str): Directory of the index; the cache is cleared when it changes.
+
+    Returns:
+    - AnswerCache: The cache.
+    """
+    from answer_cache import AnswerCache
+
+    return AnswerCache(
+        persist_dir,
+        similarity_threshold=ANSWER_CACHE_THRESHOLD,
+        ttl_seconds=ANSWER_CACHE_TTL,
+        max_size=ANSWER_CACHE_SIZE,
+    )
+
+def load_metadata_index(persist_dir=STORAGE_DIR):
+    """
+    Open the metadata indexes written by metadata_index.py build.
+
+    Args:
+    - persist_dir (str): Directory of the index.
+
+    Returns:
+    - MetadataIndex: The indexes, or None if the storage has none (or a stale one).
+    """
+    from metadata_index import MetadataIndex, has_metadata_index
+
+    if not has_metadata_index(persist_dir):
+        return None
+    return MetadataIndex(persist_dir)
+
+def load_spatial_index(persist_dir=STORAGE_DIR):
+    """
+    Open the coordinate grid written by geo_index.py build.
+
+    Args:
+    - persist_dir (str): Directory of the index.
+
+    Returns:
+    - GeoIndex: The grid, or None if the storage has none (or a stale one).
+    """
+    from geo_index import has_geo_index, load_geo_index
+
+    if not has_geo_index(persist_dir):
+        return None
+    return load_geo_index(persist_dir)
+
+def candidate_mask(filters=None, near=None, metadata_index=None, geo_index=None):
+    """
+    Combine a metadata filter and a proximity spec into one candidate mask.
+
+    Args:
+    - filters (str, optional): Metadata filter expression, see metadata_index.parse_filter.
+    - near (str, optional): Proximity spec, see geo_index.GeoIndex.mask.
+    - metadata_index (MetadataIndex, optional): Loaded from ./storage when needed and not given.
+    - geo_index (GeoIndex, optional): Loaded from ./storage when needed and not given.
+
+    Returns:
+    - numpy.ndarray: Boolean mask over FAISS positions, or None when neither is given.
+    """
+    mask = None
+    if filters:
+        if metadata_index is None:
+            metadata_index = load_metadata_index()
+        if metadata_index is None:
+            raise ValueError("Filters need a metadata index; run metadata_index.py build")
+        mask = metadata_index.candidates(filters)
+    if near:
+        if geo_index is None:
+            geo_index = load_spatial_index()
+        if geo_index is None:
+            raise ValueError("Proximity queries need a geo index; run geo_index.py build")
+        near_mask = geo_index.mask(near)
+        mask = near_mask if mask is None else mask & near_mask
+    return mask
+
+def load_index(persist_dir=STORAGE_DIR, embed_model=None):
+    """
+    Load the persisted FAISS vector store and index from disk.
+
+    Args:
+    - persist_dir (str): Directory the index was persisted to.
+    - embed_model (BaseEmbedding, optional): Embedding model to register instead
+      of OpenAI, e.g. a local stand-in from local_models.py.
+
+    Returns:
+    - VectorStoreIndex: The loaded index, or an MmapIndex when STORAGE_MMAP=1
+      and the binary node tables are current.
+      Searches a QuantizedIndex instead of the FAISS file when QUANTIZED_INDEX=1
+      and the storage has current codes. Wrapped in a HybridIndex when
+      HYBRID_SEARCH is on and the storage has a lexical index. A ShardedIndex
+      over storage/shards/<doc_type>, each loaded this way, when
+      SHARDED_INDEX is on and the storage has shards.
+    """
+    from llama_index.core import Settings, StorageContext, load_index_from_storage
+    from llama_index.vector_stores.faiss import FaissVectorStore
+
+    if SHARDED_INDEX:
+        from sharded_index import ShardedIndex, has_shards
+
+        if has_shards(persist_dir):
+            return ShardedIndex(persist_dir, lambda shard_dir: load_index(shard_dir, embed_model=embed_model))
+    if embed_model is None:
+        load_embed_model()
+    else:
+        Settings.embed_model = embed_model
+    quantized = None
+    if QUANTIZED_INDEX:
+        from quantized_index import load_quantized_index
+
+        quantized = load_quantized_index(persist_dir, rescore=QUANTIZED_RESCORE)
+    use_mmap = STORAGE_MMAP
+    if use_mmap:
+        from mmap_store import MmapIndex, mmap_store_is_current
+
+        use_mmap = mmap_store_is_current(persist_dir)
+        if not use_mmap:
+            print(f"Binary node tables in {persist_dir} are missing or stale, loading the JSON stores; "
+                  f"re-run mmap_store.py export", file=sys.stderr)
+    if use_mmap:
+        index = MmapIndex(persist_dir)
+        if quantized is not None:
+            index.faiss_index = quantized
+        faiss_index = index.faiss_index
+    elif quantized is not None:
+        # The full FAISS file is never read; its vectors are rescored from vectors.f32
+        vector_store = FaissVectorStore(faiss_index=quantized)
+        faiss_index = quantized
+    else:
+        vector_store = FaissVectorStore.from_persist_dir(persist_dir)
+        faiss_index = vector_store.client
+    if (FAISS_NPROBE or FAISS_EF_SEARCH) and quantized is None:
+        from ann_index import set_search_params
+
+        set_search_params(
+            faiss_index,
+            nprobe=int(FAISS_NPROBE) if FAISS_NPROBE else None,
+            ef_search=int(FAISS_EF_SEARCH) if FAISS_EF_SEARCH else None,
+        )
+    if not use_mmap:
+        storage_context = StorageContext.from_defaults(
+            vector_store=vector_store, persist_dir=persist_dir
+        )
+        index = load_index_from_storage(storage_context=storage_context)
+
+    if HYBRID_SEARCH:
+        from lexical_index import HybridIndex, LexicalIndex, has_lexical_index
+
+        if has_lexical_index(persist_dir):
+            index = HybridIndex(index, LexicalIndex(persist_dir))
+    return index
+
+def load_llm():
+    """
+    Create the Gemini client and register it as the default LLM.
+
+    Returns:
+    - Gemini: The LLM used to write recommendations.
+    """
+    from llama_index.core import Settings
+    from llama_index.llms.gemini import Gemini
+
+    model = Gemini(
+        model="models/gemini-2.0-flash",
+        api_key=GOOGLE_API_KEY
+    )
+    Settings.llm = model
+    Settings.chunk_size = 530
+    return model
+
+def fill_prompt(query_str, retrieved_nodes):
+    """
+    Fill the system prompt with the user query and already serialized nodes.
+
+    Args:
+    - query_str (str): The user's travel query.
+    - retrieved_nodes (str): Context text for the {{RETRIEVED_NODES}} slot.
+
+    Returns:
+    - str: The prompt sent to the LLM.
+    """
+    return SYSTEM_PROMPT.replace("{{USER_QUERY}}", query_str).replace("{{RETRIEVED_NODES}}", retrieved_nodes)
+
+def build_context(nodes):
+    """
+    Serialize retrieved nodes for the prompt.
+
+    Args:
+    - nodes (list): Retrieved NodeWithScore objects, best first.
+
+    Returns:
+    - PackedContext: Compact, deduplicated nodes packed into
+      PROMPT_TOKEN_BUDGET tokens, or the plain str(node) dump when the
+      budget is 0.
+    """
+    from context_packing import PackedContext, count_tokens, pack_context
+
+    if PROMPT_TOKEN_BUDGET <= 0:
+        text = "\n".join(str(node) for node in nodes)
+        return PackedContext(text, list(nodes), count_tokens(text), 0, 0)
+    return pack_context(nodes, PROMPT_TOKEN_BUDGET, PROMPT_NODE_MAX_TOKENS)
+
+def build_prompt(query_str, nodes):
+    """
+    Pack the retrieved nodes and fill the system prompt with them.
+
+    Chat, the async pipeline and batch_query all build prompts here from
+    candidate_count(top_k) retrieved nodes, so a query gets the same prompt
+    in every mode.
+
+    Args:
+    - query_str (str): The user's travel query.
+    - nodes (list): Retrieved NodeWithScore objects, best first.
+
+    Returns:
+    - tuple: (prompt sent to the LLM, PackedContext it was built from).
+    """
+    context = build_context(nodes)
+    return fill_prompt(query_str, context.text), context
+
+def format_prompt(query_str, nodes):
+    """
+    Fill the system prompt with the user query and the retrieved nodes.
+
+    Args:
+    - query_str (str): The user's travel query.
+    - nodes (list): Retrieved NodeWithScore objects.
+
+    Returns:
+    - str: The prompt sent to the LLM.
+    """
+    return build_prompt(query_str, nodes)[0]
+
+def candidate_count(top_k):
+    """
+    Number of nodes to retrieve for a prompt of top_k nodes.
+
+    Args:
+    - top_k (int): Nodes wanted in the prompt.
+
+    Returns:
+    - int: top_k * PROMPT_CANDIDATE_MULTIPLIER with PROMPT_TOKEN_BUDGET set,
+      so short nodes can fill the budget; top_k otherwise.
+    """
+    return top_k * PROMPT_CANDIDATE_MULTIPLIER if PROMPT_TOKEN_BUDGET > 0 else top_k
+
+def retrieve_nodes(query_str, query_embedding, index, top_k, filters=None, near=None, metadata_index=None,
+                   geo_index=None):
+    """
+    Search the index for the nodes to build the prompt from.
+
+    Args:
+    - query_str (str): The user's travel query (used by lexical search).
+    - query_embedding (list): Embedding of query_str.
+    - index (VectorStoreIndex): Index returned by load_index.
+    - top_k (int): Nodes wanted in the prompt; candidate_count(top_k)
+      candidates are returned.
+    - filters, near, metadata_index, geo_index: See query_vector_store. A
+      ShardedIndex uses its shards' own metadata and geo indexes instead.
+
+    Returns:
+    - list: NodeWithScore objects, best first.
+    """
+    from llama_index.core import QueryBundle
+
+    retrieve_k = candidate_count(top_k)
+    with telemetry.stage("retrieval", top_k=retrieve_k) as span:
+        sharded = hasattr(index, "shards")
+        mask = None if sharded else candidate_mask(filters, near, metadata_index, geo_index)
+        if sharded and (filters or near):
+            # Each shard evaluates the filters against its own metadata and geo indexes
+            nodes = index.search(query_str, query_embedding, retrieve_k, filters=filters, near=near)
+        elif mask is not None:
+            from metadata_index import filtered_search
+
+            span.set("candidates", int(mask.sum()))
+            nodes = filtered_search(index, query_str, query_embedding, mask, retrieve_k)
+        else:
+            retriever = index.as_retriever(similarity_top_k=retrieve_k)
+            nodes = retriever.retrieve(QueryBundle(query_str, embedding=query_embedding))
+        span.set("nodes", len(nodes))
+    return nodes
+
+def query_vector_store(query_str, top_k=4, index=None, model=None, embedding_cache=None, answer_cache=None, on_delta=None,
+                       filters=None, metadata_index=None, near=None, geo_index=None):
+    """
+    Retrieve the nodes most similar to the query and ask the LLM for recommendations.
+
+    Each stage (storage load, embedding, retrieval, answer cache, prompt,
+    completion, cleaning) runs in a telemetry.stage span when
+    TELEMETRY_EXPORTER is set.
+
+    Args:
+    - query_str (str): The user's travel query.
+    - top_k (int): The number of nodes to retrieve. With PROMPT_TOKEN_BUDGET
+      set, top_k * PROMPT_CANDIDATE_MULTIPLIER candidates are retrieved and as
+      many as fit the budget go into the prompt.
+    - index (VectorStoreIndex, optional): Already loaded index. Loaded from
+      ./storage when not given.
+    - model (Gemini, optional): Already created LLM client. Created when not given.
+    - embedding_cache (EmbeddingCache, optional): Query embedding cache. Opened
+      from ./cache when not given.
+    - answer_cache (AnswerCache, optional): Semantic cache of finished answers.
+      No answers are cached when not given.
+    - on_delta (callable, optional): When given, the completion is streamed and
+      on_delta is called with each cleaned piece of text as it arrives.
+    - filters (str, optional): Metadata filter expression such as
+      "city=Vancouver, price<100, rating>=4"; only matching nodes are searched.
+    - metadata_index (MetadataIndex, optional): Already loaded metadata indexes.
+      Loaded from ./storage when filters are given and this is not.
+    - near (str, optional): Proximity spec such as "49.28,-123.12,5" (within
+      5 km), "49.28,-123.12" (nearest nodes) or "Stanley Park,2"; combined
+      with filters, only nodes matching both are searched.
+    - geo_index (GeoIndex, optional): Already loaded geo index. Loaded from
+      ./storage when near is given and this is not.
+
+    Returns:
+    - str: The cleaned recommendation text.
+    """
+    from llama_index.core import Settings
+
+    with telemetry.stage("recommendation", top_k=top_k, stream=on_delta is not None,
+                         filtered=bool(filters or near)) as request_span:
+        if index is None:
+            with telemetry.stage("storage_load", mmap=STORAGE_MMAP):
+                index = load_index()
+        if model is None:
+            model = load_llm()
+        if embedding_cache is None:
+            embedding_cache = load_embedding_cache(embed_model=Settings.embed_model)
+
+        # Use the query engine to query the index with your prompt
+        with telemetry.stage("embedding"):
+            query_embedding = embedding_cache.get_or_compute(query_str, Settings.embed_model.get_query_embedding)
+        nodes = retrieve_nodes(query_str, query_embedding, index, top_k, filters, near, metadata_index, geo_index)
+        node_ids = [node.node.node_id for node in nodes]
+        if answer_cache is not None:
+            with telemetry.stage("answer_cache") as span:
+                cached_response = answer_cache.get(query_embedding, node_ids)
+                span.set("hit", cached_response is not None)
+            if cached_response is not None:
+                request_span.set("response_chars", len(cached_response))
+                if on_delta is not None:
+                    on_delta(cached_response)
+                return cached_response
+
+        # print(f"Retrieved nodes: {nodes}")
+
+        # Format prompt and get response
+        with telemetry.stage("prompt", token_budget=PROMPT_TOKEN_BUDGET) as span:
+            formatted_prompt, context = build_prompt(query_str, nodes)
+            span.set("prompt_chars", len(formatted_prompt))
+            span.set("context_tokens", context.tokens)
+            span.set("packed_nodes", len(context.nodes))
+        if on_delta is None:
+            with telemetry.stage("completion"):
+                response = model.complete(formatted_prompt)
+            with telemetry.stage("clean_output"):
+                cleaned_response = clean_llm_output(response.text)
+        else:
+            # Cleaning is interleaved with generation, so it is part of this span
+            with telemetry.stage("completion", stream=True):
+                cleaner = StreamingCleaner()
+                for response in model.stream_complete(formatted_prompt):
+                    cleaned = cleaner.feed(response.delta or "")
+                    if cleaned:
+                        on_delta(cleaned)
+                cleaned = cleaner.flush()
+                if cleaned:
+                    on_delta(cleaned)
+                cleaned_response = cleaner.text
+        request_span.set("response_chars", len(cleaned_response))
+        if answer_cache is not None:
+            answer_cache.put(query_embedding, node_ids, cleaned_response)
+
+        return cleaned_response
+
+def run_worker(stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Serve queries as newline-delimited JSON until stdin is closed.
+
+    The index, embedding model and LLM client are loaded once and reused for
+    every request. Each input line is a JSON object such as
+    {"id": 1, "query": "beaches in Goa", "top_k": 4} (optionally with a
+    "filters" expression and/or "near" spec, see query_vector_store) and produces exactly one
+    final output line, either {"id": 1, "result": "..."} or {"id": 1, "error": "..."}.
+    With "stream": true in the request, {"id": 1, "delta": "..."} lines are
+    written as the answer is generated, before the final line.
+    A "traceparent" (W3C trace context) field makes the request's spans part
+    of the caller's trace when telemetry is enabled.
+    A {"ready": true} line is written once loading has finished.
+
+    Args:
+    - stdin: Stream to read requests from.
+    - stdout: Stream to write responses to.
+    """
+    # Anything else printed by libraries goes to stderr so it cannot
+    # corrupt the protocol stream
+    sys.stdout = sys.stderr
+
+    from llama_index.core import Settings
+
+    with telemetry.stage("storage_load", mmap=STORAGE_MMAP):
+        index = load_index()
+    model = load_llm()
+    embedding_cache = load_embedding_cache(embed_model=Settings.embed_model)
+    answer_cache = load_answer_cache()
+    metadata_index = load_metadata_index()
+    geo_index = load_spatial_index()
+
+    def respond(message):
+        stdout.write(json.dumps(message) + "\n")
+        stdout.flush()
+
+    respond({"ready": True})
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            if "cancel" in request:
+                # Only the --async worker can stop a request in flight
+                continue
+            request_id = request.get("id")
+            on_delta = None
+            if request.get("stream"):
+                on_delta = lambda delta: respond({"id": request_id, "delta": delta})
+            with telemetry.trace_context(request.get("traceparent")):
+                result = query_vector_store(
+                    request["query"],
+                    top_k=int(request.get("top_k", 4)),
+                    index=index,
+                    model=model,
+                    embedding_cache=embedding_cache,
+                    answer_cache=answer_cache,
+                    on_delta=on_delta,
+                    filters=request.get("filters"),
+                    metadata_index=metadata_index,
+                    near=request.get("near"),
+                    geo_index=geo_index,
+                )
+            respond({"id": request_id, "result": result})
+        except Exception as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            respond({"id": request_id, "error": str(e)})
+
+    print(f"Embedding cache stats: {embedding_cache.stats()}", file=sys.stderr)
+    print(f"Answer cache stats: {answer_cache.stats()}", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Travel recommendation query runner")
+    parser.add_argument("query", nargs="?", default=DEFAULT_QUERY, help="Query to answer once and exit")
+    parser.add_argument("--worker", action="store_true", help="Serve newline-delimited JSON queries on stdin/stdout")
+    parser.add_argument("--top-k", type=int, default=4, help="Number of nodes to retrieve")
+    parser.add_argument("--stream", action="store_true", help="Write the answer to stdout as it is generated")
+    parser.add_argument("--filter", default=None, help='Metadata filter, e.g. "city=Vancouver, price<100, rating>=4"')
+    parser.add_argument("--near", default=None, help='Proximity, e.g. "49.28,-123.12,5" (km) or "Stanley Park,2"')
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Use the asyncio pipeline (async_pipeline.py): stage deadlines, cancellation, hedging")
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        if args.use_async:
+            from async_pipeline import run_async_worker
+
+            run_async_worker()
+        else:
+            run_worker()
+        return
+
+    # Execute query and print result directly to stdout (for Node.js to capture)
+    try:
+        run_query = query_vector_store
+        if args.use_async:
+            import asyncio
+            from async_pipeline import aquery_vector_store
+
+            run_query = lambda *a, **kw: asyncio.run(aquery_vector_store(*a, **kw))
+        with telemetry.trace_context(os.getenv("TRACEPARENT")):
+            if args.stream:
+                run_query(args.query, top_k=args.top_k, filters=args.filter, near=args.near,
+                          on_delta=lambda delta: print(delta, end='', flush=True))
+                return
+            result = run_query(args.query, top_k=args.top_k, filters=args.filter, near=args.near)
+        print(result, end='')  # Print without trailing newline for cleaner Node.js output
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Metadata that never helps the LLM write a recommendation
+OMIT_METADATA = {"attraction_id", "doc_id", "document_id", "ref_doc_id", "latitude", "longitude", "doc_type",
+                 "file_path", "file_name"}
+# Text lines dropped for the same reason (extract.py writes coordinates into the text)
+OMIT_LINE_PREFIXES = ("coordinates:",)
+
+@lru_cache(maxsize=1)
+def _token_encoding():
+    """cl100k_base from tiktoken, or None if tiktoken or its data is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken when available, otherwise estimate 4 characters per token.
+
+    Gemini uses its own tokenizer; cl100k_base counts are close enough to
+    budget prompts and compare formats.
+    """
+    encoding = _token_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens, at a word boundary when possible"""
+    encoding = _token_encoding()
+    if encoding is None:
+        cut = text[:max_tokens * 4]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    if len(cut) == len(text):
+        return text
+    space = cut.rfind(" ")
+    return (cut[:space] if space > len(cut) // 2 else cut).rstrip() + " ..."
+
+def compact_node(node) -> str:
+    """
+    Serialize one retrieved node as its text plus the metadata the text does not already say.
+
+    Lines are whitespace-collapsed and repeated lines dropped; node IDs,
+    scores and coordinates are left out. Unlike str(node), the text is not
+    cut at 350 characters; pack_context applies a token cap instead.
+
+    Args:
+        node: NodeWithScore or TextNode
+
+    Returns:
+        Compact text for the prompt
+    """
+    node = getattr(node, "node", node)
+    lines = []
+    seen = set()
+    for line in node.get_content().splitlines():
+        line = re.sub(r"\s+", " ", line).strip()
+        if line and line.lower() not in seen and not line.lower().startswith(OMIT_LINE_PREFIXES):
+            seen.add(line.lower())
+            lines.append(line)
+    lowered = "\n".join(lines).lower()
+    for key, value in (node.metadata or {}).items():
+        if key in OMIT_METADATA or value in (None, "") or isinstance(value, (list, dict)):
+            continue
+        value = str(value).strip()
+        if value and value.replace("_", " ").lower() not in lowered and value.lower() not in lowered:
+            lines.append(f"{key.replace('_', ' ').title()}: {value}")
+    return "\n".join(lines)
+
+class PackedContext:
+    """Result of pack_context: the prompt context and what went into it."""
+
+    def __init__(self, text: str, nodes: List, tokens: int, dropped: int, duplicates: int):
+        self.text = text
+        self.nodes = nodes
+        self.tokens = tokens
+        self.dropped = dropped
+        self.duplicates = duplicates
+
+def pack_context(nodes: List, token_budget: int, node_max_tokens: Optional[int] = None) -> PackedContext:
+    """
+    Pack compact node texts into a token budget, best-ranked first.
+
+    Nodes are taken in retrieval order. A node that does not fit is skipped
+    and shorter lower-ranked nodes may still fill the remaining budget, so
+    more nodes make it in when they are short. Nodes repeating an earlier
+    node's ID or text (overlapping chunks, the same attraction from two
+    sources) are dropped.
+
+    Args:
+        nodes: Retrieved NodeWithScore list, best first
+        token_budget: Maximum tokens for the whole context
+        node_max_tokens: Truncate each node to this many tokens first
+
+    Returns:
+        PackedContext with the text, the packed nodes and token count
+    """
+    parts, packed = [], []
+    seen_ids, seen_texts = set(), set()
+    used = dropped = duplicates = 0
+    for node in nodes:
+        node_id = getattr(node, "node", node).node_id
+        text = compact_node(node)
+        if node_id in seen_ids or text in seen_texts:
+            duplicates += 1
+            continue
+        seen_ids.add(node_id)
+        seen_texts.add(text)
+        if node_max_tokens:
+            text = truncate_tokens(text, node_max_tokens)
+        part = f"[{len(parts) + 1}] {text}"
+        tokens = count_tokens(part) + 1
+        if used + tokens > token_budget:
+            if parts:
+                dropped += 1
+                continue
+            # Never send an empty context: cut the best node down to the budget
+            part = truncate_tokens(part, token_budget)
+            tokens = count_tokens(part)
+        parts.append(part)
+        packed.append(node)
+        used += tokens
+    return PackedContext("\n\n".join(parts), packed, used, dropped, duplicates)
+
+def report(queries: List[str], index, model, embed_model, top_k: int, token_budget: int,
+           node_max_tokens: Optional[int], candidate_multiplier: int) -> Dict:
+    """
+    Compare the legacy str(node) context with packed contexts over a set of queries.
+
+    Each query's legacy and compact prompts go to the same model, in
+    alternating order, so the completion timings share conditions.
+
+    Returns:
+        Dict with token totals and completion latency percentiles for both formats
+    """
+    from llama_index.core import QueryBundle
+    import chat
+
+    retriever = index.as_retriever(similarity_top_k=top_k * candidate_multiplier)
+    rows = []
+    for i, query in enumerate(queries):
+        candidates = retriever.retrieve(QueryBundle(query, embedding=embed_model.get_query_embedding(query)))
+        legacy_context = "\n".join(str(node) for node in candidates[:top_k])
+        legacy_prompt = chat.fill_prompt(query, legacy_context)
+        context = pack_context(candidates, token_budget, node_max_tokens)
+        compact_prompt = chat.fill_prompt(query, context.text)
+
+        timings = {}
+        order = [("legacy", legacy_prompt), ("compact", compact_prompt)]
+        for name, prompt in (order if i % 2 == 0 else order[::-1]):
+            start = time.perf_counter()
+            model.complete(prompt)
+            timings[name] = (time.perf_counter() - start) * 1000
+        rows.append({
+            "legacy_tokens": count_tokens(legacy_prompt),
+            "compact_tokens": count_tokens(compact_prompt),
+            "legacy_context_tokens": count_tokens(legacy_context),
+            "compact_context_tokens": context.tokens,
+            "legacy_nodes": min(top_k, len(candidates)),
+            "compact_nodes": len(context.nodes),
+            "legacy_ms": timings["legacy"],
+            "compact_ms": timings["compact"],
+        })
+
+    def column(key):
+        return np.array([row[key] for row in rows], dtype=np.float64)
+
+    legacy_tokens, compact_tokens = column("legacy_tokens"), column("compact_tokens")
+    return {
+        "queries": len(rows),
+        "tokenizer": "cl100k_base" if _token_encoding() is not None else "estimate (4 chars/token)",
+        "legacy_prompt_tokens_mean": float(legacy_tokens.mean()),
+        "compact_prompt_tokens_mean": float(compact_tokens.mean()),
+        "prompt_tokens_saved": float((legacy_tokens - compact_tokens).sum()),
+        "prompt_tokens_saved_ratio": float(1 - compact_tokens.sum() / legacy_tokens.sum()),
+        "legacy_context_tokens_mean": float(column("legacy_context_tokens").mean()),
+        "compact_context_tokens_mean": float(column("compact_context_tokens").mean()),
+        "legacy_nodes_mean": float(column("legacy_nodes").mean()),
+        "compact_nodes_mean": float(column("compact_nodes").mean()),
+        **{f"{name}_completion_{p}_ms": float(np.percentile(column(f"{name}_ms"), q))
+           for name in ("legacy", "compact") for p, q in (("p50", 50), ("p95", 95))},
+        "rows": rows,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact, token-budgeted prompt context")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compare = subparsers.add_parser("report", help="Prompt tokens and completion latency, legacy vs compact")
+    compare.add_argument("--queries", required=True, help="JSONL file of queries, as read by batch_query.py")
+    compare.add_argument("--storage", default="./storage")
+    compare.add_argument("--top-k", type=int, default=4)
+    compare.add_argument("--budget", type=int, default=None, help="Token budget (default: PROMPT_TOKEN_BUDGET)")
+    compare.add_argument("--local", action="store_true",
+                         help="Use local_models.py stand-ins instead of OpenAI embeddings and Gemini")
+    compare.add_argument("--llm-latency-ms", type=float, default=800.0, help="Fake LLM base delay with --local")
+    compare.add_argument("--prefill-ms-per-1k-chars", type=float, default=20.0,
+                         help="Fake LLM delay per 1000 prompt characters with --local")
+    compare.add_argument("--output", default=None, help="Also write the report, with per-query rows, here")
+
+    args = parser.parse_args()
+    import chat
+    from batch_query import read_queries
+
+    queries = [record["query"] for record in read_queries(args.queries)]
+    embed_model = None
+    if args.local:
+        from ann_index import VECTOR_STORE_FILE
+        import faiss
+        from local_models import FakeLLM, LocalEmbedding
+
+        dim = faiss.read_index(os.path.join(args.storage, VECTOR_STORE_FILE), faiss.IO_FLAG_MMAP).d
+        embed_model = LocalEmbedding(dim=dim)
+        model = FakeLLM(latency_ms=args.llm_latency_ms, prefill_ms_per_1k_chars=args.prefill_ms_per_1k_chars)
+    else:
+        model = chat.load_llm()
+    index = chat.load_index(args.storage, embed_model=embed_model)
+    from llama_index.core import Settings
+
+    result = report(queries, index, model, Settings.embed_model, args.top_k,
+                    args.budget or chat.PROMPT_TOKEN_BUDGET, chat.PROMPT_NODE_MAX_TOKENS,
+                    chat.PROMPT_CANDIDATE_MULTIPLIER)
+
+    print(f"{result['queries']} queries, tokens counted with {result['tokenizer']}")
+    print(f"{'':<10} {'prompt':>9} {'context':>9} {'nodes':>7} {'p50 ms':>10} {'p95 ms':>10}")
+    for name in ("legacy", "compact"):
+        print(f"{name:<10} {result[f'{name}_prompt_tokens_mean']:>9.0f} {result[f'{name}_context_tokens_mean']:>9.0f} "
+              f"{result[f'{name}_nodes_mean']:>7.1f} "
+              f"{result[f'{name}_completion_p50_ms']:>10.1f} {result[f'{name}_completion_p95_ms']:>10.1f}")
+    print(f"Saved {result['prompt_tokens_saved']:.0f} prompt tokens ({result['prompt_tokens_saved_ratio']:.1%})")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
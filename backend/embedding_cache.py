@@ -0,0 +1,256 @@
+import fcntl
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# The key log is rewritten once it holds this many times disk_size lines
+LOG_COMPACT_FACTOR = 4
+
+def normalize_query(text: str) -> str:
+    """Lowercase a query and collapse whitespace so trivial variants share a cache entry."""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings keyed by normalized query text and model name.
+
+    The first tier is an in-process LRU dictionary. The second tier is a
+    float32 matrix memory-mapped from disk plus an append-only key log of
+    "key slot" lines, so entries survive restarts and are shared by every
+    worker on the host. Each process replays only the log lines written
+    since it last looked, and a write appends one line per entry, so a miss
+    costs O(1) instead of rewriting the whole index; the log is compacted
+    once it holds LOG_COMPACT_FACTOR times disk_size lines. When the disk
+    tier is full the oldest written slot is overwritten, found in O(1) from
+    the write-ordered key index. Disk reads take the lock shared, so a
+    reader never sees a slot half-way through being overwritten by another
+    worker.
+
+    Each embedding dimension has its own disk tier. Without an explicit dim
+    the most recently written tier for the model is used, and the dimension
+    is learned from the first embedding stored; storing an embedding of
+    another size switches to that dimension's tier instead of failing.
+    """
+
+    def __init__(self,
+                 cache_dir: str,
+                 model_name: str,
+                 dim: Optional[int] = None,
+                 memory_size: int = 1024,
+                 disk_size: int = 20_000):
+        """
+        Args:
+            cache_dir: Directory holding the on-disk tier
+            model_name: Embedding model name, part of every cache key
+            dim: Embedding dimension, or None to learn it from the cache or the first put
+            memory_size: Maximum number of entries in the in-memory tier
+            disk_size: Maximum number of entries in the on-disk tier
+        """
+        self.model_name = model_name
+        self.dim = None
+        self.matrix = None
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.cache_path = Path(cache_dir)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.safe_model = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+
+        # key -> slot, oldest write first; slot -> key for the reverse lookup on overwrite
+        self.slots: "OrderedDict[str, int]" = OrderedDict()
+        self.slot_keys: Dict[int, str] = {}
+        self.log_inode = None
+        self.log_offset = 0
+        self.log_lines = 0
+
+        if dim is None:
+            # Reuse the tier this model last wrote to, if any
+            pattern = re.compile(re.escape(self.safe_model) + r'_(\d+)\.keys\.log$')
+            written = [(path.stat().st_mtime_ns, int(match.group(1)))
+                       for path in self.cache_path.glob(f"{self.safe_model}_*.keys.log")
+                       for match in [pattern.match(path.name)] if match]
+            if written:
+                dim = max(written)[1]
+        if dim is not None:
+            self._open_disk(dim)
+
+    def _open_disk(self, dim: int):
+        """Switch the disk tier (and drop the memory tier) to embeddings of `dim` dimensions."""
+        self.dim = dim
+        self.memory.clear()
+        self.matrix_path = self.cache_path / f"{self.safe_model}_{dim}.f32"
+        self.log_path = self.cache_path / f"{self.safe_model}_{dim}.keys.log"
+        self.lock_path = self.cache_path / f"{self.safe_model}_{dim}.lock"
+
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not self.matrix_path.exists() or self.matrix_path.stat().st_size != self.disk_size * dim * 4:
+                # New cache or a different size: start from an empty matrix
+                np.memmap(self.matrix_path, dtype=np.float32, mode='w+', shape=(self.disk_size, dim)).flush()
+                self.log_path.unlink(missing_ok=True)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+', shape=(self.disk_size, dim))
+
+        self.slots = OrderedDict()
+        self.slot_keys = {}
+        self.log_inode = None
+        self.log_offset = 0
+        self.log_lines = 0
+
+    def key(self, query: str) -> str:
+        """Return the cache key for a query under this cache's model."""
+        return hashlib.sha1(f"{self.model_name}\0{normalize_query(query)}".encode('utf-8')).hexdigest()
+
+    def _assign(self, key: str, slot: int):
+        """Record that key was written to slot, dropping the key that held the slot before."""
+        previous = self.slot_keys.get(slot)
+        if previous is not None and previous != key:
+            self.slots.pop(previous, None)
+        self.slots[key] = slot
+        self.slots.move_to_end(key)
+        self.slot_keys[slot] = key
+
+    def _catch_up(self):
+        """Apply the key log lines other processes appended since we last looked. Call with the lock held."""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self.log_inode:
+            # Compacted (or first read): replay from the start
+            self.slots = OrderedDict()
+            self.slot_keys = {}
+            self.log_inode = stat.st_ino
+            self.log_offset = 0
+            self.log_lines = 0
+        if stat.st_size == self.log_offset:
+            return
+        with open(self.log_path, 'rb') as f:
+            f.seek(self.log_offset)
+            data = f.read(stat.st_size - self.log_offset)
+        # A writer that died mid-append leaves a partial line; stop before it
+        data = data[:data.rfind(b'\n') + 1]
+        fields = data.decode('ascii').split()
+        for i in range(0, len(fields) - 1, 2):
+            self._assign(fields[i], int(fields[i + 1]))
+        self.log_offset += len(data)
+        self.log_lines += len(fields) // 2
+
+    def _compact_log(self):
+        """Rewrite the key log with one line per live entry, oldest first. Call with the lock held."""
+        tmp_path = self.log_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='ascii') as f:
+            f.writelines(f"{key} {slot}\n" for key, slot in self.slots.items())
+        os.replace(tmp_path, self.log_path)
+        stat = os.stat(self.log_path)
+        self.log_inode = stat.st_ino
+        self.log_offset = stat.st_size
+        self.log_lines = len(self.slots)
+
+    def _remember(self, key: str, embedding: List[float]):
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def get(self, query: str) -> Optional[List[float]]:
+        """
+        Look a query up in the memory tier, then the disk tier.
+
+        Returns:
+            The cached embedding, or None on a miss
+        """
+        key = self.key(query)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return self.memory[key]
+
+        if self.matrix is not None:
+            # Shared lock: the slot cannot be evicted and overwritten between the lookup and the read
+            with open(self.lock_path, 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_SH)
+                self._catch_up()
+                slot = self.slots.get(key)
+                embedding = self.matrix[slot].tolist() if slot is not None else None
+            if embedding is not None:
+                self.disk_hits += 1
+                self._remember(key, embedding)
+                return embedding
+
+        self.misses += 1
+        return None
+
+    def put(self, query: str, embedding: List[float]):
+        """Store an embedding in both tiers, evicting the oldest disk slot if full."""
+        self.put_many([(query, embedding)])
+
+    def put_many(self, items: List[Tuple[str, List[float]]]):
+        """
+        Store several (query, embedding) pairs under one lock and one key log append.
+
+        The tier follows the dimension of the last embedding given: a model
+        that changed dimension starts filling a new tier, and pairs of any
+        other size in the same call are not cached.
+        """
+        if not items:
+            return
+        dim = len(items[-1][1])
+        if dim != self.dim:
+            self._open_disk(dim)
+        items = [(query, embedding) for query, embedding in items if len(embedding) == dim]
+
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._catch_up()
+            lines = []
+            for query, embedding in items:
+                key = self.key(query)
+                self._remember(key, list(embedding))
+                if key in self.slots:
+                    slot = self.slots[key]
+                elif len(self.slots) < self.disk_size:
+                    # Slots are only ever reused, never freed, so the next free one is len(slots)
+                    slot = len(self.slots)
+                else:
+                    slot = next(iter(self.slots.values()))
+                self.matrix[slot] = np.asarray(embedding, dtype=np.float32)
+                self._assign(key, slot)
+                lines.append(f"{key} {slot}\n")
+            self.matrix.flush()
+            if self.log_lines + len(lines) > LOG_COMPACT_FACTOR * self.disk_size:
+                self._compact_log()
+            else:
+                with open(self.log_path, 'a', encoding='ascii') as f:
+                    f.writelines(lines)
+                stat = os.stat(self.log_path)
+                self.log_inode = stat.st_ino
+                self.log_offset = stat.st_size
+                self.log_lines += len(lines)
+
+    def get_or_compute(self, query: str, embed_fn: Callable[[str], List[float]]) -> List[float]:
+        """Return the cached embedding for a query, computing and storing it on a miss."""
+        embedding = self.get(query)
+        if embedding is None:
+            embedding = embed_fn(query)
+            self.put(query, embedding)
+        return embedding
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters for this process."""
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_entries': len(self.memory),
+            'disk_entries': len(self.slots),
+            'dim': self.dim,
+        }
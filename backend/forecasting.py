@@ -0,0 +1,374 @@
+# Tourism forecasts from ts_analysis (1).ipynb as a reusable engine: ARIMA and
+# exponential smoothing grids fitted on a process pool, with every fit cached
+# on disk under a hash of its series data and parameters.
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data"))
+FORECAST_CACHE_DIR = os.getenv("FORECAST_CACHE_DIR", "./cache/forecasts")
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", "5"))
+# Share of each series used for fitting when scoring a model; the rest is the holdout
+FORECAST_TRAIN_SPLIT = float(os.getenv("FORECAST_TRAIN_SPLIT", "0.8"))
+
+def covid_adjusted(series: pd.Series) -> pd.Series:
+    """
+    Smooth the COVID collapse of a yearly series, as create_covid_adjusted_dataset does in the notebook.
+
+    2020 becomes a 40% drop from 2019, and 2021 becomes 85% of 2019 when
+    it is still more than 20% below it.
+    """
+    adjusted = series.astype(np.float64)
+    if {2019, 2020, 2021} <= set(adjusted.index):
+        pre_covid = adjusted[2019]
+        adjusted[2020] = pre_covid * 0.6
+        if adjusted[2021] < pre_covid * 0.8:
+            adjusted[2021] = pre_covid * 0.85
+    return adjusted
+
+def load_series(data_dir: str = DATA_DIR) -> Dict[str, pd.Series]:
+    """
+    The series forecast by the notebook and the dashboard.
+
+    Yearly series are indexed by year, monthly ones by a monthly PeriodIndex.
+
+    Returns:
+        Series name -> series
+    """
+    series = {}
+    fee = pd.read_csv(os.path.join(data_dir, "yearwise_FEE_Rupee.csv"), index_col="Year")["FEE_Rupee_Crore"]
+    arrivals = pd.read_csv(os.path.join(data_dir, "yearwise_ArrivalModes.csv"), index_col="Year")["Arrivals"]
+    series["fee_rupee_crore"] = fee.astype(np.float64)
+    series["fee_rupee_crore_covid_adjusted"] = covid_adjusted(fee)
+    series["arrivals"] = arrivals.astype(np.float64)
+    series["arrivals_covid_adjusted"] = covid_adjusted(arrivals)
+
+    monthly = pd.read_csv(os.path.join(data_dir, "Monthly Wise FFA FFE - processed.csv"), parse_dates=["date"])
+    monthly = monthly.sort_values("date").set_index(monthly["date"].dt.to_period("M"))
+    pre_covid = monthly[monthly["period"] == "Pre-COVID"]
+    for column, name in [("tourist_arrivals", "monthly_arrivals"), ("exchange_earnings", "monthly_earnings")]:
+        series[name] = monthly[column].astype(np.float64).rename(name)
+        series[f"{name}_pre_covid"] = pre_covid[column].astype(np.float64).rename(f"{name}_pre_covid")
+    return series
+
+def seasonal_periods(series: pd.Series) -> Optional[int]:
+    """12 for monthly series, None for yearly ones."""
+    return 12 if isinstance(series.index, pd.PeriodIndex) and series.index.freqstr.startswith("M") else None
+
+def model_grid(periods: Optional[int] = None) -> List[Tuple]:
+    """
+    The notebook's search space as model specs.
+
+    ("arima", p, d, q) for p, q in 0..2 and d in 0..1, and
+    ("ets", trend, seasonal, periods) for no, additive and multiplicative
+    trend, plus additive seasonality when periods is given.
+    """
+    grid = [("arima", p, d, q) for p in range(3) for d in range(2) for q in range(3)]
+    for seasonal in [None] + (["add"] if periods else []):
+        grid.extend(("ets", trend, seasonal, periods if seasonal else None) for trend in (None, "add", "mul"))
+    return grid
+
+def spec_label(spec: Tuple) -> str:
+    if spec[0] == "arima":
+        return f"ARIMA({spec[1]},{spec[2]},{spec[3]})"
+    return f"ETS(trend={spec[1]},seasonal={spec[2]})"
+
+def _fit(values: np.ndarray, spec: Tuple):
+    if spec[0] == "arima":
+        from statsmodels.tsa.arima.model import ARIMA
+        return ARIMA(values, order=spec[1:]).fit()
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+    return ExponentialSmoothing(values, trend=spec[1], seasonal=spec[2], seasonal_periods=spec[3],
+                                initialization_method="estimated").fit()
+
+def fit_model(values: np.ndarray, spec: Tuple, horizon: int, train_split: float) -> Dict:
+    """
+    Score one model on a holdout, then refit it on the whole series and forecast.
+
+    Args:
+        values: Series values, oldest first
+        spec: A model_grid entry
+        horizon: Steps to forecast past the end of the series
+        train_split: Share of values used for the holdout fit
+
+    Returns:
+        Dict with rmse, mae, aic, bic, params and forecast, or error when the fit failed
+    """
+    # Imported before the filter below, which statsmodels' import-time filters would otherwise override
+    import statsmodels.tsa.api  # noqa: F401
+
+    with warnings.catch_warnings():
+        # Short annual series make statsmodels warn about convergence on most fits
+        warnings.simplefilter("ignore")
+        try:
+            train_size = int(len(values) * train_split)
+            holdout = np.asarray(_fit(values[:train_size], spec).forecast(len(values) - train_size))
+            error = holdout - values[train_size:]
+            fitted = _fit(values, spec)
+            forecast = np.asarray(fitted.forecast(horizon))
+            if not np.all(np.isfinite(error)) or not np.all(np.isfinite(forecast)):
+                raise ValueError("non-finite forecast")
+            return {
+                "rmse": float(np.sqrt(np.mean(error ** 2))),
+                "mae": float(np.mean(np.abs(error))),
+                "aic": float(fitted.aic),
+                "bic": float(fitted.bic),
+                "params": np.asarray(fitted.params, dtype=np.float64).tolist(),
+                "forecast": forecast.tolist(),
+            }
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+def _fit_task(args: Tuple[np.ndarray, Tuple, int, float]) -> Dict:
+    return fit_model(*args)
+
+def series_digest(series: pd.Series) -> str:
+    """Hash of a series' values and index; a fit is reused only while this is unchanged."""
+    digest = hashlib.sha256(np.ascontiguousarray(series.to_numpy(dtype=np.float64)).tobytes())
+    digest.update("\0".join(map(str, series.index)).encode('utf-8'))
+    return digest.hexdigest()
+
+def forecast_index(series: pd.Series, horizon: int) -> List[str]:
+    """Labels of the forecast steps: the next years or months after the series ends."""
+    last = series.index[-1]
+    return [str(last + step) for step in range(1, horizon + 1)]
+
+class ForecastEngine:
+    """
+    Fits model grids over many series on a process pool and caches every fit.
+
+    Each fit is stored in cache_dir as JSON under a key made of the series
+    digest, the model spec, horizon, train split and statsmodels version.
+    Re-running after a data change therefore refits only the series whose
+    values changed; every other fit is read back from disk.
+    """
+
+    def __init__(self,
+                 cache_dir: str = FORECAST_CACHE_DIR,
+                 workers: Optional[int] = None,
+                 horizon: int = FORECAST_HORIZON,
+                 train_split: float = FORECAST_TRAIN_SPLIT):
+        """
+        Args:
+            cache_dir: Directory for cached fits
+            workers: Processes for fitting (default: CPU count); 1 fits in this process
+            horizon: Steps to forecast
+            train_split: Share of each series used to fit when scoring on the holdout
+        """
+        import statsmodels
+
+        self.cache_dir = cache_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.horizon = horizon
+        self.train_split = train_split
+        self.version = statsmodels.__version__
+        self.fits = 0
+        self.cache_hits = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, digest: str, spec: Tuple) -> str:
+        parts = [digest, json.dumps(spec), str(self.horizon), str(self.train_split), self.version]
+        return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._cache_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: str, result: Dict) -> None:
+        path = self._cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+    def fit_all(self, series: Dict[str, pd.Series],
+                grids: Optional[Dict[str, List[Tuple]]] = None) -> Dict[str, List[Tuple[Tuple, Dict]]]:
+        """
+        Fit every (series, spec) pair that is not cached yet.
+
+        Args:
+            series: Series name -> series
+            grids: Series name -> specs (default: model_grid for the series' frequency)
+
+        Returns:
+            Series name -> [(spec, fit result)] in grid order
+        """
+        keys, pending = {}, []
+        results = {name: [] for name in series}
+        for name, values in series.items():
+            digest = series_digest(values)
+            array = values.to_numpy(dtype=np.float64)
+            grid = grids[name] if grids else model_grid(seasonal_periods(values))
+            for spec in grid:
+                key = self.key(digest, spec)
+                cached = self._load(key)
+                results[name].append([spec, cached])
+                if cached is None:
+                    keys[len(pending)] = (key, name, len(results[name]) - 1)
+                    pending.append((array, spec, self.horizon, self.train_split))
+        self.cache_hits += sum(len(fits) for fits in results.values()) - len(pending)
+        self.fits += len(pending)
+
+        if pending:
+            if self.workers == 1:
+                fitted = map(_fit_task, pending)
+            else:
+                executor = ProcessPoolExecutor(max_workers=self.workers)
+                chunksize = max(1, len(pending) // (self.workers * 4))
+                fitted = executor.map(_fit_task, pending, chunksize=chunksize)
+            try:
+                for i, result in enumerate(fitted):
+                    key, name, position = keys[i]
+                    self._store(key, result)
+                    results[name][position][1] = result
+            finally:
+                if self.workers != 1:
+                    executor.shutdown()
+        return {name: [tuple(fit) for fit in fits] for name, fits in results.items()}
+
+    def forecast(self, series: Dict[str, pd.Series],
+                 grids: Optional[Dict[str, List[Tuple]]] = None) -> Dict[str, Dict]:
+        """
+        Pick the best model per series by holdout RMSE and forecast with it.
+
+        The ensemble weights the best ARIMA and the best exponential smoothing
+        model by inverse RMSE, like the notebook's weighted ensemble.
+
+        Returns:
+            Series name -> {"best", "forecast", "ensemble", "models"}
+        """
+        forecasts = {}
+        for name, fits in self.fit_all(series, grids).items():
+            index = forecast_index(series[name], self.horizon)
+            scored = sorted((fit for fit in fits if "error" not in fit[1]), key=lambda fit: fit[1]["rmse"])
+            entry = {
+                "last": str(series[name].index[-1]),
+                "models": [{"model": spec_label(spec), **{k: result[k] for k in ("rmse", "mae", "aic", "bic")}}
+                           for spec, result in scored],
+                "failed": len(fits) - len(scored),
+            }
+            if scored:
+                best_spec, best = scored[0]
+                entry["best"] = spec_label(best_spec)
+                entry["forecast"] = dict(zip(index, best["forecast"]))
+                family_best = [next((fit for fit in scored if fit[0][0] == family), None) for family in ("arima", "ets")]
+                family_best = [fit for fit in family_best if fit is not None]
+                weights = np.array([1 / max(result["rmse"], 1e-12) for _, result in family_best])
+                ensemble = (weights / weights.sum()) @ np.array([result["forecast"] for _, result in family_best])
+                entry["ensemble"] = dict(zip(index, ensemble.tolist()))
+            forecasts[name] = entry
+        return forecasts
+
+def synthetic_series(count: int, length: int, seed: int = 0) -> Dict[str, pd.Series]:
+    """Monthly series with trend, yearly seasonality and noise, sized like the arrivals data."""
+    rng = np.random.default_rng(seed)
+    index = pd.period_range("2014-01", periods=length, freq="M")
+    months = np.arange(length)
+    series = {}
+    for i in range(count):
+        level = rng.uniform(2e5, 1e6)
+        values = (level * (1 + rng.uniform(-0.002, 0.01) * months)
+                  + level * rng.uniform(0.05, 0.3) * np.sin(2 * np.pi * (months + rng.integers(12)) / 12)
+                  + rng.normal(0, level * 0.03, length))
+        series[f"series_{i:05d}"] = pd.Series(values, index=index)
+    return series
+
+def benchmark(count: int, length: int, workers: int, changed: float) -> Dict[str, float]:
+    """
+    Time a synthetic many-series workload: serial, on the pool, fully cached, and with some series changed.
+
+    The grid is the notebook's ARIMA shortlist plus three smoothing models,
+    so a run stays in minutes rather than hours.
+    """
+    grid = [("arima", 1, 1, 0), ("arima", 0, 1, 1), ("arima", 1, 1, 1), ("arima", 2, 1, 0),
+            ("ets", "add", None, None), ("ets", None, "add", 12), ("ets", "add", "add", 12)]
+    series = synthetic_series(count, length)
+    grids = {name: grid for name in series}
+    workdir = tempfile.mkdtemp(prefix="forecast_benchmark_")
+    timings = {"series": count, "length": length, "fits": count * len(grid), "workers": workers}
+    try:
+        for case, case_workers, cache_dir in [("serial", 1, "serial"), ("pool", workers, "pool"),
+                                              ("cached", workers, "pool")]:
+            engine = ForecastEngine(os.path.join(workdir, cache_dir), workers=case_workers)
+            start = time.perf_counter()
+            engine.forecast(series, grids)
+            timings[f"{case}_s"] = time.perf_counter() - start
+            timings[f"{case}_fitted"] = engine.fits
+
+        rng = np.random.default_rng(1)
+        for name in rng.choice(list(series), size=max(1, int(count * changed)), replace=False):
+            series[name] = series[name] * 1.01
+        engine = ForecastEngine(os.path.join(workdir, "pool"), workers=workers)
+        start = time.perf_counter()
+        engine.forecast(series, grids)
+        timings["changed_s"] = time.perf_counter() - start
+        timings["changed_fitted"] = engine.fits
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel, cached tourism forecasts")
+    parser.add_argument("--cache-dir", default=FORECAST_CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Fitting processes (default: CPU count)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("forecast", help="Forecast the Data/ series")
+    run.add_argument("--data-dir", default=DATA_DIR)
+    run.add_argument("--series", nargs="+", default=None, help="Series to forecast (default: all)")
+    run.add_argument("--horizon", type=int, default=FORECAST_HORIZON)
+    run.add_argument("--output", default=None, help="Write the forecasts here as JSON")
+
+    bench = subparsers.add_parser("benchmark", help="Synthetic many-series workload")
+    bench.add_argument("--count", type=int, default=200, help="Number of series")
+    bench.add_argument("--length", type=int, default=96, help="Months per series")
+    bench.add_argument("--changed", type=float, default=0.1, help="Share of series changed before the last run")
+
+    args = parser.parse_args()
+    if args.command == "benchmark":
+        result = benchmark(args.count, args.length, args.workers or os.cpu_count() or 1, args.changed)
+        print(f"{result['series']} series x {result['length']} months, {result['fits']} fits, "
+              f"{result['workers']} workers")
+        for case in ("serial", "pool", "cached", "changed"):
+            print(f"{case:<8} {result[f'{case}_s']:>8.2f}s  {result[f'{case}_fitted']:>6} fitted")
+        return
+
+    series = load_series(args.data_dir)
+    if args.series:
+        unknown = [name for name in args.series if name not in series]
+        if unknown:
+            parser.error(f"Unknown series {', '.join(unknown)}; available: {', '.join(series)}")
+        series = {name: series[name] for name in args.series}
+    engine = ForecastEngine(args.cache_dir, workers=args.workers, horizon=args.horizon)
+    start = time.perf_counter()
+    forecasts = engine.forecast(series)
+    print(f"{engine.fits} fits, {engine.cache_hits} cached, in {time.perf_counter() - start:.2f}s")
+    for name, entry in forecasts.items():
+        if "best" not in entry:
+            print(f"{name}: every model failed")
+            continue
+        values = ", ".join(f"{step} {value:,.0f}" for step, value in entry["ensemble"].items())
+        print(f"{name}: best {entry['best']} (RMSE {entry['models'][0]['rmse']:,.1f}); ensemble {values}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(forecasts, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import argparse
+import json
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from lexical_index import index_store_digest
+from metadata_index import normalize_value, parse_number
+from mmap_store import load_nodes_dict
+
+# Written inside ./storage next to the llama_index stores
+GEO_DIR = "geo"
+META_FILE = "meta.json"
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Nearest-neighbour queries without a radius search among this many closest nodes
+NEAR_CANDIDATES = 50
+
+def parse_near(spec: str) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[str]]:
+    """
+    Split a proximity spec (see GeoIndex.mask) into (lat, lng, radius_km, name).
+
+    lat and lng are None when the spec names an attraction instead, and
+    radius_km is None for a nearest-nodes query.
+    """
+    parts = [part.strip() for part in spec.split(",")]
+    numbers = [parse_number(part) for part in parts]
+    if len(parts) >= 2 and numbers[0] is not None and numbers[1] is not None:
+        return numbers[0], numbers[1], numbers[2] if len(parts) > 2 else None, None
+    radius_km = None
+    if len(parts) > 1 and numbers[-1] is not None:
+        radius_km = numbers[-1]
+        parts = parts[:-1]
+    return None, None, radius_km, ",".join(parts)
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km between points given in degrees; broadcasts over arrays."""
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class GeoIndex:
+    """
+    Fixed-size lat/lng grid over point coordinates, searched with haversine distance.
+
+    Points are sorted by cell key (row-major over the grid), so each grid row
+    of a query's bounding box is one contiguous slice found with a binary
+    search. Only points in those slices have their exact distance computed.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, positions: np.ndarray,
+                 size: int, cell_deg: float = 0.1, names: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        Args:
+            lat: Latitudes in degrees
+            lng: Longitudes in degrees
+            positions: FAISS position of each point
+            size: Number of nodes in the index, the length of masks
+            cell_deg: Grid cell size in degrees
+            names: Normalized attraction name -> (lat, lng), for "near <name>" queries
+        """
+        self.cell_deg = cell_deg
+        self.n_rows = int(math.ceil(180 / cell_deg))
+        self.n_cols = int(math.ceil(360 / cell_deg))
+        self.size = size
+        self.names = names or {}
+
+        keys = self._keys(np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64))
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.lat = np.asarray(lat, dtype=np.float64)[order]
+        self.lng = np.asarray(lng, dtype=np.float64)[order]
+        self.positions = np.asarray(positions, dtype=np.int64)[order]
+
+    def _rows(self, lat):
+        return np.clip(np.floor((lat + 90) / self.cell_deg).astype(np.int64), 0, self.n_rows - 1)
+
+    def _cols(self, lng):
+        return np.floor((lng + 180) / self.cell_deg).astype(np.int64) % self.n_cols
+
+    def _keys(self, lat, lng):
+        return self._rows(lat) * self.n_cols + self._cols(lng)
+
+    def _candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        """Indices into the sorted arrays of points inside the query circle's bounding box."""
+        angular = radius_km / EARTH_RADIUS_KM
+        dlat = math.degrees(angular)
+        lat_lo, lat_hi = lat - dlat, lat + dlat
+        rows = np.arange(self._rows(np.float64(max(lat_lo, -90))), self._rows(np.float64(min(lat_hi, 90))) + 1)
+
+        # Longitude half-width of the circle's bounding box; the whole band near a pole
+        sin_ratio = math.sin(angular) / max(math.cos(math.radians(lat)), 1e-12)
+        if lat_lo <= -90 or lat_hi >= 90 or angular >= math.pi / 2 or sin_ratio >= 1:
+            col_ranges = [(0, self.n_cols - 1)]
+        else:
+            dlng = math.degrees(math.asin(sin_ratio))
+            col_lo = int(math.floor((lng - dlng + 180) / self.cell_deg))
+            col_hi = int(math.floor((lng + dlng + 180) / self.cell_deg))
+            if col_hi - col_lo + 1 >= self.n_cols:
+                col_ranges = [(0, self.n_cols - 1)]
+            elif col_lo < 0:
+                col_ranges = [(col_lo + self.n_cols, self.n_cols - 1), (0, col_hi)]
+            elif col_hi >= self.n_cols:
+                col_ranges = [(col_lo, self.n_cols - 1), (0, col_hi - self.n_cols)]
+            else:
+                col_ranges = [(col_lo, col_hi)]
+
+        starts = np.concatenate([rows * self.n_cols + lo for lo, _ in col_ranges])
+        ends = np.concatenate([rows * self.n_cols + hi + 1 for _, hi in col_ranges])
+        begin = np.searchsorted(self.keys, starts, side='left')
+        end = np.searchsorted(self.keys, ends, side='left')
+        slices = [np.arange(b, e) for b, e in zip(begin, end) if e > b]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def within(self, lat: float, lng: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Points within radius_km of (lat, lng).
+
+        Returns:
+            (FAISS positions, distances in km), nearest first
+        """
+        candidates = self._candidates(lat, lng, radius_km)
+        distances = haversine_km(lat, lng, self.lat[candidates], self.lng[candidates])
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return self.positions[candidates[order]], distances[order]
+
+    def nearest(self, lat: float, lng: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k points closest to (lat, lng).
+
+        The search radius starts at one grid cell and doubles until it holds
+        k points; everything closer than the k-th point is then inside it.
+
+        Returns:
+            (FAISS positions, distances in km), nearest first
+        """
+        radius_km = self.cell_deg * 111.2
+        while True:
+            positions, distances = self.within(lat, lng, radius_km)
+            if len(positions) >= k or radius_km >= math.pi * EARTH_RADIUS_KM:
+                return positions[:k], distances[:k]
+            radius_km *= 2
+
+    def locate(self, name: str) -> Optional[Tuple[float, float]]:
+        """Coordinates of an indexed attraction by name, or None."""
+        return self.names.get(normalize_value(name))
+
+    def mask(self, spec: str) -> np.ndarray:
+        """
+        Evaluate a proximity spec to a boolean mask over FAISS positions.
+
+        The spec is "lat,lng,km" for a radius search, "lat,lng" for the
+        NEAR_CANDIDATES nearest nodes, or the same with an attraction name in
+        place of "lat,lng", e.g. "Stanley Park,5".
+        """
+        lat, lng, radius_km, name = parse_near(spec)
+        if name is not None:
+            location = self.locate(name)
+            if location is None:
+                raise ValueError(f"No attraction named {name!r} with coordinates")
+            lat, lng = location
+
+        if radius_km is None:
+            positions, _ = self.nearest(lat, lng, NEAR_CANDIDATES)
+        else:
+            positions, _ = self.within(lat, lng, radius_km)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        return mask
+
+def build_geo_index(persist_dir: str, cell_deg: float = 0.1) -> int:
+    """
+    Collect node coordinates from the docstore and persist them for GeoIndex.
+
+    Args:
+        persist_dir: Directory with docstore.json and index_store.json
+        cell_deg: Grid cell size in degrees
+
+    Returns:
+        Number of nodes with valid coordinates
+    """
+    nodes_dict = load_nodes_dict(persist_dir)
+    with open(os.path.join(persist_dir, "docstore.json"), 'r', encoding='utf-8') as f:
+        docstore = json.load(f)["docstore/data"]
+
+    lat, lng, positions, names = [], [], [], {}
+    for position, node_id in nodes_dict.items():
+        metadata = docstore[node_id]["__data__"].get("metadata", {})
+        point_lat = parse_number(metadata.get("latitude"))
+        point_lng = parse_number(metadata.get("longitude"))
+        if point_lat is None or point_lng is None or not (-90 <= point_lat <= 90 and -180 <= point_lng <= 180):
+            continue
+        lat.append(point_lat)
+        lng.append(point_lng)
+        positions.append(int(position))
+        if metadata.get("name"):
+            names[normalize_value(metadata["name"])] = [point_lat, point_lng]
+
+    geo_dir = os.path.join(persist_dir, GEO_DIR)
+    os.makedirs(geo_dir, exist_ok=True)
+    np.save(os.path.join(geo_dir, "lat.npy"), np.array(lat, dtype=np.float64))
+    np.save(os.path.join(geo_dir, "lng.npy"), np.array(lng, dtype=np.float64))
+    np.save(os.path.join(geo_dir, "positions.npy"), np.array(positions, dtype=np.int64))
+    with open(os.path.join(geo_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "documents": max(int(p) for p in nodes_dict) + 1,
+            "points": len(positions),
+            "cell_deg": cell_deg,
+            "names": names,
+            "index_store_sha1": index_store_digest(persist_dir),
+        }, f)
+    print(f"Built geo index of {len(positions)} points in {geo_dir}")
+    return len(positions)
+
+def has_geo_index(persist_dir: str) -> bool:
+    """True if persist_dir has a geo index built from its current index_store.json."""
+    meta_path = os.path.join(persist_dir, GEO_DIR, META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("index_store_sha1") != index_store_digest(persist_dir):
+        print(f"Ignoring stale geo index in {persist_dir}; re-run geo_index.py build")
+        return False
+    return True
+
+def load_geo_index(persist_dir: str) -> GeoIndex:
+    """Load the coordinates written by build_geo_index and grid them."""
+    geo_dir = os.path.join(persist_dir, GEO_DIR)
+    with open(os.path.join(geo_dir, META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return GeoIndex(
+        np.load(os.path.join(geo_dir, "lat.npy")),
+        np.load(os.path.join(geo_dir, "lng.npy")),
+        np.load(os.path.join(geo_dir, "positions.npy")),
+        size=meta["documents"],
+        cell_deg=meta["cell_deg"],
+        names={name: tuple(point) for name, point in meta["names"].items()},
+    )
+
+def benchmark(points: int, queries: int, radius_km: float, k: int, cell_deg: float) -> Dict[str, float]:
+    """
+    Time radius and kNN queries on synthetic points clustered around cities.
+
+    Results are checked against a brute-force haversine scan.
+    """
+    rng = np.random.default_rng(0)
+    centers = np.column_stack([rng.uniform(-60, 70, 200), rng.uniform(-180, 180, 200)])
+    picks = rng.integers(0, len(centers), points)
+    lat = np.clip(centers[picks, 0] + rng.normal(0, 0.3, points), -90, 90)
+    lng = (centers[picks, 1] + rng.normal(0, 0.3, points) + 180) % 360 - 180
+    index = GeoIndex(lat, lng, np.arange(points), size=points, cell_deg=cell_deg)
+
+    query_points = [(lat[i] + rng.normal(0, 0.05), lng[i] + rng.normal(0, 0.05))
+                    for i in rng.integers(0, points, queries)]
+    timings = {"within": [], "nearest": []}
+    for q_lat, q_lng in query_points:
+        start = time.perf_counter()
+        positions, _ = index.within(q_lat, q_lng, radius_km)
+        timings["within"].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        nearest, _ = index.nearest(q_lat, q_lng, k)
+        timings["nearest"].append((time.perf_counter() - start) * 1000)
+
+    # Exactness check on a few queries
+    for q_lat, q_lng in query_points[:10]:
+        distances = haversine_km(q_lat, q_lng, lat, lng)
+        assert set(index.within(q_lat, q_lng, radius_km)[0]) == set(np.flatnonzero(distances <= radius_km))
+        assert np.allclose(np.sort(distances)[:k], index.nearest(q_lat, q_lng, k)[1])
+
+    return {
+        f"{name}_{stat}_ms": float(np.percentile(values, pct))
+        for name, values in timings.items()
+        for stat, pct in (("p50", 50), ("p99", 99))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Geospatial index over attraction coordinates")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the geo index inside a storage directory")
+    build.add_argument("--storage", default="./storage")
+    build.add_argument("--cell-deg", type=float, default=0.1, help="Grid cell size in degrees")
+
+    near = subparsers.add_parser("near", help="List nodes near a point or named attraction")
+    near.add_argument("spec", help='"lat,lng,km", "lat,lng" or "<attraction name>[,km]"')
+    near.add_argument("--storage", default="./storage")
+
+    bench = subparsers.add_parser("benchmark", help="Time radius and kNN queries on synthetic points")
+    bench.add_argument("--points", type=int, default=300_000)
+    bench.add_argument("--queries", type=int, default=1000)
+    bench.add_argument("--radius-km", type=float, default=5.0)
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--cell-deg", type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        from sharded_index import storage_dirs
+
+        # A sharded storage gets one geo index per shard
+        for persist_dir in storage_dirs(args.storage):
+            build_geo_index(persist_dir, cell_deg=args.cell_deg)
+    elif args.command == "near":
+        index = load_geo_index(args.storage)
+        start = time.perf_counter()
+        mask = index.mask(args.spec)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"{int(mask.sum())} nodes match in {elapsed_ms:.3f} ms: {np.flatnonzero(mask)[:20].tolist()}")
+    else:
+        results = benchmark(args.points, args.queries, args.radius_km, args.k, args.cell_deg)
+        print(f"{args.points} points, {args.queries} queries, radius {args.radius_km} km, k={args.k}")
+        print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Startup targets that can be profiled
+TARGETS = {
+    # Importing chat.py itself, which is what every request pays up front
+    "chat": "import chat",
+    # chat.py plus every backend the query path imports lazily
+    "query": "import chat; chat.import_query_backends()",
+}
+
+# Default cold start budgets (ms), generous enough for a slow CI machine; a
+# top-level import of the query backends in chat.py blows through "chat"
+BUDGETS_MS = {
+    "chat": 300.0,
+    "query": 6000.0,
+}
+
+# Packages chat.py must only import lazily, inside the functions that use them
+LAZY_PACKAGES = {
+    "chat": ("faiss", "numpy", "llama_index", "openai", "google", "tiktoken"),
+}
+
+def run_importtime(statement: str, python: str = sys.executable) -> List[Tuple[int, int, str]]:
+    """
+    Run a statement in a fresh interpreter with -X importtime.
+
+    Args:
+        statement: Python code to execute
+        python: Interpreter to use
+
+    Returns:
+        List of (self_us, cumulative_us, module_name) tuples, one per import
+    """
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # Only the traceback matters, not the importtime lines before it
+        lines = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        traceback = "\n".join(lines[-5:])
+        raise RuntimeError(f"Profiling `{statement}` failed:\n{traceback}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:       123 |        456 |   package.module"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+def summarize(rows: List[Tuple[int, int, str]]) -> Dict[str, float]:
+    """
+    Sum the self time of every imported module by its top-level package.
+
+    Args:
+        rows: Output of run_importtime
+
+    Returns:
+        Dictionary mapping top-level package name to milliseconds, largest first
+    """
+    totals = defaultdict(int)
+    for self_us, _, name in rows:
+        totals[name.strip().split(".")[0]] += self_us
+    ordered = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return {package: us / 1000 for package, us in ordered}
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize chat.py import cost per package")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="query",
+                        help="What to import: chat.py only, or chat.py plus the query backends")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to list")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Exit with status 1 when total import time exceeds this budget "
+                             "(default: the target's entry in BUDGETS_MS; 0 disables the check)")
+    args = parser.parse_args()
+
+    rows = run_importtime(TARGETS[args.target])
+    by_package = summarize(rows)
+    total_ms = sum(by_package.values())
+
+    print(f"Import profile for target '{args.target}': {len(rows)} modules, {total_ms:.1f} ms total")
+    print(f"{'package':<40} {'ms':>10} {'share':>7}")
+    for package, ms in list(by_package.items())[:args.top]:
+        print(f"{package:<40} {ms:>10.1f} {ms / total_ms:>7.1%}")
+
+    failed = False
+    eager = [package for package in LAZY_PACKAGES.get(args.target, ()) if package in by_package]
+    if eager:
+        print(f"FAIL: {', '.join(eager)} imported at startup; import them lazily where they are used")
+        failed = True
+
+    budget_ms = BUDGETS_MS[args.target] if args.budget_ms is None else args.budget_ms
+    if budget_ms > 0:
+        if total_ms > budget_ms:
+            print(f"FAIL: cold start {total_ms:.1f} ms is over the {budget_ms:.1f} ms budget")
+            failed = True
+        else:
+            print(f"OK: cold start {total_ms:.1f} ms is within the {budget_ms:.1f} ms budget")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
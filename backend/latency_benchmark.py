@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+from ann_index import VECTOR_STORE_FILE
+
+STAGES = ["imports", "storage_load", "query_embedding", "vector_search", "prompt_assembly",
+          "completion", "clean_output", "end_to_end"]
+
+CITIES = ["Vancouver", "Victoria", "Toronto", "Delhi", "Agra", "Jaipur", "Kyoto", "Paris", "Rome", "Lisbon"]
+CATEGORIES = ["Recommended Experiences", "Day Trips & Excursions", "Cultural Tours", "Food & Drink",
+              "Outdoor Activities", "Historical Sites", "Museums & Art Galleries"]
+WORDS = ["museum", "park", "tour", "garden", "historic", "river", "market", "temple", "beach", "view",
+         "walk", "food", "bridge", "island", "palace", "fort", "lake", "trail", "gallery", "harbour"]
+
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    _dumps = json.dumps
+
+class _NoEmbeddingCache:
+    """Always computes, so end_to_end measures the embedding call on every query."""
+
+    def get_or_compute(self, query, embed_fn):
+        return embed_fn(query)
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "n": int(len(values)),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+def build_synthetic_storage(persist_dir: str, documents: int, dim: int, seed: int = 0) -> None:
+    """
+    Write a ./storage-compatible directory with `documents` attraction-like nodes.
+
+    The small stores (graph, image) come from persisting a one-node index;
+    docstore.json and index_store.json are then streamed out directly,
+    because building a million nodes through llama_index objects takes far
+    longer than the benchmark itself. Vectors are random unit vectors in a
+    flat FAISS index, like the index the notebook builds.
+    """
+    from llama_index.core import Document, StorageContext, VectorStoreIndex
+    from llama_index.core.schema import TextNode
+    from llama_index.vector_stores.faiss import FaissVectorStore
+    from local_models import LocalEmbedding
+
+    os.makedirs(persist_dir, exist_ok=True)
+    vector_store = FaissVectorStore(faiss_index=faiss.IndexFlatL2(dim))
+    seed_index = VectorStoreIndex.from_documents(
+        [Document(text="seed")], storage_context=StorageContext.from_defaults(vector_store=vector_store),
+        embed_model=LocalEmbedding(dim=dim),
+    )
+    seed_index.storage_context.persist(persist_dir=persist_dir)
+    index_id = seed_index.index_id
+
+    rng = np.random.default_rng(seed)
+    template = TextNode(text="", id_="template").to_dict()
+    node_ids = []
+    with open(os.path.join(persist_dir, "docstore.json"), 'w', encoding='utf-8') as f:
+        f.write('{"docstore/data": {')
+        for i in range(documents):
+            node_id = f"synthetic-{i:08d}"
+            node_ids.append(node_id)
+            city = CITIES[i % len(CITIES)]
+            metadata = {
+                "doc_type": "attraction",
+                "name": f"Attraction {i}",
+                "city": city,
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "price": round(float(rng.uniform(0, 300)), 2),
+                "rating": round(float(rng.uniform(1, 5)), 1),
+            }
+            text = (f"Attraction: Attraction {i}\nLocation: {city}\nDescription: "
+                    + " ".join(rng.choice(WORDS, size=40)))
+            node = dict(template, id_=node_id, text=text, metadata=metadata, end_char_idx=len(text))
+            f.write(("," if i else "") + _dumps(node_id) + ': {"__data__": ' + _dumps(node) + ', "__type__": "1"}')
+        f.write('}, "docstore/metadata": {}, "docstore/ref_doc_info": {}}')
+
+    index_struct = {
+        "index_id": index_id, "summary": None, "doc_id_dict": {}, "embeddings_dict": {},
+        "nodes_dict": {str(i): node_id for i, node_id in enumerate(node_ids)},
+    }
+    with open(os.path.join(persist_dir, "index_store.json"), 'w', encoding='utf-8') as f:
+        json.dump({"index_store/data": {index_id: {"__type__": "vector_store", "__data__": _dumps(index_struct)}}}, f)
+
+    faiss_index = faiss.IndexFlatL2(dim)
+    for start in range(0, documents, 50_000):
+        block = rng.standard_normal((min(50_000, documents - start), dim)).astype(np.float32)
+        faiss_index.add(block / np.linalg.norm(block, axis=1, keepdims=True))
+    faiss.write_index(faiss_index, os.path.join(persist_dir, VECTOR_STORE_FILE))
+
+def measure_imports(repeats: int) -> List[float]:
+    """Cold-import chat.py plus the llama_index modules it uses, each in a fresh interpreter."""
+    code = ("import time; start = time.perf_counter(); import chat; "
+            "import llama_index.core, llama_index.vector_stores.faiss; "
+            "print((time.perf_counter() - start) * 1000)")
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "unused"))
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+def run_size(persist_dir: str, dim: int, queries: int, load_repeats: int, top_k: int,
+             llm_latency_ms: float, llm_jitter_ms: float, embed_latency_ms: float) -> Dict[str, List[float]]:
+    """Time every query stage, plus full query_vector_store calls, against one storage directory."""
+    from llama_index.core import QueryBundle
+    import chat
+    from local_models import FakeLLM, LocalEmbedding
+
+    embed_model = LocalEmbedding(dim=dim, latency_ms=embed_latency_ms)
+    model = FakeLLM(latency_ms=llm_latency_ms, jitter_ms=llm_jitter_ms)
+    timings = {stage: [] for stage in STAGES if stage != "imports"}
+
+    index = None
+    for _ in range(load_repeats):
+        start = time.perf_counter()
+        index = chat.load_index(persist_dir, embed_model=embed_model)
+        timings["storage_load"].append((time.perf_counter() - start) * 1000)
+
+    retriever = index.as_retriever(similarity_top_k=top_k)
+    rng = np.random.default_rng(1)
+    for i in range(queries):
+        query = f"{rng.choice(WORDS)} and {rng.choice(WORDS)} in {rng.choice(CITIES)} #{i}"
+
+        start = time.perf_counter()
+        embedding = embed_model.get_query_embedding(query)
+        after_embed = time.perf_counter()
+        nodes = retriever.retrieve(QueryBundle(query, embedding=embedding))
+        after_search = time.perf_counter()
+        prompt = chat.format_prompt(query, nodes)
+        after_prompt = time.perf_counter()
+        response = model.complete(prompt)
+        after_completion = time.perf_counter()
+        chat.clean_llm_output(response.text)
+        after_clean = time.perf_counter()
+
+        timings["query_embedding"].append((after_embed - start) * 1000)
+        timings["vector_search"].append((after_search - after_embed) * 1000)
+        timings["prompt_assembly"].append((after_prompt - after_search) * 1000)
+        timings["completion"].append((after_completion - after_prompt) * 1000)
+        timings["clean_output"].append((after_clean - after_completion) * 1000)
+
+        start = time.perf_counter()
+        chat.query_vector_store(f"{query} (again)", top_k=top_k, index=index, model=model,
+                                embedding_cache=_NoEmbeddingCache())
+        timings["end_to_end"].append((time.perf_counter() - start) * 1000)
+    return timings
+
+def compare(results: Dict, baseline: Dict, fail_ratio: float) -> List[str]:
+    """List stages whose p50 or p95 grew by more than fail_ratio against a baseline run."""
+    regressions = []
+    baseline_sizes = {entry["documents"]: entry["stages"] for entry in baseline["results"]}
+    for entry in results["results"]:
+        old_stages = baseline_sizes.get(entry["documents"])
+        if old_stages is None:
+            continue
+        for stage, stats in entry["stages"].items():
+            old = old_stages.get(stage)
+            if old is None:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                if old[key] > 0 and stats[key] / old[key] > fail_ratio:
+                    regressions.append(f"{entry['documents']} docs {stage} {key}: "
+                                       f"{old[key]:.3f} -> {stats[key]:.3f} ({stats[key] / old[key]:.2f}x)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark of chat.py with local model stand-ins")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Synthetic corpus sizes in documents")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per corpus size")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--import-repeats", type=int, default=5)
+    parser.add_argument("--load-repeats", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="Fake LLM delay per completion")
+    parser.add_argument("--llm-jitter-ms", type=float, default=200.0, help="Extra uniform random delay")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Fake embedding delay per request")
+    parser.add_argument("--mmap", action="store_true", help="Load storage through mmap_store (STORAGE_MMAP=1)")
+    parser.add_argument("--corpus-dir", default=None,
+                        help="Keep generated corpora here and reuse them across runs (default: temp dir)")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "latency_benchmark.json"),
+                        help="Results file; the default benchmarks/ directory is gitignored")
+    parser.add_argument("--baseline", default=None, help="Earlier output to compare against")
+    parser.add_argument("--fail-ratio", type=float, default=1.2, help="Slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+    import chat
+
+    chat.STORAGE_MMAP = args.mmap
+    corpus_root = args.corpus_dir or tempfile.mkdtemp(prefix="latency_benchmark_")
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "corpus_dir")}
+    results = {"config": config, "results": []}
+
+    imports = percentiles(measure_imports(args.import_repeats))
+    for size in args.sizes:
+        persist_dir = str(Path(corpus_root) / f"{size}_{args.dim}")
+        if not os.path.exists(os.path.join(persist_dir, "index_store.json")):
+            start = time.perf_counter()
+            build_synthetic_storage(persist_dir, size, args.dim)
+            print(f"Built {size}-document corpus in {time.perf_counter() - start:.1f}s")
+        if args.mmap:
+            from mmap_store import export_mmap_store, mmap_store_is_current
+
+            if not mmap_store_is_current(persist_dir):
+                export_mmap_store(persist_dir)
+
+        timings = run_size(persist_dir, args.dim, args.queries, args.load_repeats, args.top_k,
+                           args.llm_latency_ms, args.llm_jitter_ms, args.embed_latency_ms)
+        stages = {"imports": imports, **{stage: percentiles(values) for stage, values in timings.items()}}
+        results["results"].append({"documents": size, "stages": stages})
+
+        print(f"\n{size} documents")
+        print(f"{'stage':<16} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+        for stage in STAGES:
+            stats = stages[stage]
+            print(f"{stage:<16} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['p99_ms']:>10.3f}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.fail_ratio)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from mmap_store import load_nodes_dict
+
+# Written inside ./storage next to the llama_index stores
+LEXICAL_DIR = "lexical"
+VOCAB_FILE = "vocab.json"
+META_FILE = "meta.json"
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Filler words of travel queries ("i want to travel to ..."); they would only add noise
+STOPWORDS = frozenset("""
+a about an and are as at be but by can do for from had has have hey i in is it its
+me my of on or so some something tell that the their there this to us want was we
+what where which who will with would you your
+""".split())
+
+def node_getter(index) -> Callable[[int], object]:
+    """
+    Return a function that loads the node at a FAISS position.
+
+    Works on both the llama_index VectorStoreIndex and the MmapIndex that
+    chat.load_index can return.
+    """
+    if hasattr(index, "get_node"):
+        return index.get_node
+    nodes_dict = index.index_struct.nodes_dict
+    return lambda position: index.docstore.get_node(nodes_dict[str(position)])
+
+class Tokenizer:
+    """Lowercases, splits on non-word characters, drops stopwords and stems."""
+
+    def __init__(self, language: str = "english"):
+        import Stemmer
+
+        self.stemmer = Stemmer.Stemmer(language)
+
+    def __call__(self, text: str) -> List[str]:
+        words = [w for w in TOKEN_PATTERN.findall(text.lower()) if w not in STOPWORDS]
+        return self.stemmer.stemWords(words)
+
+def build_lexical_index(persist_dir: str, k1: float = 1.5, b: float = 0.75, language: str = "english") -> int:
+    """
+    Build the stemmed BM25 inverted index for the nodes in persist_dir.
+
+    Documents are numbered by FAISS position, so a lexical hit can be loaded
+    the same way as a vector hit. Postings are stored as CSR arrays with the
+    BM25 term-frequency weight already applied, which leaves only a gather and
+    an add per query term at search time.
+
+    Args:
+        persist_dir: Directory with docstore.json and index_store.json
+        k1: BM25 term frequency saturation
+        b: BM25 length normalization
+        language: Snowball stemmer language
+
+    Returns:
+        Number of nodes indexed
+    """
+    from llama_index.core.schema import MetadataMode
+    from llama_index.core.storage.docstore.utils import json_to_doc
+
+    nodes_dict = load_nodes_dict(persist_dir)
+    with open(os.path.join(persist_dir, "docstore.json"), 'r', encoding='utf-8') as f:
+        docstore = json.load(f)["docstore/data"]
+
+    count = max(int(position) for position in nodes_dict) + 1
+    node_ids = [""] * count
+    for position, node_id in nodes_dict.items():
+        node_ids[int(position)] = node_id
+
+    tokenize = Tokenizer(language)
+    vocab: Dict[str, int] = {}
+    postings: List[Dict[int, int]] = []
+    doc_lengths = np.zeros(count, dtype=np.float32)
+    for position, node_id in enumerate(node_ids):
+        if not node_id:
+            continue
+        # Metadata is included so names and cities stored as fields are searchable
+        text = json_to_doc(docstore[node_id]).get_content(metadata_mode=MetadataMode.EMBED)
+        tokens = tokenize(text)
+        doc_lengths[position] = len(tokens)
+        for token in tokens:
+            term_id = vocab.setdefault(token, len(vocab))
+            if term_id == len(postings):
+                postings.append({})
+            postings[term_id][position] = postings[term_id].get(position, 0) + 1
+
+    avg_length = float(doc_lengths.mean()) if count else 0.0
+    offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    docs = np.empty(offsets[-1], dtype=np.int32)
+    weights = np.empty(offsets[-1], dtype=np.float32)
+    idf = np.empty(len(postings), dtype=np.float32)
+    for term_id, term_postings in enumerate(postings):
+        start, end = offsets[term_id], offsets[term_id + 1]
+        term_docs = np.fromiter(term_postings.keys(), dtype=np.int32, count=len(term_postings))
+        tf = np.fromiter(term_postings.values(), dtype=np.float32, count=len(term_postings))
+        norm = 1 - b + b * doc_lengths[term_docs] / avg_length
+        docs[start:end] = term_docs
+        weights[start:end] = tf * (k1 + 1) / (tf + k1 * norm)
+        df = len(term_postings)
+        idf[term_id] = math.log(1 + (count - df + 0.5) / (df + 0.5))
+
+    lexical_dir = os.path.join(persist_dir, LEXICAL_DIR)
+    os.makedirs(lexical_dir, exist_ok=True)
+    np.save(os.path.join(lexical_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(lexical_dir, "docs.npy"), docs)
+    np.save(os.path.join(lexical_dir, "weights.npy"), weights)
+    np.save(os.path.join(lexical_dir, "idf.npy"), idf)
+    np.save(os.path.join(lexical_dir, "node_ids.npy"), np.array(node_ids, dtype=np.bytes_))
+    with open(os.path.join(lexical_dir, VOCAB_FILE), 'w', encoding='utf-8') as f:
+        json.dump(vocab, f)
+    with open(os.path.join(lexical_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "k1": k1, "b": b, "language": language, "documents": count, "terms": len(vocab),
+            "index_store_sha1": index_store_digest(persist_dir),
+        }, f)
+
+    print(f"Built lexical index of {count} nodes and {len(vocab)} terms in {lexical_dir}")
+    return count
+
+def index_store_digest(persist_dir: str) -> str:
+    """Hash of index_store.json; positions only line up with the index it was built from."""
+    with open(os.path.join(persist_dir, "index_store.json"), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def has_lexical_index(persist_dir: str) -> bool:
+    """True if persist_dir has a lexical index built from its current index_store.json."""
+    meta_path = os.path.join(persist_dir, LEXICAL_DIR, META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("index_store_sha1") != index_store_digest(persist_dir):
+        print(f"Ignoring stale lexical index in {persist_dir}; re-run lexical_index.py build")
+        return False
+    return True
+
+class LexicalIndex:
+    """Read-only BM25 index written by build_lexical_index; arrays are memory-mapped."""
+
+    def __init__(self, persist_dir: str):
+        lexical_dir = os.path.join(persist_dir, LEXICAL_DIR)
+        with open(os.path.join(lexical_dir, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(lexical_dir, VOCAB_FILE), 'r', encoding='utf-8') as f:
+            self.vocab = json.load(f)
+        self.offsets = np.load(os.path.join(lexical_dir, "offsets.npy"), mmap_mode='r')
+        self.docs = np.load(os.path.join(lexical_dir, "docs.npy"), mmap_mode='r')
+        self.weights = np.load(os.path.join(lexical_dir, "weights.npy"), mmap_mode='r')
+        self.idf = np.load(os.path.join(lexical_dir, "idf.npy"), mmap_mode='r')
+        self.node_ids = np.load(os.path.join(lexical_dir, "node_ids.npy"), mmap_mode='r')
+        self.tokenize = Tokenizer(self.meta["language"])
+
+    def node_id(self, position: int) -> str:
+        return self.node_ids[position].decode('utf-8')
+
+    def search(self, query: str, top_k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Score every node containing a query term with BM25.
+
+        Args:
+            query: Query text
+            top_k: Maximum number of hits
+            mask: Optional boolean mask over FAISS positions; other nodes are excluded
+
+        Returns:
+            Up to top_k (FAISS position, score) pairs, best first
+        """
+        term_ids = {self.vocab[t] for t in self.tokenize(query) if t in self.vocab}
+        if not term_ids:
+            return []
+        scores = np.zeros(self.meta["documents"], dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # Each node appears at most once per term, so fancy-index += is safe
+            scores[self.docs[start:end]] += self.idf[term_id] * self.weights[start:end]
+
+        if mask is not None:
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(position), float(scores[position])) for position in candidates]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge ranked lists of node IDs: each list adds 1 / (k + rank) to a node's score.
+
+    Returns:
+        (node ID, fused score) pairs, best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, 1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class HybridRetriever:
+    """Retriever that runs the vector and lexical searches in parallel and fuses them."""
+
+    def __init__(self, hybrid_index: "HybridIndex", similarity_top_k: int):
+        self.hybrid_index = hybrid_index
+        self.similarity_top_k = similarity_top_k
+        self.candidate_k = hybrid_index.candidate_k(similarity_top_k)
+        self.vector_retriever = hybrid_index.vector_index.as_retriever(similarity_top_k=self.candidate_k)
+
+    def candidates(self, query_bundle) -> Tuple[List, List[Tuple[int, float]]]:
+        """The unfused vector NodeWithScore list and lexical (position, score) hits."""
+        lexical_future = self.hybrid_index.executor.submit(
+            self.hybrid_index.lexical_index.search, query_bundle.query_str, self.candidate_k
+        )
+        vector_nodes = self.vector_retriever.retrieve(query_bundle)
+        return vector_nodes, lexical_future.result()
+
+    def retrieve(self, query_bundle) -> List:
+        return self.hybrid_index.fuse(*self.candidates(query_bundle), self.similarity_top_k)
+
+class HybridIndex:
+    """
+    Vector index paired with a persisted BM25 index, fused with reciprocal rank fusion.
+
+    Exposes as_retriever like the index it wraps, so chat.py uses it unchanged.
+    Exact-name queries find their node through the lexical ranking even when
+    the embedding of a short name is not close to the node's embedding.
+    """
+
+    def __init__(self, vector_index, lexical_index: LexicalIndex, rrf_k: int = 60, candidate_multiplier: int = 5):
+        """
+        Args:
+            vector_index: VectorStoreIndex or MmapIndex over the same storage
+            lexical_index: BM25 index built from that storage
+            rrf_k: Reciprocal rank fusion constant
+            candidate_multiplier: Each search returns this many times top_k candidates
+        """
+        self.vector_index = vector_index
+        self.lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+        self.get_node = node_getter(vector_index)
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical")
+
+    def candidate_k(self, top_k: int) -> int:
+        return max(top_k * self.candidate_multiplier, 20)
+
+    def fuse(self, vector_nodes: List, lexical_hits: List[Tuple[int, float]], top_k: int) -> List:
+        """Merge vector results and lexical (position, score) hits into top_k NodeWithScore by RRF score."""
+        from llama_index.core.schema import NodeWithScore
+
+        by_id = {node.node.node_id: node.node for node in vector_nodes}
+        lexical_ids = []
+        for position, _ in lexical_hits:
+            node_id = self.lexical_index.node_id(position)
+            lexical_ids.append(node_id)
+            if node_id not in by_id:
+                by_id[node_id] = position
+        fused = reciprocal_rank_fusion(
+            [[node.node.node_id for node in vector_nodes], lexical_ids], k=self.rrf_k
+        )[:top_k]
+
+        results = []
+        for node_id, score in fused:
+            node = by_id[node_id]
+            if isinstance(node, int):
+                node = self.get_node(node)
+            results.append(NodeWithScore(node=node, score=score))
+        return results
+
+    def lexical_nodes(self, vector_nodes: List, lexical_hits: List[Tuple[int, float]]) -> List:
+        """Lexical (position, score) hits as NodeWithScore with their BM25 score, reusing nodes the vector search loaded."""
+        from llama_index.core.schema import NodeWithScore
+
+        by_id = {node.node.node_id: node.node for node in vector_nodes}
+        results = []
+        for position, score in lexical_hits:
+            node_id = self.lexical_index.node_id(position)
+            node = by_id[node_id] if node_id in by_id else self.get_node(position)
+            results.append(NodeWithScore(node=node, score=score))
+        return results
+
+    def as_retriever(self, similarity_top_k: int = 2) -> HybridRetriever:
+        return HybridRetriever(self, similarity_top_k)
+
+def main():
+    parser = argparse.ArgumentParser(description="Persisted BM25 index for hybrid retrieval")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the lexical index inside a storage directory")
+    build.add_argument("--storage", default="./storage")
+    build.add_argument("--k1", type=float, default=1.5)
+    build.add_argument("--b", type=float, default=0.75)
+
+    search = subparsers.add_parser("search", help="Run a lexical-only query")
+    search.add_argument("query")
+    search.add_argument("--storage", default="./storage")
+    search.add_argument("--top-k", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_lexical_index(args.storage, k1=args.k1, b=args.b)
+        return
+
+    index = LexicalIndex(args.storage)
+    start = time.perf_counter()
+    hits = index.search(args.query, args.top_k)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for position, score in hits:
+        print(f"{score:8.3f}  {position:>7}  {index.node_id(position)}")
+    print(f"{len(hits)} hits in {elapsed_ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
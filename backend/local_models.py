@@ -0,0 +1,129 @@
+# Deterministic local stand-ins for the OpenAI embedding model and Gemini, used by
+# the benchmarks so they run without API keys or network access.
+import asyncio
+import hashlib
+import time
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms import (CompletionResponse, CompletionResponseAsyncGen, CompletionResponseGen, CustomLLM,
+                                   LLMMetadata)
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+def text_seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], 'little')
+
+class LocalEmbedding(BaseEmbedding):
+    """
+    Hash-seeded unit vectors: the same text always gets the same embedding.
+
+    latency_ms is slept per request (not per text), like one API round trip.
+    """
+
+    dim: int = 1536
+    latency_ms: float = 0.0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.random.default_rng(text_seed(text)).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _sleep(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._sleep()
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        self._sleep()
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._sleep()
+        return [self._embed(text) for text in texts]
+
+def fake_answer(prompt: str, length: int) -> str:
+    """A recommendation-shaped answer, tagged like Gemini's, padded to about `length` characters."""
+    rng = np.random.default_rng(text_seed(prompt))
+    words = ["museum", "park", "tour", "garden", "historic", "river", "market", "temple", "beach", "view"]
+    items = []
+    for i in range(1, 4):
+        body = " ".join(rng.choice(words, size=max(1, length // 24)))
+        items.append(f"{i}. Attraction {int(rng.integers(1000))}, Country: {body}.")
+    return ("<greeting>\nHi there! Here are some ideas for your trip.\n</greeting>\n\n"
+            "<recommendations>\n" + "\n\n".join(items) + "\n</recommendations>\n\n"
+            "<conclusion>\nHave a great trip!\n</conclusion>")
+
+class FakeLLM(CustomLLM):
+    """
+    LLM that waits latency_ms (plus up to jitter_ms) and returns a canned answer.
+
+    stream_complete spreads the same delay over `chunks` pieces; the async
+    variants sleep with asyncio so they can be cancelled and hedged.
+    prefill_ms_per_1k_chars adds a delay proportional to the prompt length,
+    and a slow_probability share of calls take slow_ms longer (a latency tail).
+    """
+
+    latency_ms: float = 800.0
+    jitter_ms: float = 0.0
+    prefill_ms_per_1k_chars: float = 0.0
+    slow_probability: float = 0.0
+    slow_ms: float = 0.0
+    response_chars: int = 1200
+    chunks: int = 20
+    seed: int = 0
+
+    def _delay(self, prompt: str) -> float:
+        rng = np.random.default_rng(self.seed + time.perf_counter_ns())
+        jitter = rng.uniform(0, self.jitter_ms)
+        tail = self.slow_ms if rng.random() < self.slow_probability else 0.0
+        return (self.latency_ms + jitter + tail + self.prefill_ms_per_1k_chars * len(prompt) / 1000) / 1000
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="fake-llm", is_chat_model=False)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self._delay(prompt))
+        return CompletionResponse(text=fake_answer(prompt, self.response_chars))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        text = fake_answer(prompt, self.response_chars)
+        delay = self._delay(prompt) / self.chunks
+        step = max(1, len(text) // self.chunks)
+        sent = ""
+        for start in range(0, len(text), step):
+            time.sleep(delay)
+            delta = text[start:start + step]
+            sent += delta
+            yield CompletionResponse(text=sent, delta=delta)
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        await asyncio.sleep(self._delay(prompt))
+        return CompletionResponse(text=fake_answer(prompt, self.response_chars))
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        text = fake_answer(prompt, self.response_chars)
+        delay = self._delay(prompt) / self.chunks
+        step = max(1, len(text) // self.chunks)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            sent = ""
+            for start in range(0, len(text), step):
+                await asyncio.sleep(delay)
+                delta = text[start:start + step]
+                sent += delta
+                yield CompletionResponse(text=sent, delta=delta)
+
+        return gen()
@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from lexical_index import HybridIndex, index_store_digest, node_getter
+from mmap_store import load_nodes_dict
+
+# Written inside ./storage next to the llama_index stores
+METADATA_DIR = "metadata"
+META_FILE = "meta.json"
+
+# Fields set by extract.create_attraction_document and the notebook's CSV / monument documents
+CATEGORICAL_FIELDS = ("doc_type", "city", "province", "country", "category", "location")
+NUMERIC_FIELDS = ("price", "rating", "year", "visitors")
+
+CLAUSE_PATTERN = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(.+?)\s*$", re.DOTALL)
+# A "," or "and" separates clauses only when a "<field><operator>" follows it, so
+# "country=Trinidad and Tobago" and "city=Bangkok, Thailand" stay one clause.
+# Quoted strings are matched first and skipped, so they never split.
+CLAUSE_SEPARATOR = re.compile(r"\"[^\"]*\"|'[^']*'|(,|\s+and\s+)(?=\s*\w+\s*(?:<=|>=|!=|=|<|>))", re.IGNORECASE)
+
+def normalize_value(value) -> str:
+    """Canonical form of a categorical value: "British_Columbia" and "british columbia" match."""
+    return re.sub(r"\s+", " ", str(value).replace("_", " ")).strip().lower()
+
+def parse_number(value) -> Optional[float]:
+    """Read a numeric metadata value such as 45, "4.5" or "$1,200"; None if it is not a number."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace("$", "").replace(",", "").strip())
+        except ValueError:
+            return None
+    return None
+
+def split_clauses(expression: str) -> List[str]:
+    """Split a filter expression at the "," / "and" separators that start a new clause."""
+    parts, start = [], 0
+    for match in CLAUSE_SEPARATOR.finditer(expression):
+        if match.group(1):
+            parts.append(expression[start:match.start()])
+            start = match.end()
+    parts.append(expression[start:])
+    return parts
+
+def unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+def parse_filter(expression: str) -> List[Tuple[str, str, object]]:
+    """
+    Parse a filter expression into (field, operator, value) clauses.
+
+    Clauses are joined with "," or "and" and must all hold; a value may
+    contain either as long as no "<field><operator>" follows, or be quoted.
+    Categorical fields take = or != and may list alternatives with "|";
+    numeric fields take = != < <= > >=, and != only matches nodes that have
+    a value. Example: 'city=Vancouver|Victoria, country="Trinidad and Tobago", price<100'.
+    """
+    clauses = []
+    for part in split_clauses(expression):
+        if not part.strip():
+            continue
+        match = CLAUSE_PATTERN.match(part)
+        if not match:
+            raise ValueError(f"Cannot parse filter clause {part.strip()!r}")
+        field, operator, raw = match.groups()
+        if field in CATEGORICAL_FIELDS:
+            if operator not in ("=", "!="):
+                raise ValueError(f"Field {field!r} is categorical and only supports = and !=")
+            value = [normalize_value(unquote(v)) for v in raw.split("|")]
+        elif field in NUMERIC_FIELDS:
+            value = parse_number(unquote(raw))
+            if value is None:
+                raise ValueError(f"Field {field!r} needs a number, got {raw!r}")
+        else:
+            raise ValueError(f"Unknown filter field {field!r}, expected one of {CATEGORICAL_FIELDS + NUMERIC_FIELDS}")
+        clauses.append((field, operator, value))
+    return clauses
+
+def build_metadata_index(persist_dir: str) -> int:
+    """
+    Build hash indexes for categorical fields and sorted arrays for numeric ones.
+
+    Nodes are numbered by FAISS position, like the lexical index. For each
+    categorical field the positions are grouped by value in one array, with a
+    JSON map from value to its [start, end) slice. For each numeric field the
+    values are stored sorted next to their positions, so a range is two
+    binary searches.
+
+    Args:
+        persist_dir: Directory with docstore.json and index_store.json
+
+    Returns:
+        Number of nodes indexed
+    """
+    nodes_dict = load_nodes_dict(persist_dir)
+    with open(os.path.join(persist_dir, "docstore.json"), 'r', encoding='utf-8') as f:
+        docstore = json.load(f)["docstore/data"]
+
+    count = max(int(position) for position in nodes_dict) + 1
+    categorical = {field: {} for field in CATEGORICAL_FIELDS}
+    numeric = {field: ([], []) for field in NUMERIC_FIELDS}
+    for position, node_id in nodes_dict.items():
+        metadata = docstore[node_id]["__data__"].get("metadata", {})
+        position = int(position)
+        for field in CATEGORICAL_FIELDS:
+            value = metadata.get(field)
+            if value not in (None, ""):
+                categorical[field].setdefault(normalize_value(value), []).append(position)
+        for field in NUMERIC_FIELDS:
+            value = parse_number(metadata.get(field))
+            if value is not None:
+                numeric[field][0].append(value)
+                numeric[field][1].append(position)
+
+    metadata_dir = os.path.join(persist_dir, METADATA_DIR)
+    os.makedirs(metadata_dir, exist_ok=True)
+    for field, groups in categorical.items():
+        slices = {}
+        positions = []
+        for value, value_positions in groups.items():
+            slices[value] = [len(positions), len(positions) + len(value_positions)]
+            positions.extend(sorted(value_positions))
+        np.save(os.path.join(metadata_dir, f"{field}.positions.npy"), np.array(positions, dtype=np.int64))
+        with open(os.path.join(metadata_dir, f"{field}.values.json"), 'w', encoding='utf-8') as f:
+            json.dump(slices, f)
+    for field, (values, positions) in numeric.items():
+        values = np.array(values, dtype=np.float64)
+        order = np.argsort(values, kind='stable')
+        np.save(os.path.join(metadata_dir, f"{field}.sorted.npy"), values[order])
+        np.save(os.path.join(metadata_dir, f"{field}.positions.npy"), np.array(positions, dtype=np.int64)[order])
+
+    with open(os.path.join(metadata_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "documents": count,
+            "categorical": list(CATEGORICAL_FIELDS),
+            "numeric": list(NUMERIC_FIELDS),
+            "index_store_sha1": index_store_digest(persist_dir),
+        }, f)
+    print(f"Built metadata index of {count} nodes in {metadata_dir}")
+    return count
+
+def has_metadata_index(persist_dir: str) -> bool:
+    """True if persist_dir has a metadata index built from its current index_store.json."""
+    meta_path = os.path.join(persist_dir, METADATA_DIR, META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("index_store_sha1") != index_store_digest(persist_dir):
+        print(f"Ignoring stale metadata index in {persist_dir}; re-run metadata_index.py build")
+        return False
+    return True
+
+class MetadataIndex:
+    """Read-only metadata indexes written by build_metadata_index; arrays are memory-mapped."""
+
+    def __init__(self, persist_dir: str):
+        metadata_dir = os.path.join(persist_dir, METADATA_DIR)
+        with open(os.path.join(metadata_dir, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.size = self.meta["documents"]
+        self.categorical = {}
+        for field in self.meta["categorical"]:
+            with open(os.path.join(metadata_dir, f"{field}.values.json"), 'r', encoding='utf-8') as f:
+                slices = json.load(f)
+            positions = np.load(os.path.join(metadata_dir, f"{field}.positions.npy"), mmap_mode='r')
+            self.categorical[field] = (slices, positions)
+        self.numeric = {
+            field: (
+                np.load(os.path.join(metadata_dir, f"{field}.sorted.npy"), mmap_mode='r'),
+                np.load(os.path.join(metadata_dir, f"{field}.positions.npy"), mmap_mode='r'),
+            )
+            for field in self.meta["numeric"]
+        }
+
+    def _matching(self, field: str, operator: str, value) -> np.ndarray:
+        """Positions that satisfy one clause, ignoring negation."""
+        if field in self.categorical:
+            slices, positions = self.categorical[field]
+            parts = [positions[slices[v][0]:slices[v][1]] for v in value if v in slices]
+            return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+        values, positions = self.numeric[field]
+        if operator in ("=", "!="):
+            lo = np.searchsorted(values, value, side='left')
+            hi = np.searchsorted(values, value, side='right')
+        elif operator == "<":
+            lo, hi = 0, np.searchsorted(values, value, side='left')
+        elif operator == "<=":
+            lo, hi = 0, np.searchsorted(values, value, side='right')
+        elif operator == ">":
+            lo, hi = np.searchsorted(values, value, side='right'), len(values)
+        else:
+            lo, hi = np.searchsorted(values, value, side='left'), len(values)
+        return positions[lo:hi]
+
+    def candidates(self, expression: str) -> np.ndarray:
+        """
+        Evaluate a filter expression (see parse_filter).
+
+        Returns:
+            Boolean mask over FAISS positions, True where every clause holds
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for field, operator, value in parse_filter(expression):
+            clause = np.zeros(self.size, dtype=bool)
+            clause[self._matching(field, operator, value)] = True
+            if operator != "!=":
+                mask &= clause
+            elif field in self.numeric:
+                # Nodes without a value are not "different from" it: only those with one can match
+                mask &= ~clause
+                present = np.zeros(self.size, dtype=bool)
+                present[self.numeric[field][1]] = True
+                mask &= present
+            else:
+                mask &= ~clause
+        return mask
+
+def search_params(faiss_index: faiss.Index, selector) -> faiss.SearchParameters:
+    """Search parameters restricted to a selector, keeping the index's nprobe / efSearch."""
+    if not isinstance(faiss_index, faiss.Index):
+        # A QuantizedIndex passes the selector on to its codes
+        return faiss.SearchParameters(sel=selector)
+    ivf = faiss.try_extract_index_ivf(faiss_index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(faiss_index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=faiss_index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def filtered_candidates(index, query_str: str, query_embedding, mask: np.ndarray,
+                        top_k: int) -> Tuple[List, Optional[List[Tuple[int, float]]]]:
+    """
+    The unfused candidates of filtered_search.
+
+    Returns:
+        (vector NodeWithScore list, lexical (position, score) hits), the
+        lexical hits None unless index is a HybridIndex; both hold
+        HybridIndex.candidate_k(top_k) results for a HybridIndex
+    """
+    from llama_index.core.schema import NodeWithScore
+
+    hybrid_index = None
+    search_k = top_k
+    if isinstance(index, HybridIndex):
+        hybrid_index = index
+        index = hybrid_index.vector_index
+        search_k = hybrid_index.candidate_k(top_k)
+
+    faiss_index = index.faiss_index if hasattr(index, "faiss_index") else index.vector_store.client
+    if not mask.any():
+        return [], [] if hybrid_index is not None else None
+    # Bits are read little-endian per byte by IDSelectorBitmap; keep the array alive during the search
+    bitmap = np.packbits(mask, bitorder='little')
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    query = np.asarray(query_embedding, dtype=np.float32)[np.newaxis, :]
+    distances, positions = faiss_index.search(query, search_k, params=search_params(faiss_index, selector))
+
+    get_node = node_getter(index)
+    nodes = [
+        NodeWithScore(node=get_node(int(position)), score=float(distance))
+        for distance, position in zip(distances[0], positions[0])
+        if position >= 0
+    ]
+    if hybrid_index is None:
+        return nodes, None
+    return nodes, hybrid_index.lexical_index.search(query_str, search_k, mask=mask)
+
+def filtered_search(index, query_str: str, query_embedding, mask: np.ndarray, top_k: int) -> List:
+    """
+    Vector (and, for a HybridIndex, lexical) search restricted to the positions in mask.
+
+    FAISS only scores vectors that pass the bitmap selector, so filtered
+    queries do less work than an unfiltered search and never spend top_k
+    slots on non-matching nodes. IVF indexes only look in nprobe lists, so
+    very selective filters can return fewer than top_k nodes there.
+
+    Args:
+        index: Index returned by chat.load_index
+        query_str: Query text, used by the lexical side of a HybridIndex
+        query_embedding: Query vector
+        mask: Boolean mask from MetadataIndex.candidates
+        top_k: Number of nodes to return
+
+    Returns:
+        NodeWithScore list, scored like the unfiltered retriever
+    """
+    nodes, lexical_hits = filtered_candidates(index, query_str, query_embedding, mask, top_k)
+    if lexical_hits is None:
+        return nodes
+    return index.fuse(nodes, lexical_hits, top_k)
+
+def main():
+    parser = argparse.ArgumentParser(description="Metadata indexes for filtered retrieval")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the metadata indexes inside a storage directory")
+    build.add_argument("--storage", default="./storage")
+
+    count = subparsers.add_parser("count", help="Count the nodes matching a filter expression")
+    count.add_argument("filter")
+    count.add_argument("--storage", default="./storage")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        from sharded_index import storage_dirs
+
+        # A sharded storage gets one metadata index per shard
+        for persist_dir in storage_dirs(args.storage):
+            build_metadata_index(persist_dir)
+        return
+
+    index = MetadataIndex(args.storage)
+    start = time.perf_counter()
+    mask = index.candidates(args.filter)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"{int(mask.sum())} of {index.size} nodes match in {elapsed_ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+from ann_index import VECTOR_STORE_FILE
+
+# Binary files written next to the JSON stores in ./storage
+NODE_IDS_FILE = "node_ids.npy"
+NODES_FILE = "nodes.bin"
+NODE_OFFSETS_FILE = "node_offsets.npy"
+# Signatures of the stores the tables were exported from
+MMAP_META_FILE = "mmap_store.json"
+MMAP_SOURCE_FILES = (VECTOR_STORE_FILE, "index_store.json", "docstore.json")
+
+# Zero-copy mmap of flat codes where this faiss build supports it
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+def load_nodes_dict(persist_dir: str) -> Dict[str, str]:
+    """Read the FAISS position -> node ID map from index_store.json."""
+    with open(os.path.join(persist_dir, "index_store.json"), 'r', encoding='utf-8') as f:
+        index_store = json.load(f)["index_store/data"]
+    index_struct = json.loads(next(iter(index_store.values()))["__data__"])
+    return index_struct["nodes_dict"]
+
+def _source_signature(persist_dir: str) -> Dict[str, Dict[str, int]]:
+    signature = {}
+    for name in MMAP_SOURCE_FILES:
+        stat = os.stat(os.path.join(persist_dir, name))
+        signature[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return signature
+
+def mmap_store_is_current(persist_dir: str) -> bool:
+    """
+    Whether the binary node tables match the stores they were exported from.
+
+    False when they were never exported, predate the signature, or the index
+    was rebuilt since (e.g. by incremental_index.py), in which case FAISS
+    positions would point at the wrong records.
+    """
+    try:
+        with open(os.path.join(persist_dir, MMAP_META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return meta["source"] == _source_signature(persist_dir)
+    except (OSError, ValueError, KeyError):
+        return False
+
+def export_mmap_store(persist_dir: str) -> int:
+    """
+    Write the binary node tables that MmapIndex reads.
+
+    node_ids.npy is a fixed-width byte array of node IDs indexed by FAISS
+    position. nodes.bin holds each node's docstore JSON in the same order,
+    with node_offsets.npy giving where each record starts and ends.
+
+    Args:
+        persist_dir: Directory with docstore.json and index_store.json
+
+    Returns:
+        Number of nodes written
+    """
+    nodes_dict = load_nodes_dict(persist_dir)
+
+    with open(os.path.join(persist_dir, "docstore.json"), 'r', encoding='utf-8') as f:
+        docstore = json.load(f)["docstore/data"]
+
+    count = max(int(position) for position in nodes_dict) + 1
+    node_ids = [""] * count
+    for position, node_id in nodes_dict.items():
+        node_ids[int(position)] = node_id
+    np.save(os.path.join(persist_dir, NODE_IDS_FILE), np.array(node_ids, dtype=np.bytes_))
+
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    with open(os.path.join(persist_dir, NODES_FILE), 'wb') as f:
+        for i, node_id in enumerate(node_ids):
+            record = json.dumps(docstore[node_id]).encode('utf-8') if node_id else b""
+            f.write(record)
+            offsets[i + 1] = offsets[i] + len(record)
+    np.save(os.path.join(persist_dir, NODE_OFFSETS_FILE), offsets)
+    with open(os.path.join(persist_dir, MMAP_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"nodes": count, "source": _source_signature(persist_dir)}, f)
+
+    print(f"Exported {count} nodes to binary tables in {persist_dir}")
+    return count
+
+class MmapRetriever:
+    """Minimal retriever over an MmapIndex, matching the llama_index retrieve() call chat.py makes."""
+
+    def __init__(self, index: "MmapIndex", similarity_top_k: int):
+        self.index = index
+        self.similarity_top_k = similarity_top_k
+
+    def retrieve(self, query_bundle) -> List:
+        if query_bundle.embedding is None:
+            raise ValueError("MmapRetriever needs a QueryBundle with a precomputed embedding")
+        return self.index.search(query_bundle.embedding, self.similarity_top_k)
+
+class MmapIndex:
+    """
+    Read-only index whose FAISS vectors and node records are memory-mapped.
+
+    Nothing is parsed up front, so every worker on a host maps the same files
+    and shares their pages through the OS page cache. Only the top-k node
+    records are deserialized per query.
+    """
+
+    def __init__(self, persist_dir: str):
+        if not mmap_store_is_current(persist_dir):
+            raise ValueError(f"Binary node tables in {persist_dir} are missing or older than the index; "
+                             f"re-run `python mmap_store.py export --storage {persist_dir}`")
+        self.faiss_index = faiss.read_index(os.path.join(persist_dir, VECTOR_STORE_FILE), MMAP_FLAGS)
+        self.node_ids = np.load(os.path.join(persist_dir, NODE_IDS_FILE), mmap_mode='r')
+        self.offsets = np.load(os.path.join(persist_dir, NODE_OFFSETS_FILE), mmap_mode='r')
+        self.records = np.memmap(os.path.join(persist_dir, NODES_FILE), dtype=np.uint8, mode='r')
+
+    def node_id(self, position: int) -> str:
+        return self.node_ids[position].decode('utf-8')
+
+    def get_node(self, position: int):
+        """Deserialize the node stored at a FAISS position."""
+        from llama_index.core.storage.docstore.utils import json_to_doc
+
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return json_to_doc(json.loads(self.records[start:end].tobytes()))
+
+    def search(self, query_embedding: List[float], top_k: int) -> List:
+        """Return the top_k nodes as NodeWithScore, scored like FaissVectorStore (L2 distance)."""
+        from llama_index.core.schema import NodeWithScore
+
+        query = np.asarray(query_embedding, dtype=np.float32)[np.newaxis, :]
+        distances, positions = self.faiss_index.search(query, top_k)
+        return [
+            NodeWithScore(node=self.get_node(int(position)), score=float(distance))
+            for distance, position in zip(distances[0], positions[0])
+            if position >= 0
+        ]
+
+    def as_retriever(self, similarity_top_k: int = 2) -> MmapRetriever:
+        return MmapRetriever(self, similarity_top_k)
+
+def memory_usage() -> Dict[str, int]:
+    """Resident, proportional and shared memory of this process in kB (Linux)."""
+    usage = {}
+    with open("/proc/self/smaps_rollup", 'r') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Shared_Clean:", "Shared_Dirty:", "Private_Clean:", "Private_Dirty:"):
+                usage[parts[0].rstrip(':').lower()] = int(parts[1])
+    return usage
+
+def _measure_child(persist_dir: str, mode: str, queries: int):
+    """Load the store in one mode, run some searches, report memory and wait to be released."""
+    from llama_index.core import QueryBundle
+
+    if mode == "mmap":
+        index = MmapIndex(persist_dir)
+        d = index.faiss_index.d
+    else:
+        from llama_index.core import MockEmbedding, StorageContext, load_index_from_storage
+        from llama_index.vector_stores.faiss import FaissVectorStore
+
+        vector_store = FaissVectorStore.from_persist_dir(persist_dir)
+        d = vector_store.client.d
+        storage_context = StorageContext.from_defaults(vector_store=vector_store, persist_dir=persist_dir)
+        index = load_index_from_storage(storage_context=storage_context, embed_model=MockEmbedding(embed_dim=d))
+
+    retriever = index.as_retriever(similarity_top_k=4)
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(queries):
+        retriever.retrieve(QueryBundle("", embedding=rng.standard_normal(d).tolist()))
+
+    print(json.dumps(memory_usage()), flush=True)
+    # Stay alive until the parent has read every worker, so pages are shared while measured
+    sys.stdin.read()
+
+def measure(persist_dir: str, workers: int, queries: int) -> Dict[str, Dict[str, float]]:
+    """
+    Start `workers` concurrent processes per load mode and average their memory.
+
+    Returns:
+        Mode -> average kB for rss, pss and the shared/private breakdown
+    """
+    results = {}
+    for mode in ("json", "mmap"):
+        processes = [
+            subprocess.Popen(
+                [sys.executable, __file__, "_child", "--storage", persist_dir, "--mode", mode, "--queries", str(queries)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            )
+            for _ in range(workers)
+        ]
+        usages = [json.loads(p.stdout.readline()) for p in processes]
+        for p in processes:
+            p.stdin.close()
+            p.wait()
+        results[mode] = {key: sum(u[key] for u in usages) / workers for key in usages[0]}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped vector store tables")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Write binary node tables next to the JSON stores")
+    export.add_argument("--storage", default="./storage")
+
+    bench = subparsers.add_parser("measure", help="Compare per-worker memory of JSON and mmap loading")
+    bench.add_argument("--storage", default="./storage")
+    bench.add_argument("--workers", type=int, default=4)
+    bench.add_argument("--queries", type=int, default=20)
+
+    child = subparsers.add_parser("_child")
+    child.add_argument("--storage", default="./storage")
+    child.add_argument("--mode", choices=["json", "mmap"], required=True)
+    child.add_argument("--queries", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_mmap_store(args.storage)
+    elif args.command == "_child":
+        _measure_child(args.storage, args.mode, args.queries)
+    else:
+        results = measure(args.storage, args.workers, args.queries)
+        print(f"Average memory per worker with {args.workers} concurrent workers (kB)")
+        print(f"{'mode':<6} {'rss':>10} {'pss':>10} {'private':>10} {'shared':>10}")
+        for mode, usage in results.items():
+            private = usage["private_clean"] + usage["private_dirty"]
+            shared = usage["shared_clean"] + usage["shared_dirty"]
+            print(f"{mode:<6} {usage['rss']:>10.0f} {usage['pss']:>10.0f} {private:>10.0f} {shared:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+// pythonPool.js
+// Keeps a fixed number of long-lived `python chat.py --worker` processes
+// around so the index and LLM client are loaded once instead of per request.
+const { spawn } = require('child_process');
+const readline = require('readline');
+
+// The asyncio worker (async_pipeline.py) enforces stage deadlines and can
+// cancel a request whose client went away; PYTHON_ASYNC=0 uses the plain loop
+const PYTHON_ASYNC = process.env.PYTHON_ASYNC !== '0';
+
+// A worker that dies before becoming ready is restarted after an exponentially
+// growing delay, so a broken environment does not respawn Python in a loop
+const RESTART_DELAY_MS = 500;
+const MAX_RESTART_DELAY_MS = 30000;
+
+class PythonWorker {
+  constructor(script, onIdle) {
+    this.script = script;
+    this.onIdle = onIdle;
+    this.ready = false;
+    this.current = null;
+    this.crashes = 0;
+    this.start();
+  }
+
+  start() {
+    this.ready = false;
+    this.restartTimer = null;
+    const args = PYTHON_ASYNC ? [this.script, '--worker', '--async'] : [this.script, '--worker'];
+    const child = spawn('python', args);
+    this.process = child;
+
+    child.stderr.on('data', (data) => {
+      console.error(`[python worker ${child.pid}] ${data.toString().trimEnd()}`);
+    });
+    // Writes to a worker that just died fail here; 'close' handles the job
+    child.stdin.on('error', (error) => {
+      console.error(`Python worker stdin error: ${error.message}`);
+    });
+
+    // Each stdout line is one JSON response from the worker
+    const lines = readline.createInterface({ input: child.stdout });
+    lines.on('line', (line) => {
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (error) {
+        console.error(`Ignoring non-JSON worker output: ${line}`);
+        return;
+      }
+
+      if (message.ready) {
+        this.ready = true;
+        this.crashes = 0;
+        this.onIdle(this);
+        return;
+      }
+
+      // Streamed pieces of the answer arrive before the final message
+      if (message.delta !== undefined) {
+        if (this.current && this.current.onDelta) {
+          this.current.onDelta(message.delta);
+        }
+        return;
+      }
+
+      const job = this.current;
+      this.current = null;
+      if (job) {
+        if (message.error) {
+          const error = new Error(message.error);
+          error.code = message.code;
+          error.stage = message.stage;
+          job.reject(error);
+        } else {
+          job.resolve(message.result);
+        }
+      }
+      this.onIdle(this);
+    });
+
+    // 'error' fires when python cannot be spawned (or killed); 'close' may or
+    // may not follow, so both just fail the current job and schedule a restart
+    child.on('error', (error) => {
+      this.fail(child, new Error(`Python worker failed: ${error.message}`));
+    });
+    child.on('close', (code) => {
+      this.fail(child, new Error(`Python worker exited with code ${code}`));
+    });
+  }
+
+  fail(child, error) {
+    if (child !== this.process || this.restartTimer) {
+      return;
+    }
+    this.ready = false;
+    const job = this.current;
+    this.current = null;
+    if (job) {
+      job.reject(error);
+    }
+    const delay = Math.min(RESTART_DELAY_MS * 2 ** this.crashes, MAX_RESTART_DELAY_MS);
+    this.crashes += 1;
+    console.error(`${error.message}, restarting in ${delay} ms`);
+    this.restartTimer = setTimeout(() => this.start(), delay);
+  }
+
+  cancel(job) {
+    // The sync worker cannot stop a request, so its answer is simply awaited
+    if (PYTHON_ASYNC && this.current === job) {
+      this.process.stdin.write(JSON.stringify({ cancel: job.id }) + '\n');
+    }
+  }
+
+  run(job) {
+    this.current = job;
+    this.process.stdin.write(JSON.stringify({
+      id: job.id,
+      query: job.query,
+      top_k: job.topK,
+      stream: Boolean(job.onDelta),
+      traceparent: job.traceparent
+    }) + '\n');
+  }
+}
+
+class PythonPool {
+  constructor(size, script = 'chat.py') {
+    this.queue = [];
+    this.nextId = 1;
+    this.workers = [];
+    for (let i = 0; i < size; i++) {
+      this.workers.push(new PythonWorker(script, (worker) => this.dispatch(worker)));
+    }
+  }
+
+  dispatch(worker) {
+    if (!worker.ready || worker.current || this.queue.length === 0) {
+      return;
+    }
+    worker.run(this.queue.shift());
+  }
+
+  // onDelta, when given, is called with each streamed piece of the answer;
+  // traceparent (W3C trace context) links the worker's spans to the request;
+  // aborting signal drops a queued request or cancels a running one
+  query(query, topK = 4, onDelta = null, traceparent = null, signal = null) {
+    return new Promise((resolve, reject) => {
+      const job = { id: this.nextId++, query, topK, onDelta, traceparent, resolve, reject };
+      if (signal) {
+        signal.addEventListener('abort', () => this.cancel(job), { once: true });
+      }
+      this.queue.push(job);
+      const idle = this.workers.find((worker) => worker.ready && !worker.current);
+      if (idle) {
+        this.dispatch(idle);
+      }
+    });
+  }
+
+  cancel(job) {
+    const queued = this.queue.indexOf(job);
+    if (queued !== -1) {
+      this.queue.splice(queued, 1);
+      const error = new Error('cancelled');
+      error.code = 'cancelled';
+      job.reject(error);
+      return;
+    }
+    const worker = this.workers.find((w) => w.current === job);
+    if (worker) {
+      worker.cancel(job);
+    }
+  }
+}
+
+module.exports = { PythonPool, PYTHON_ASYNC };
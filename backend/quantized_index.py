@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from ann_index import VECTOR_STORE_FILE, load_vectors
+
+# Written next to the JSON stores in ./storage; the flat index stays the source of truth
+CODES_FILE = "quantized_codes.faiss"
+CODES_META_FILE = "quantized_codes.json"
+FULL_VECTORS_FILE = "vectors.f32"
+
+CODE_TYPES = ["float", "int8", "binary"]
+
+def truncate(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """
+    Keep the first dims components and re-normalize.
+
+    text-embedding-3 models are trained so that a truncated, re-normalized
+    vector is what the API returns for `dimensions=dims`.
+    """
+    reduced = np.ascontiguousarray(vectors[:, :dims], dtype=np.float32)
+    norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+    return reduced / np.where(norms > 0, norms, 1)
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per component, packed 8 to a byte, for a binary FAISS index."""
+    return np.packbits(vectors > 0, axis=1)
+
+def build_codes(vectors: np.ndarray, code_type: str, dims: Optional[int] = None):
+    """
+    Build the compact first-pass index.
+
+    Args:
+        vectors: float32 matrix of shape (n, d)
+        code_type: "float" (truncation only), "int8" (scalar quantization) or "binary" (sign bits)
+        dims: Leading dimensions to keep (default: all)
+
+    Returns:
+        A faiss.Index, or a faiss.IndexBinary for "binary"
+    """
+    d = vectors.shape[1]
+    dims = dims or d
+    if dims > d:
+        raise ValueError(f"dims={dims} is larger than the vector dimension {d}")
+    reduced = truncate(vectors, dims) if dims < d else np.ascontiguousarray(vectors, dtype=np.float32)
+    if code_type == "float":
+        index = faiss.IndexFlatL2(dims)
+    elif code_type == "int8":
+        index = faiss.IndexScalarQuantizer(dims, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        index.train(reduced)
+    elif code_type == "binary":
+        if dims % 8:
+            raise ValueError(f"Binary codes need dims divisible by 8, got {dims}")
+        index = faiss.IndexBinaryFlat(dims)
+        reduced = binarize(reduced)
+    else:
+        raise ValueError(f"Unknown code type {code_type!r}, expected one of {CODE_TYPES}")
+    index.add(reduced)
+    return index
+
+class QuantizedIndex:
+    """
+    Two-pass search: compact codes in memory, full-precision vectors on disk.
+
+    The first pass searches the codes (truncated, int8 or binary) for
+    k * rescore candidates. The second pass reads those candidates' float32
+    vectors from a memory-mapped file and returns the exact L2 top-k, so
+    scores match IndexFlatL2. Only the codes need to stay resident; the
+    rescoring pages are shared through the OS page cache. Exposes the
+    d / ntotal / search interface FaissVectorStore and MmapIndex call, and
+    takes the selector params metadata_index.filtered_search passes.
+    """
+
+    def __init__(self, codes, code_type: str, dims: int, full_vectors: Optional[np.ndarray], rescore: int = 4):
+        """
+        Args:
+            codes: Index returned by build_codes
+            code_type: Its code type
+            dims: Dimensions kept in the codes
+            full_vectors: (n, d) float32 matrix (usually a memmap) for rescoring; None skips it
+            rescore: Candidates per result to rescore; 0 returns first-pass distances
+        """
+        self.codes = codes
+        self.code_type = code_type
+        self.dims = dims
+        self.full_vectors = full_vectors
+        self.rescore = rescore if full_vectors is not None else 0
+        self.d = full_vectors.shape[1] if full_vectors is not None else codes.d
+        self.ntotal = codes.ntotal
+
+    def _first_pass(self, queries: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        reduced = truncate(queries, self.dims) if self.dims < queries.shape[1] else queries
+        if self.code_type == "binary":
+            distances, ids = self.codes.search(binarize(reduced), k, params=params)
+            return distances.astype(np.float32), ids
+        return self.codes.search(reduced, k, params=params)
+
+    def search(self, queries: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search like faiss.Index.search.
+
+        Args:
+            queries: float32 matrix of shape (nq, d)
+            k: Results per query
+            params: faiss.SearchParameters; its selector (e.g. a filter bitmap)
+                restricts the first pass, so only selected ids are rescored
+
+        Returns:
+            (distances, ids) of shape (nq, k); squared L2 when rescoring, padded with -1 ids
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if not self.rescore:
+            return self._first_pass(queries, k, params)
+        _, candidates = self._first_pass(queries, min(self.ntotal, k * self.rescore), params)
+
+        distances = np.full((len(queries), k), np.finfo(np.float32).max, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            # Sorted positions read the memmap front to back
+            rows = np.sort(candidates[i][candidates[i] >= 0])
+            exact = ((self.full_vectors[rows] - query) ** 2).sum(axis=1)
+            best = np.argsort(exact, kind="stable")[:k]
+            distances[i, :len(best)] = exact[best]
+            ids[i, :len(best)] = rows[best]
+        return distances, ids
+
+    def memory_bytes(self) -> int:
+        """Resident size of the codes; the full vectors are mapped from disk."""
+        if self.code_type == "binary":
+            return int(faiss.serialize_index_binary(self.codes).nbytes)
+        return int(faiss.serialize_index(self.codes).nbytes)
+
+def _source_signature(persist_dir: str) -> Dict[str, int]:
+    stat = os.stat(os.path.join(persist_dir, VECTOR_STORE_FILE))
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def build_quantized_index(persist_dir: str, code_type: str, dims: Optional[int] = None) -> QuantizedIndex:
+    """
+    Write compact codes and a float32 vector file for the index in persist_dir.
+
+    The FAISS index in the storage is left as is, so loading without
+    QUANTIZED_INDEX keeps working. The codes record the storage index they
+    were built from and are ignored once it is rebuilt.
+    """
+    vectors = np.ascontiguousarray(load_vectors(persist_dir), dtype=np.float32)
+    dims = dims or vectors.shape[1]
+    codes = build_codes(vectors, code_type, dims)
+
+    full = np.memmap(os.path.join(persist_dir, FULL_VECTORS_FILE), dtype=np.float32, mode='w+', shape=vectors.shape)
+    full[:] = vectors
+    full.flush()
+    if code_type == "binary":
+        faiss.write_index_binary(codes, os.path.join(persist_dir, CODES_FILE))
+    else:
+        faiss.write_index(codes, os.path.join(persist_dir, CODES_FILE))
+    with open(os.path.join(persist_dir, CODES_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"code_type": code_type, "dims": dims, "d": vectors.shape[1], "ntotal": len(vectors),
+                   "source": _source_signature(persist_dir)}, f)
+
+    index = QuantizedIndex(codes, code_type, dims, np.memmap(
+        os.path.join(persist_dir, FULL_VECTORS_FILE), dtype=np.float32, mode='r', shape=vectors.shape))
+    print(f"Wrote {code_type} codes of {dims}/{vectors.shape[1]} dims for {len(vectors)} vectors to {persist_dir} "
+          f"({index.memory_bytes() / 2**20:.1f} MB resident, "
+          f"{vectors.nbytes / max(index.memory_bytes(), 1):.0f}x smaller than float32)")
+    return index
+
+def load_quantized_index(persist_dir: str, rescore: int = 4) -> Optional[QuantizedIndex]:
+    """
+    Load the codes written by build_quantized_index.
+
+    Returns:
+        The QuantizedIndex, or None when there are no codes or the storage index changed since
+    """
+    meta_path = os.path.join(persist_dir, CODES_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta["source"] != _source_signature(persist_dir):
+        print(f"Quantized codes in {persist_dir} are older than the FAISS index; rebuild them with quantized_index.py")
+        return None
+    codes_path = os.path.join(persist_dir, CODES_FILE)
+    codes = faiss.read_index_binary(codes_path) if meta["code_type"] == "binary" else faiss.read_index(codes_path)
+    full = np.memmap(os.path.join(persist_dir, FULL_VECTORS_FILE), dtype=np.float32, mode='r',
+                     shape=(meta["ntotal"], meta["d"])) if rescore else None
+    return QuantizedIndex(codes, meta["code_type"], meta["dims"], full, rescore)
+
+def benchmark(vectors: np.ndarray, queries: np.ndarray, configs: List[Dict], k: int = 10) -> List[Dict]:
+    """
+    Compare recall@k, single-query latency and resident memory against IndexFlatL2.
+
+    Args:
+        vectors: Corpus vectors, shape (n, d)
+        queries: Query vectors, shape (q, d)
+        configs: Dicts with code_type, dims and rescore; code_type "flat" is the baseline
+        k: Number of neighbours
+
+    Returns:
+        One result dict per config
+    """
+    import tempfile
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, k)
+
+    with tempfile.TemporaryDirectory(prefix="quantized_benchmark_") as workdir:
+        full = np.memmap(os.path.join(workdir, FULL_VECTORS_FILE), dtype=np.float32, mode='w+', shape=vectors.shape)
+        full[:] = vectors
+        full.flush()
+
+        results = []
+        for config in configs:
+            if config["code_type"] == "flat":
+                index, memory = flat, int(faiss.serialize_index(flat).nbytes)
+            else:
+                dims = config.get("dims") or vectors.shape[1]
+                index = QuantizedIndex(build_codes(vectors, config["code_type"], dims), config["code_type"],
+                                       dims, full, config.get("rescore", 4))
+                memory = index.memory_bytes()
+
+            latencies = []
+            found = np.empty_like(truth)
+            for i in range(len(queries)):
+                start = time.perf_counter()
+                _, found[i:i + 1] = index.search(queries[i:i + 1], k)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+            results.append({
+                **config,
+                "recall_at_k": float(recall),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "memory_mb": memory / 2**20,
+                "bytes_per_vector": memory / len(vectors),
+            })
+    return results
+
+def default_configs(dim: int, rescore: int) -> List[Dict]:
+    """Baseline, each code type at full and reduced dimensions, and int8/binary without rescoring."""
+    configs = [{"code_type": "flat"}]
+    for dims in sorted({dim, min(dim, 512), min(dim, 256)}, reverse=True):
+        code_types = ["int8", "binary"] if dims == dim else CODE_TYPES
+        configs.extend({"code_type": code_type, "dims": dims, "rescore": rescore} for code_type in code_types)
+    configs.extend({"code_type": code_type, "dims": dim, "rescore": 0} for code_type in ("int8", "binary"))
+    return configs
+
+def synthetic_vectors(count: int, dim: int, decay: float, rng) -> np.ndarray:
+    """
+    Clustered unit vectors whose variance falls off along the dimensions.
+
+    Documents gather around topics, so near neighbours are meaningful; with
+    isotropic random vectors every point is about equally far from all
+    others and recall@k is noise. With decay > 0 the leading dimensions
+    carry most of the signal, as in the truncatable text-embedding-3 vectors.
+    """
+    scale = 1 / np.sqrt(1 + decay * np.arange(dim, dtype=np.float32) / dim)
+    centers = rng.standard_normal((max(1, int(np.sqrt(count))), dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)]
+    vectors += 0.5 * rng.standard_normal((count, dim), dtype=np.float32)
+    vectors *= scale
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Truncated, int8 and binary embedding codes with rescoring")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Write codes for ./storage, used with QUANTIZED_INDEX=1")
+    build.add_argument("--storage", default="./storage")
+    build.add_argument("--type", choices=CODE_TYPES, required=True)
+    build.add_argument("--dims", type=int, default=None, help="Leading dimensions to keep (default: all)")
+
+    bench = subparsers.add_parser("benchmark", help="Recall, latency and memory against IndexFlatL2")
+    bench.add_argument("--storage", default="./storage", help="Index to take vectors from")
+    bench.add_argument("--synthetic", type=int, default=None, help="Use N synthetic vectors instead of --storage")
+    bench.add_argument("--dim", type=int, default=1536, help="Dimension of synthetic vectors")
+    bench.add_argument("--decay", type=float, default=8.0,
+                       help="How fast synthetic variance falls off across dimensions (0: isotropic)")
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--rescore", type=int, default=4, help="Candidates rescored per result")
+    bench.add_argument("--output", default=None, help="Also write results to this JSON file")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_quantized_index(args.storage, args.type, args.dims)
+        return
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim, args.decay, rng)
+    else:
+        vectors = load_vectors(args.storage)
+    # Queries are perturbed corpus vectors, so they have realistic near neighbours
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.01 * rng.standard_normal((len(picks), vectors.shape[1]), dtype=np.float32)
+
+    results = benchmark(vectors, queries, default_configs(vectors.shape[1], args.rescore), k=args.k)
+    print(f"{len(vectors)} vectors, d={vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'codes':<8} {'dims':>5} {'rescore':>7} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'MB':>9} {'B/vec':>7}")
+    for r in results:
+        print(f"{r['code_type']:<8} {r.get('dims', vectors.shape[1]):>5} {r.get('rescore', '-'):>7} "
+              f"{r['recall_at_k']:>9.3f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['memory_mb']:>9.1f} "
+              f"{r['bytes_per_vector']:>7.0f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
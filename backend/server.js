@@ -1,15 +1,76 @@
 // server.js
 const express = require('express');
 const { spawn } = require('child_process');
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
 const cors = require('cors');
 const bodyParser = require('body-parser');
 require('dotenv').config();
+const { PythonPool, PYTHON_ASYNC } = require('./pythonPool');
 
 // Initialize Express app
 const app = express();
 app.use(cors());
 app.use(bodyParser.json());
 
+// Number of long-lived chat.py workers; 0 spawns one process per request
+const PYTHON_WORKERS = parseInt(process.env.PYTHON_WORKERS || '2', 10);
+const pool = PYTHON_WORKERS > 0 ? new PythonPool(PYTHON_WORKERS) : null;
+
+// W3C trace context handed to chat.py so its spans (TELEMETRY_EXPORTER) join
+// the caller's trace; a new trace is started when the request carries none
+const TRACEPARENT_PATTERN = /^00-[0-9a-f]{32}-[0-9a-f]{16}-[0-9a-f]{2}$/;
+
+function traceparentFor(req) {
+  const incoming = req.get('traceparent');
+  if (incoming && TRACEPARENT_PATTERN.test(incoming)) {
+    return incoming;
+  }
+  return `00-${crypto.randomBytes(16).toString('hex')}-${crypto.randomBytes(8).toString('hex')}-01`;
+}
+
+function pythonEnv(traceparent) {
+  return { ...process.env, TRACEPARENT: traceparent };
+}
+
+// Aborted when the client disconnects before the response is finished
+function disconnectSignal(res) {
+  const controller = new AbortController();
+  res.on('close', () => {
+    if (!res.writableFinished) {
+      controller.abort();
+    }
+  });
+  return controller.signal;
+}
+
+// Stage deadlines in the async worker surface as 504s
+function errorStatus(error) {
+  return error.code === 'timeout' ? 504 : 500;
+}
+
+// Streamed answers are plain text, so a failure after the first chunk can only
+// be reported in-band: the stream then ends with an "[error] ..." line, and the
+// X-Stream-Status trailer says "ok" or "error" for clients that read trailers
+const STREAM_STATUS_TRAILER = 'X-Stream-Status';
+
+function endStream(res, error = null) {
+  if (res.writableEnded) {
+    return;
+  }
+  if (!error) {
+    res.addTrailers({ [STREAM_STATUS_TRAILER]: 'ok' });
+    res.end();
+    return;
+  }
+  if (!res.headersSent) {
+    res.status(errorStatus(error));
+  }
+  res.addTrailers({ [STREAM_STATUS_TRAILER]: 'error' });
+  res.end(`\n[error] ${error.message}\n`);
+}
+
 // API endpoint for travel recommendations
 app.post('/api/recommendations', (req, res) => {
   try {
@@ -18,9 +79,33 @@ app.post('/api/recommendations', (req, res) => {
     if (!query) {
       return res.status(400).json({ error: 'Query is required' });
     }
+
+    const traceparent = traceparentFor(req);
+    const traceId = traceparent.split('-')[1];
+    res.setHeader('X-Trace-Id', traceId);
+
+    const signal = disconnectSignal(res);
+
+    if (pool) {
+      pool.query(query, 4, null, traceparent, signal)
+        .then((output) => res.json({ recommendations: output }))
+        .catch((error) => {
+          if (error.code === 'cancelled') {
+            return;
+          }
+          console.error(`Python worker error (trace ${traceId}):`, error.message);
+          res.status(errorStatus(error)).json({
+            error: 'Error running Python script',
+            details: error.message
+          });
+        });
+      return;
+    }
     
     // Spawn a Python process to run your script
-    const pythonProcess = spawn('python', ['chat.py', query]);
+    const args = PYTHON_ASYNC ? ['chat.py', '--async', query] : ['chat.py', query];
+    const pythonProcess = spawn('python', args, { env: pythonEnv(traceparent) });
+    signal.addEventListener('abort', () => pythonProcess.kill(), { once: true });
     
     let output = '';
     let errorOutput = '';
@@ -37,8 +122,11 @@ app.post('/api/recommendations', (req, res) => {
     
     // Handle process completion
     pythonProcess.on('close', (code) => {
+      if (signal.aborted) {
+        return;
+      }
       if (code !== 0) {
-        console.error(`Python process exited with code ${code}`);
+        console.error(`Python process exited with code ${code} (trace ${traceId})`);
         console.error(`Error output: ${errorOutput}`);
         return res.status(500).json({ 
           error: 'Error running Python script', 
@@ -56,6 +144,132 @@ app.post('/api/recommendations', (req, res) => {
   }
 });
 
+// Streaming variant: writes the recommendation as plain text while it is generated
+app.post('/api/recommendations/stream', (req, res) => {
+  const { query } = req.body;
+
+  if (!query) {
+    return res.status(400).json({ error: 'Query is required' });
+  }
+
+  res.setHeader('Content-Type', 'text/plain; charset=utf-8');
+  res.setHeader('Cache-Control', 'no-cache');
+  res.setHeader('X-Accel-Buffering', 'no');
+  res.setHeader('Trailer', STREAM_STATUS_TRAILER);
+  const traceparent = traceparentFor(req);
+  const traceId = traceparent.split('-')[1];
+  res.setHeader('X-Trace-Id', traceId);
+  const signal = disconnectSignal(res);
+
+  if (pool) {
+    pool.query(query, 4, (delta) => res.write(delta), traceparent, signal)
+      .then(() => endStream(res))
+      .catch((error) => {
+        if (error.code === 'cancelled') {
+          return;
+        }
+        console.error(`Python worker error (trace ${traceId}):`, error.message);
+        endStream(res, error);
+      });
+    return;
+  }
+
+  const args = PYTHON_ASYNC ? ['chat.py', '--async', '--stream', query] : ['chat.py', '--stream', query];
+  const pythonProcess = spawn('python', args, { env: pythonEnv(traceparent) });
+  signal.addEventListener('abort', () => pythonProcess.kill(), { once: true });
+  let errorOutput = '';
+
+  // Forward stdout chunks as soon as Python flushes them
+  pythonProcess.stdout.on('data', (data) => res.write(data));
+  pythonProcess.stderr.on('data', (data) => {
+    errorOutput += data.toString();
+  });
+  pythonProcess.on('error', (error) => {
+    console.error(`Failed to start Python (trace ${traceId}):`, error.message);
+    endStream(res, new Error('Error running Python script'));
+  });
+  pythonProcess.on('close', (code) => {
+    if (signal.aborted) {
+      return;
+    }
+    if (code !== 0) {
+      console.error(`Python process exited with code ${code} (trace ${traceId})`);
+      console.error(`Error output: ${errorOutput}`);
+      endStream(res, new Error(`Python process exited with code ${code}`));
+      return;
+    }
+    endStream(res);
+  });
+});
+
+// Materialized dashboard views from aggregates.py, served as precomputed JSON.
+// A view is rebuilt (by aggregates.py, which also compares content hashes)
+// only when a source CSV's size or mtime differs from what the view recorded.
+const DATA_DIR = path.resolve(process.env.DATA_DIR || path.join(__dirname, '..', 'Data'));
+const AGGREGATE_CACHE_DIR = path.resolve(process.env.AGGREGATE_CACHE_DIR || './aggregates');
+const VIEW_PATTERN = /^[a-z0-9_]+$/;
+const aggregateBuilds = new Map();
+
+function aggregateIsCurrent(view) {
+  try {
+    const recorded = JSON.parse(fs.readFileSync(path.join(AGGREGATE_CACHE_DIR, `${view}.sources.json`), 'utf8'));
+    return fs.existsSync(path.join(AGGREGATE_CACHE_DIR, `${view}.json`)) &&
+      Object.entries(recorded.sources).every(([name, entry]) => {
+        const stat = fs.statSync(path.join(DATA_DIR, name), { bigint: true });
+        // mtime_ns is a string: nanoseconds do not fit in a JSON number
+        return Number(stat.size) === entry.size && stat.mtimeNs.toString() === entry.mtime_ns;
+      });
+  } catch (error) {
+    return false;
+  }
+}
+
+// One aggregates.py build per view at a time; concurrent requests share it
+function buildAggregate(view) {
+  if (!aggregateBuilds.has(view)) {
+    const build = new Promise((resolve, reject) => {
+      const pythonProcess = spawn('python', ['aggregates.py', '--data-dir', DATA_DIR,
+        '--cache-dir', AGGREGATE_CACHE_DIR, 'build', view]);
+      let errorOutput = '';
+      pythonProcess.stderr.on('data', (data) => {
+        errorOutput += data.toString();
+      });
+      pythonProcess.on('error', reject);
+      pythonProcess.on('close', (code) => {
+        if (code === 0) {
+          return resolve();
+        }
+        const error = new Error(errorOutput || `aggregates.py exited with code ${code}`);
+        // argparse usage errors (exit 2) mean the view does not exist
+        error.status = code === 2 ? 404 : 500;
+        reject(error);
+      });
+    }).finally(() => aggregateBuilds.delete(view));
+    aggregateBuilds.set(view, build);
+  }
+  return aggregateBuilds.get(view);
+}
+
+app.get('/api/aggregates/:view', async (req, res) => {
+  const { view } = req.params;
+  if (!VIEW_PATTERN.test(view)) {
+    return res.status(404).json({ error: `Unknown view ${view}` });
+  }
+  try {
+    if (!aggregateIsCurrent(view)) {
+      await buildAggregate(view);
+    }
+    res.setHeader('Cache-Control', 'no-cache');
+    res.type('application/json').sendFile(path.join(AGGREGATE_CACHE_DIR, `${view}.json`));
+  } catch (error) {
+    console.error(`Aggregate ${view} failed:`, error.message);
+    res.status(error.status || 500).json({
+      error: error.status === 404 ? `Unknown view ${view}` : 'Error building aggregate',
+      details: error.message
+    });
+  }
+});
+
 // Start server
 const PORT = process.env.PORT || 5000;
 app.listen(PORT, () => {
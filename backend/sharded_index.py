@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from ann_index import VECTOR_STORE_FILE, load_vectors
+
+# One ordinary storage directory per doc_type under ./storage/shards, written by
+# ingest.py --sharded or incremental_index.py --sharded
+SHARDS_DIR = "shards"
+ROUTER_CENTROIDS_FILE = "router_centroids.npy"
+ROUTER_META_FILE = "router.json"
+
+# Shards searched per query (0: all of them), and how far below the best
+# shard's centroid similarity another shard may score and still be searched
+SHARD_ROUTE_MAX = int(os.getenv("SHARD_ROUTE_MAX", "3"))
+SHARD_ROUTE_MARGIN = float(os.getenv("SHARD_ROUTE_MARGIN", "0.1"))
+# Centroids summarizing each shard for the router
+ROUTER_CENTROIDS = 8
+
+def list_shards(persist_dir: str) -> Dict[str, str]:
+    """Shard name (its doc_type) -> storage directory, for every built shard."""
+    root = os.path.join(persist_dir, SHARDS_DIR)
+    if not os.path.isdir(root):
+        return {}
+    return {
+        name: os.path.join(root, name)
+        for name in sorted(os.listdir(root))
+        if os.path.exists(os.path.join(root, name, VECTOR_STORE_FILE))
+    }
+
+def has_shards(persist_dir: str) -> bool:
+    return bool(list_shards(persist_dir))
+
+def storage_dirs(persist_dir: str) -> List[str]:
+    """The storage directory itself if it holds an index, then every shard: what per-index builds should cover."""
+    dirs = [persist_dir] if os.path.exists(os.path.join(persist_dir, "index_store.json")) else []
+    return dirs + list(list_shards(persist_dir).values())
+
+def _faiss_signature(shard_dir: str) -> Dict[str, int]:
+    stat = os.stat(os.path.join(shard_dir, VECTOR_STORE_FILE))
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def build_router(shard_dir: str, centroids: int = ROUTER_CENTROIDS) -> np.ndarray:
+    """
+    Summarize a shard by up to `centroids` spherical k-means centroids of its vectors.
+
+    Written next to the shard's FAISS index with that file's size and mtime,
+    so rebuilding one shard only invalidates its own router entry.
+
+    Returns:
+        Unit centroids, shape (c, d)
+    """
+    vectors = np.ascontiguousarray(load_vectors(shard_dir), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    # FAISS k-means wants at least 39 training points per centroid
+    k = max(1, min(centroids, len(vectors) // 39))
+    if len(vectors) == 0:
+        centers = vectors
+    elif k == 1:
+        centers = vectors.mean(axis=0, keepdims=True)
+    else:
+        kmeans = faiss.Kmeans(vectors.shape[1], k, niter=20, seed=0, spherical=True)
+        kmeans.train(vectors)
+        centers = kmeans.centroids
+    centers = centers / np.maximum(np.linalg.norm(centers, axis=1, keepdims=True), 1e-12)
+
+    np.save(os.path.join(shard_dir, ROUTER_CENTROIDS_FILE), centers.astype(np.float32))
+    with open(os.path.join(shard_dir, ROUTER_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"faiss": _faiss_signature(shard_dir), "nodes": len(vectors), "centroids": len(centers)}, f)
+    return centers
+
+def load_router(shard_dir: str) -> np.ndarray:
+    """The shard's router centroids, rebuilt first if the shard changed since they were written."""
+    try:
+        with open(os.path.join(shard_dir, ROUTER_META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta["faiss"] == _faiss_signature(shard_dir):
+            return np.load(os.path.join(shard_dir, ROUTER_CENTROIDS_FILE))
+    except (OSError, ValueError, KeyError):
+        pass
+    print(f"Building router centroids for {shard_dir}")
+    return build_router(shard_dir)
+
+class ShardRouter:
+    """
+    Picks the shards worth searching for a query.
+
+    A shard is chosen when its closest centroid is within `margin` cosine
+    similarity of the best shard's, up to max_shards; shards whose doc_type
+    words appear in the query ("monuments", "gender") are always added.
+    """
+
+    def __init__(self, centroids: Dict[str, np.ndarray], max_shards: int = SHARD_ROUTE_MAX,
+                 margin: float = SHARD_ROUTE_MARGIN):
+        self.centroids = centroids
+        self.max_shards = max_shards
+        self.margin = margin
+        self.keywords = {}
+        for name in centroids:
+            words = [re.escape(word) for word in name.lower().split("_") if len(word) > 3]
+            if words:
+                self.keywords[name] = re.compile(r"\b(?:" + "|".join(words) + r")s?\b", re.IGNORECASE)
+
+    def route(self, query_embedding, query_str: str = "") -> List[str]:
+        """Shard names to search, best first."""
+        names = list(self.centroids)
+        if self.max_shards <= 0 or len(names) <= self.max_shards:
+            return names
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = {
+            name: float((centers @ query).max()) if len(centers) else -np.inf
+            for name, centers in self.centroids.items()
+        }
+        ranked = sorted(names, key=scores.get, reverse=True)
+        chosen = [name for name in ranked if scores[name] >= scores[ranked[0]] - self.margin][:self.max_shards]
+        chosen += [name for name in ranked
+                   if name not in chosen and name in self.keywords and self.keywords[name].search(query_str)]
+        return chosen
+
+class ShardedRetriever:
+    """Retriever over a ShardedIndex, matching the llama_index retrieve() call chat.py makes."""
+
+    def __init__(self, index: "ShardedIndex", similarity_top_k: int):
+        self.index = index
+        self.similarity_top_k = similarity_top_k
+
+    def retrieve(self, query_bundle) -> List:
+        if query_bundle.embedding is None:
+            raise ValueError("ShardedRetriever needs a QueryBundle with a precomputed embedding")
+        return self.index.search(query_bundle.query_str, query_bundle.embedding, self.similarity_top_k)
+
+class ShardedIndex:
+    """
+    One index per doc_type, searched concurrently on the shards the router picks.
+
+    Each shard is an ordinary storage directory loaded by chat.load_index, so
+    it can be flat, ANN, quantized, memory-mapped or hybrid, and rebuilt on
+    its own. Either every shard is hybrid or none is: a shard's fused RRF
+    score only ranks it against its own results. Vector shards are merged
+    by L2 distance. For hybrid shards the unfused candidates are pooled
+    instead: vector candidates ranked by L2 distance, lexical hits by BM25
+    score, and reciprocal rank fusion applied once over the two pooled
+    rankings. BM25 scores carry each shard's own IDF, so the lexical pool
+    is ordered approximately.
+
+    Filters and proximity specs are evaluated against each shard's own
+    metadata and geo indexes (metadata_index.py / geo_index.py build cover
+    every shard), and then every shard with a matching node is searched
+    instead of the routed ones.
+    """
+
+    def __init__(self, persist_dir: str, load_shard: Callable[[str], object],
+                 max_shards: int = SHARD_ROUTE_MAX, margin: float = SHARD_ROUTE_MARGIN):
+        """
+        Args:
+            persist_dir: Storage directory holding shards/<doc_type>
+            load_shard: Loads one shard directory, e.g. chat.load_index
+            max_shards: Shards searched per query; 0 searches all
+            margin: Router similarity margin, see ShardRouter
+        """
+        from geo_index import has_geo_index, load_geo_index
+        from lexical_index import HybridIndex
+        from metadata_index import MetadataIndex, has_metadata_index
+
+        shard_dirs = list_shards(persist_dir)
+        if not shard_dirs:
+            raise ValueError(f"No shards in {os.path.join(persist_dir, SHARDS_DIR)}")
+        self.shards = {name: load_shard(path) for name, path in shard_dirs.items()}
+        hybrid = [name for name, shard in self.shards.items() if isinstance(shard, HybridIndex)]
+        if hybrid and len(hybrid) < len(self.shards):
+            missing = [name for name in self.shards if name not in hybrid]
+            raise ValueError(f"Only some shards have a lexical index (missing: {', '.join(missing)}); "
+                             f"run lexical_index.py build --storage <shard> on those, or delete the "
+                             f"lexical directories of the others")
+        self.hybrid = bool(hybrid)
+        self.metadata_indexes = {name: MetadataIndex(path) if has_metadata_index(path) else None
+                                 for name, path in shard_dirs.items()}
+        self.geo_indexes = {name: load_geo_index(path) if has_geo_index(path) else None
+                            for name, path in shard_dirs.items()}
+        self.router = ShardRouter({name: load_router(path) for name, path in shard_dirs.items()}, max_shards, margin)
+        self.executor = ThreadPoolExecutor(max_workers=min(8, len(self.shards)), thread_name_prefix="shard")
+
+    def _resolve_near(self, near: str) -> str:
+        """A proximity spec naming an attraction, rewritten to its coordinates so every shard can evaluate it."""
+        from geo_index import parse_near
+
+        _, _, radius_km, name = parse_near(near)
+        if name is None:
+            return near
+        for geo_index in self.geo_indexes.values():
+            location = geo_index.locate(name) if geo_index is not None else None
+            if location is not None:
+                return f"{location[0]},{location[1]}" + (f",{radius_km}" if radius_km is not None else "")
+        raise ValueError(f"No attraction named {name!r} with coordinates")
+
+    def candidate_masks(self, filters: Optional[str] = None, near: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Evaluate a filter expression and/or proximity spec on every shard.
+
+        Shards without a geo index have no coordinates and match no
+        proximity spec.
+
+        Returns:
+            Shard name -> boolean mask over its FAISS positions, for shards with at least one match
+        """
+        if filters and any(index is None for index in self.metadata_indexes.values()):
+            missing = [name for name, index in self.metadata_indexes.items() if index is None]
+            raise ValueError(f"Filters need a metadata index in every shard (missing: {', '.join(missing)}); "
+                             f"run metadata_index.py build")
+        if near:
+            if all(index is None for index in self.geo_indexes.values()):
+                raise ValueError("Proximity queries need a geo index; run geo_index.py build")
+            near = self._resolve_near(near)
+        masks = {}
+        for name in self.shards:
+            if near and self.geo_indexes[name] is None:
+                continue
+            mask = self.metadata_indexes[name].candidates(filters) if filters else None
+            if near:
+                near_mask = self.geo_indexes[name].mask(near)
+                mask = near_mask if mask is None else mask & near_mask
+            if mask.any():
+                masks[name] = mask
+        return masks
+
+    def search(self, query_str: str, query_embedding: List[float], top_k: int,
+               shards: Optional[List[str]] = None, filters: Optional[str] = None,
+               near: Optional[str] = None) -> List:
+        """
+        Search the routed shards and merge their results.
+
+        Args:
+            query_str: Query text, for keyword routing and hybrid shards
+            query_embedding: Query embedding
+            top_k: Nodes to return
+            shards: Search these shards instead of asking the router
+            filters: Metadata filter expression, see metadata_index.parse_filter
+            near: Proximity spec, see geo_index.GeoIndex.mask
+
+        Returns:
+            NodeWithScore list, best first
+        """
+        from llama_index.core import QueryBundle
+        from llama_index.core.schema import NodeWithScore
+        from lexical_index import reciprocal_rank_fusion
+        from metadata_index import filtered_candidates
+
+        masks = {}
+        if filters or near:
+            masks = self.candidate_masks(filters, near)
+            names = [name for name in shards or self.shards if name in masks]
+        else:
+            names = shards or self.router.route(query_embedding, query_str)
+        bundle = QueryBundle(query_str, embedding=query_embedding)
+
+        def search_shard(name):
+            """(vector NodeWithScore list, lexical NodeWithScore list or None), unfused"""
+            shard = self.shards[name]
+            if name in masks:
+                vector_nodes, lexical_hits = filtered_candidates(shard, query_str, query_embedding, masks[name], top_k)
+            elif self.hybrid:
+                vector_nodes, lexical_hits = shard.as_retriever(similarity_top_k=top_k).candidates(bundle)
+            else:
+                return shard.as_retriever(similarity_top_k=top_k).retrieve(bundle), None
+            if lexical_hits is None:
+                return vector_nodes, None
+            return vector_nodes, shard.lexical_nodes(vector_nodes, lexical_hits)
+
+        if len(names) == 1:
+            results = [search_shard(names[0])]
+        else:
+            futures = [self.executor.submit(search_shard, name) for name in names]
+            results = [future.result() for future in futures]
+
+        vector_nodes = sorted((node for nodes, _ in results for node in nodes), key=lambda node: node.score)
+        if not self.hybrid:
+            return vector_nodes[:top_k]
+
+        # One fusion over the pooled candidates, as deep as a single hybrid index's
+        first = self.shards[names[0]] if names else next(iter(self.shards.values()))
+        candidate_k = first.candidate_k(top_k)
+        lexical_nodes = sorted((node for _, nodes in results for node in nodes), key=lambda node: -node.score)
+        by_id = {node.node.node_id: node.node for node in vector_nodes + lexical_nodes}
+        fused = reciprocal_rank_fusion([
+            [node.node.node_id for node in vector_nodes[:candidate_k]],
+            [node.node.node_id for node in lexical_nodes[:candidate_k]],
+        ], k=first.rrf_k)
+        return [NodeWithScore(node=by_id[node_id], score=score) for node_id, score in fused[:top_k]]
+
+    def as_retriever(self, similarity_top_k: int = 2) -> ShardedRetriever:
+        return ShardedRetriever(self, similarity_top_k)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-doc_type shards of the vector index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    listing = subparsers.add_parser("list", help="List shards with their node counts")
+    listing.add_argument("--storage", default="./storage")
+
+    router = subparsers.add_parser("build-router", help="Rebuild router centroids")
+    router.add_argument("--storage", default="./storage")
+    router.add_argument("--shards", nargs="+", default=None, help="Only these shards (default: all)")
+
+    args = parser.parse_args()
+    shard_dirs = list_shards(args.storage)
+    if args.command == "list":
+        for name, path in shard_dirs.items():
+            index = faiss.read_index(os.path.join(path, VECTOR_STORE_FILE), faiss.IO_FLAG_MMAP)
+            print(f"{name:<24} {index.ntotal:>9} nodes  {path}")
+        return
+    for name in args.shards or shard_dirs:
+        if name not in shard_dirs:
+            parser.error(f"No shard {name!r} in {args.storage}; see the list command")
+        centers = build_router(shard_dirs[name])
+        print(f"{name:<24} {len(centers)} centroids")
+
+if __name__ == "__main__":
+    main()
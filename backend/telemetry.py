@@ -0,0 +1,171 @@
+# Per-stage OpenTelemetry spans and histograms for the recommendation pipeline.
+# Disabled unless TELEMETRY_EXPORTER is set; the opentelemetry packages are only
+# imported then, and stage() hands back a shared no-op object otherwise.
+import atexit
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# "console" (stderr), "file" (JSON lines in TELEMETRY_FILE) or empty to disable
+TELEMETRY_EXPORTER = os.getenv("TELEMETRY_EXPORTER", "").lower()
+TELEMETRY_FILE = os.getenv("TELEMETRY_FILE", "./telemetry.jsonl")
+TELEMETRY_METRICS_INTERVAL_MS = int(os.getenv("TELEMETRY_METRICS_INTERVAL_MS", "10000"))
+SERVICE_NAME = "travel-recommendations"
+
+_tracer = None
+_histograms = None
+_providers = []
+
+class _NoopStage:
+    """Stand-in for a stage span when telemetry is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+_NOOP = _NoopStage()
+
+def _file_streams(path: str):
+    """Span and metric output files; metrics go next to the spans as <name>.metrics.jsonl."""
+    root, ext = os.path.splitext(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    spans = open(path, 'a', encoding='utf-8')
+    metrics = open(f"{root}.metrics{ext or '.jsonl'}", 'a', encoding='utf-8')
+    return spans, metrics
+
+def setup(exporter: Optional[str] = None, path: Optional[str] = None) -> bool:
+    """
+    Configure tracing and metrics once per process.
+
+    Args:
+        exporter: "console" or "file"; defaults to TELEMETRY_EXPORTER
+        path: Span output file for the file exporter; defaults to TELEMETRY_FILE
+
+    Returns:
+        True if telemetry is enabled
+    """
+    global _tracer, _histograms
+    exporter = TELEMETRY_EXPORTER if exporter is None else exporter.lower()
+    if _tracer is not None or not exporter:
+        return _tracer is not None
+    if exporter not in ("console", "file"):
+        raise ValueError(f"Unknown TELEMETRY_EXPORTER {exporter!r}, expected console or file")
+
+    import sys
+    from opentelemetry import metrics, trace
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import ConsoleMetricExporter, PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if exporter == "file":
+        span_out, metric_out = _file_streams(path or TELEMETRY_FILE)
+        span_exporter = ConsoleSpanExporter(out=span_out, formatter=lambda span: span.to_json(indent=None) + "\n")
+        metric_exporter = ConsoleMetricExporter(out=metric_out,
+                                                formatter=lambda data: data.to_json(indent=None) + "\n")
+    else:
+        # stdout carries the answer (and the worker protocol), so the console is stderr
+        span_exporter = ConsoleSpanExporter(out=sys.stderr)
+        metric_exporter = ConsoleMetricExporter(out=sys.stderr)
+
+    resource = Resource.create({"service.name": SERVICE_NAME})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    meter_provider = MeterProvider(resource=resource, metric_readers=[
+        PeriodicExportingMetricReader(metric_exporter, export_interval_millis=TELEMETRY_METRICS_INTERVAL_MS),
+    ])
+    _providers.extend([tracer_provider, meter_provider])
+    atexit.register(shutdown)
+
+    _tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+    meter = metrics.get_meter(__name__, meter_provider=meter_provider)
+    _histograms = {
+        "duration": meter.create_histogram("recommendation.stage.duration", unit="ms",
+                                           description="Time spent in each pipeline stage"),
+        "nodes": meter.create_histogram("recommendation.retrieved_nodes", unit="{node}",
+                                        description="Nodes returned by retrieval"),
+        "prompt_chars": meter.create_histogram("recommendation.prompt.size", unit="By",
+                                               description="Characters in the prompt sent to the LLM"),
+        "response_chars": meter.create_histogram("recommendation.response.size", unit="By",
+                                                 description="Characters in the cleaned answer"),
+    }
+    return True
+
+def enabled() -> bool:
+    return _tracer is not None or (bool(TELEMETRY_EXPORTER) and setup())
+
+def shutdown() -> None:
+    """Flush and close the exporters; registered with atexit by setup."""
+    while _providers:
+        _providers.pop().shutdown()
+
+class _Stage:
+    """A span around one stage that also records its duration in the stage histogram."""
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._span_cm = _tracer.start_as_current_span(self.name, attributes=self.attributes)
+        self.span = self._span_cm.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def set(self, key: str, value) -> None:
+        """Set a span attribute; nodes / prompt_chars / response_chars also feed their histograms."""
+        self.span.set_attribute(key, value)
+        histogram = _histograms.get(key)
+        if histogram is not None:
+            histogram.record(value, {"stage": self.name})
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        _histograms["duration"].record(elapsed_ms, {"stage": self.name, "error": exc_type is not None})
+        return self._span_cm.__exit__(exc_type, exc, tb)
+
+def stage(name: str, **attributes):
+    """
+    Context manager timing one pipeline stage.
+
+    The returned object has set(key, value) for attributes only known at the
+    end, such as the retrieved node count. When telemetry is disabled this
+    is a shared no-op and costs one function call.
+
+    Args:
+        name: Span name, e.g. "retrieval"
+        **attributes: Span attributes known up front, e.g. top_k=4
+    """
+    if _tracer is None and not enabled():
+        return _NOOP
+    return _Stage(name, attributes)
+
+@contextmanager
+def trace_context(traceparent: Optional[str]):
+    """
+    Make spans opened inside this block children of a W3C traceparent.
+
+    server.js passes its request's traceparent to chat.py (in worker
+    requests or the TRACEPARENT environment variable), so the Python spans
+    join the same trace as the Node request.
+    """
+    if not traceparent or not enabled():
+        yield
+        return
+    from opentelemetry import context
+    from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+    token = context.attach(TraceContextTextMapPropagator().extract({"traceparent": traceparent}))
+    try:
+        yield
+    finally:
+        context.detach(token)
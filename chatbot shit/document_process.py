@@ -1,47 +1,321 @@
 import json
 import os
+import io
+import gzip
+import hashlib
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Tuple
+import numpy as np
 from llama_index.core import Document
 
-def export_documents_to_file(documents: List[Document], output_file: str = "tourism_documents.jsonl") -> str:
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used instead
+    orjson = None
+
+# Namespace for document IDs derived with uuid5, so IDs keep the UUID format
+DOCUMENT_ID_NAMESPACE = uuid.UUID("5b0e2f4c-6f1a-4c52-9d8e-3c1f7a2b9e10")
+
+def content_hash(text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
     """
-    Export LlamaIndex documents to a text file in JSONL format
+    Hash a document's text and metadata
     
     Args:
-        documents: List of LlamaIndex documents
-        output_file: Path to the output file
+        text: Document text
+        metadata: Document metadata
         
     Returns:
-        Path to the saved file
+        Hex SHA-256 digest, stable across runs and machines
     """
-    output_path = Path(output_file)
+    payload = json.dumps({'text': text, 'metadata': metadata or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def make_document_id(source: str, natural_key: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Derive a deterministic document ID from its source, natural key and content
     
-    # Create directory if it doesn't exist
+    Re-ingesting unchanged data gives the same IDs, so only new or changed
+    documents need to be embedded again.
+    
+    Args:
+        source: Where the document comes from, e.g. "tripadvisor_attraction"
+        natural_key: Key that identifies the record within its source, e.g. its URL
+        text: Document text
+        metadata: Document metadata
+        
+    Returns:
+        A UUID string
+    """
+    name = f"{source}|{natural_key}|{content_hash(text, metadata)}"
+    return str(uuid.uuid5(DOCUMENT_ID_NAMESPACE, name))
+
+def json_loads(data):
+    """
+    Parse one JSON value from str or bytes, with orjson when it is installed
+    
+    orjson rejects the NaN / Infinity literals that pandas-derived records
+    contain (and that json_dumps_line writes), so those fall back to json.loads.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+def json_dumps_line(obj: Dict[str, Any]) -> bytes:
+    """
+    Serialize a dict as one UTF-8 JSONL line
+    
+    Written with json.dumps rather than orjson, which would turn NaN into null;
+    json_loads reads the output back unchanged.
+    """
+    return (json.dumps(obj) + '\n').encode('utf-8')
+
+def open_jsonl(path: str, mode: str = 'rb'):
+    """
+    Open a JSONL file in binary mode, compressed according to its suffix
+    
+    ".gz" files use gzip and ".zst" files use zstandard (pip install zstandard);
+    anything else is read or written as-is.
+    
+    Args:
+        path: File path
+        mode: 'rb' or 'wb'
+        
+    Returns:
+        A binary file object
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == '.gz':
+        # Level 6 keeps writing fast; the size difference to 9 is small for text
+        return gzip.open(path, mode, compresslevel=6) if 'w' in mode else gzip.open(path, mode)
+    if suffix == '.zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Reading or writing .zst files needs the zstandard package") from None
+        if 'w' in mode:
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(path, mode), closefd=True)
+        # The raw zstd reader has no readline; buffering adds it
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, mode), closefd=True))
+    return open(path, mode)
+
+def is_compressed(path: str) -> bool:
+    """Whether open_jsonl decompresses this file (such files cannot be split by byte range)"""
+    return Path(path).suffix.lower() in ('.gz', '.zst')
+
+def iter_document_dicts(input_file: str,
+                        start: int = 0,
+                        end: Optional[int] = None,
+                        loads: Optional[Callable] = None,
+                        strict: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Stream document dicts ({'text', 'metadata', 'id'}) from a JSONL file
+    
+    Only one line is held in memory at a time. With a byte range, only lines
+    that start inside [start, end) are read, so a file can be split between
+    processes without lines being lost or read twice.
+    
+    Args:
+        input_file: Path to a JSONL file, optionally .gz or .zst compressed
+        start: Byte offset to start at (uncompressed files only)
+        end: Byte offset to stop at (uncompressed files only)
+        loads: JSON parser to use instead of json_loads
+        strict: Raise ValueError on an undecodable line instead of skipping it
+        
+    Returns:
+        Iterator of dicts; undecodable lines are reported and skipped
+    """
+    loads = loads or json_loads
+    if (start or end is not None) and is_compressed(input_file):
+        raise ValueError("Byte ranges are only supported for uncompressed files")
+    
+    with open_jsonl(input_file, 'rb') as f:
+        if start:
+            # Finish the line that straddles start; it belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        while end is None or f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                yield loads(line)
+            except ValueError as e:
+                if strict:
+                    raise ValueError(f"{input_file}: could not decode JSON line {line[:200]!r}: {e}") from e
+                print(f"Error: Could not decode JSON line: {line[:200]!r}")
+
+def iter_documents(input_file: str, loads: Optional[Callable] = None, strict: bool = False) -> Iterator[Document]:
+    """
+    Stream LlamaIndex documents from a JSONL file, one at a time
+    
+    Args:
+        input_file: Path to a JSONL file, optionally .gz or .zst compressed
+        loads: JSON parser to use instead of json_loads
+        strict: Raise ValueError on an undecodable line instead of skipping it
+        
+    Returns:
+        Iterator of documents
+    """
+    for doc_dict in iter_document_dicts(input_file, loads=loads, strict=strict):
+        yield Document(
+            text=doc_dict['text'],
+            metadata=doc_dict.get('metadata', {}),
+            id_=doc_dict.get('id')
+        )
+
+def iter_json_records(input_file: str, chunk_chars: int = 2**20) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the elements of a JSON array file, or the lines of a JSONL file
+    
+    Arrays are decoded one element at a time from chunk_chars reads, so the
+    file's text is never held in memory whole; what the caller keeps of the
+    decoded elements is up to it.
+    
+    Args:
+        input_file: Path to a JSON array or JSONL file, optionally .gz or .zst compressed
+        chunk_chars: Characters read at a time
+        
+    Returns:
+        Iterator of the decoded elements
+    """
+    decoder = json.JSONDecoder()
+    with open_jsonl(input_file, 'rb') as raw, io.TextIOWrapper(raw, encoding='utf-8') as f:
+        buffer = f.read(chunk_chars).lstrip()
+        if not buffer.startswith('['):
+            # JSONL: no seek back, which decompressed streams do not support.
+            # Finish the line the first read stopped in and go on from there.
+            for line in (buffer + f.readline()).splitlines():
+                if line.strip():
+                    yield json.loads(line)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        
+        position = 1
+        while True:
+            # Skip separators, reading on when the buffer runs out
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer):
+                    break
+                buffer, position = f.read(chunk_chars), 0
+                if not buffer:
+                    raise ValueError(f"{input_file}: JSON array is not closed")
+            if buffer[position] == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                more = f.read(chunk_chars)
+                if not more:
+                    raise
+                buffer, position = buffer[position:] + more, 0
+                continue
+            yield value
+            position = end
+
+def split_byte_ranges(input_file: str, parts: int) -> List[Tuple[int, int]]:
+    """Split a file into `parts` contiguous byte ranges of about equal size"""
+    size = os.path.getsize(input_file)
+    bounds = [size * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i + 1] > bounds[i]]
+
+def _parse_byte_range(args: Tuple[str, int, int]) -> List[Dict[str, Any]]:
+    input_file, start, end = args
+    return list(iter_document_dicts(input_file, start, end))
+
+def parallel_iter_document_dicts(input_file: str,
+                                 workers: Optional[int] = None,
+                                 chunk_bytes: int = 32 * 2**20) -> Iterator[Dict[str, Any]]:
+    """
+    Parse a large uncompressed JSONL file in several processes, split by byte range
+    
+    Ranges are yielded in file order, so the output matches iter_document_dicts.
+    Memory is bounded by about workers * chunk_bytes of parsed documents.
+    Compressed files cannot be split and are read sequentially.
+    
+    Args:
+        input_file: Path to a JSONL file
+        workers: Number of processes (default: CPU count)
+        chunk_bytes: Approximate bytes parsed per task
+        
+    Returns:
+        Iterator of document dicts
+    """
+    if is_compressed(input_file):
+        yield from iter_document_dicts(input_file)
+        return
+    
+    workers = workers or os.cpu_count() or 1
+    parts = max(workers, os.path.getsize(input_file) // chunk_bytes + 1)
+    tasks = [(input_file, start, end) for start, end in split_byte_ranges(input_file, parts)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep at most `workers` ranges in flight so parsed results do not pile up
+        pending = [executor.submit(_parse_byte_range, task) for task in tasks[:workers]]
+        next_task = len(pending)
+        while pending:
+            records = pending.pop(0).result()
+            if next_task < len(tasks):
+                pending.append(executor.submit(_parse_byte_range, tasks[next_task]))
+                next_task += 1
+            yield from records
+
+def write_documents(documents: Iterable[Document], output_file: str) -> int:
+    """
+    Write documents to a JSONL file as they are produced
+    
+    Args:
+        documents: Any iterable of LlamaIndex documents, e.g. a generator
+        output_file: Path to the output file; ".gz" / ".zst" are compressed
+        
+    Returns:
+        Number of documents written
+    """
+    output_path = Path(output_file)
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # Write documents to file in JSONL format
-    with open(output_path, 'w', encoding='utf-8') as f:
+    count = 0
+    with open_jsonl(str(output_path), 'wb') as f:
         for doc in documents:
-            # Convert document to dict
-            doc_dict = {
-                'text': doc.text,
-                'metadata': doc.metadata,
-                'id': doc.id_
-            }
-            
-            # Write as JSON line
-            f.write(json.dumps(doc_dict) + '\n')
+            f.write(json_dumps_line({'text': doc.text, 'metadata': doc.metadata, 'id': doc.id_}))
+            count += 1
+    return count
+
+def export_documents_to_file(documents: Iterable[Document], output_file: str = "tourism_documents.jsonl") -> str:
+    """
+    Export LlamaIndex documents to a text file in JSONL format
     
-    print(f"Exported {len(documents)} documents to {output_path}")
-    return str(output_path)
+    Args:
+        documents: List (or any iterable) of LlamaIndex documents
+        output_file: Path to the output file; ".gz" / ".zst" are compressed
+        
+    Returns:
+        Path to the saved file
+    """
+    count = write_documents(documents, output_file)
+    print(f"Exported {count} documents to {output_file}")
+    return str(Path(output_file))
 
-def import_documents_from_file(input_file: str = "tourism_documents.jsonl") -> List[Document]:
+def import_documents_from_file(input_file: str = "tourism_documents.jsonl", strict: bool = False) -> List[Document]:
     """
     Import LlamaIndex documents from a text file in JSONL format
     
+    Use iter_documents instead to process large files without holding them in memory.
+    
     Args:
-        input_file: Path to the input file
+        input_file: Path to the input file; ".gz" / ".zst" are decompressed
+        strict: Raise instead of returning [] for a missing file or skipping
+            undecodable lines, for callers that must not act on partial input
         
     Returns:
         List of LlamaIndex documents
@@ -50,77 +324,63 @@ def import_documents_from_file(input_file: str = "tourism_documents.jsonl") -> L
     
     # Check if file exists
     if not input_path.exists():
+        if strict:
+            raise FileNotFoundError(f"File {input_path} does not exist")
         print(f"Error: File {input_path} does not exist")
         return []
     
-    documents = []
-    
-    # Read documents from file
-    with open(input_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                # Parse JSON line
-                doc_dict = json.loads(line.strip())
-                
-                # Create LlamaIndex document
-                doc = Document(
-                    text=doc_dict['text'],
-                    metadata=doc_dict.get('metadata', {}),
-                    id_=doc_dict.get('id')
-                )
-                
-                documents.append(doc)
-            except json.JSONDecodeError:
-                print(f"Error: Could not decode JSON line: {line}")
-                continue
-    
+    documents = list(iter_documents(str(input_path), strict=strict))
     print(f"Imported {len(documents)} documents from {input_path}")
     return documents
 
-def export_tourism_documents(documents: List[Document], 
+def export_tourism_documents(documents: Iterable[Document], 
                            base_output_path: str = "tourism_data", 
-                           organize_by_type: bool = True) -> Dict[str, str]:
+                           organize_by_type: bool = True,
+                           compression: str = "") -> Dict[str, str]:
     """
     Export tourism documents to text files, optionally organizing by document type
     
+    Documents are streamed to one open file per type, so memory use does not
+    grow with the number of documents and a generator can be passed in.
+    
     Args:
-        documents: List of LlamaIndex documents
+        documents: List (or any iterable) of LlamaIndex documents
         base_output_path: Base directory for output files
         organize_by_type: Whether to organize documents by type in separate files
+        compression: "" for plain JSONL, or "gz" / "zst"
         
     Returns:
         Dictionary mapping document types to file paths
     """
     base_path = Path(base_output_path)
     base_path.mkdir(parents=True, exist_ok=True)
+    suffix = f".jsonl.{compression}" if compression else ".jsonl"
     
     output_files = {}
+    counts = {}
+    total = 0
     
-    if organize_by_type:
-        # Group documents by type
-        doc_types = {}
+    with ExitStack() as stack:
+        writers = {}
         for doc in documents:
-            doc_type = doc.metadata.get('doc_type', 'unknown')
-            if doc_type not in doc_types:
-                doc_types[doc_type] = []
-            doc_types[doc_type].append(doc)
-        
-        # Export each document type to a separate file
-        for doc_type, docs in doc_types.items():
-            filename = f"{doc_type}_documents.jsonl"
-            file_path = base_path / filename
-            export_documents_to_file(docs, str(file_path))
-            output_files[doc_type] = str(file_path)
-    else:
-        # Export all documents to a single file
-        file_path = base_path / "all_documents.jsonl"
-        export_documents_to_file(documents, str(file_path))
-        output_files['all'] = str(file_path)
+            doc_type = doc.metadata.get('doc_type', 'unknown') if organize_by_type else 'all'
+            if doc_type not in writers:
+                filename = f"{doc_type}_documents{suffix}" if organize_by_type else f"all_documents{suffix}"
+                file_path = base_path / filename
+                writers[doc_type] = stack.enter_context(open_jsonl(str(file_path), 'wb'))
+                output_files[doc_type] = str(file_path)
+                counts[doc_type] = 0
+            writers[doc_type].write(json_dumps_line({'text': doc.text, 'metadata': doc.metadata, 'id': doc.id_}))
+            counts[doc_type] += 1
+            total += 1
+    
+    for doc_type, file_path in output_files.items():
+        print(f"Exported {counts[doc_type]} documents to {file_path}")
     
     # Create a summary file with document counts
     summary = {
-        'total_documents': len(documents),
-        'document_types': {doc_type: len(docs) for doc_type, docs in doc_types.items()} if organize_by_type else {},
+        'total_documents': total,
+        'document_types': counts if organize_by_type else {},
         'output_files': output_files
     }
     
@@ -129,6 +389,208 @@ def export_tourism_documents(documents: List[Document],
     
     return output_files
 
+# Metadata fields stored as typed columns in the columnar corpus format
+CATEGORICAL_COLUMNS = ("doc_type", "city", "province", "country", "category", "location")
+NUMERIC_COLUMNS = ("price", "rating", "latitude", "longitude", "year", "visitors")
+COLUMNAR_SCHEMA_FILE = "schema.json"
+
+def _to_float(value) -> float:
+    """Numeric metadata value as float ("$1,200" -> 1200.0); NaN when missing or not a number"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace('$', '').replace(',', '').strip())
+        except ValueError:
+            pass
+    return float('nan')
+
+class _ColumnWriter:
+    """Appends values to a raw little-endian column file, converting a chunk at a time"""
+
+    def __init__(self, path: Path, dtype: str, chunk_rows: int = 10_000):
+        self.file = open(path, 'wb')
+        self.dtype = dtype
+        self.chunk_rows = chunk_rows
+        self.pending = []
+
+    def append(self, value):
+        self.pending.append(value)
+        if len(self.pending) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            np.asarray(self.pending, dtype=self.dtype).tofile(self.file)
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+class _StringColumnWriter:
+    """Variable-length UTF-8 column: one bytes file plus int64 end offsets"""
+
+    def __init__(self, directory: Path, name: str):
+        self.data = open(directory / f"{name}.bin", 'wb')
+        self.offsets = _ColumnWriter(directory / f"{name}.offsets.i64", '<i8')
+        self.offsets.append(0)
+        self.position = 0
+
+    def append(self, value: str):
+        encoded = value.encode('utf-8')
+        self.data.write(encoded)
+        self.position += len(encoded)
+        self.offsets.append(self.position)
+
+    def close(self):
+        self.data.close()
+        self.offsets.close()
+
+def write_columnar_corpus(documents: Iterable[Document], output_dir: str) -> int:
+    """
+    Write documents in the columnar corpus format
+    
+    Each column is a raw little-endian file that can be memory-mapped:
+    IDs, text and the full metadata JSON are UTF-8 blobs with an offsets
+    array; CATEGORICAL_COLUMNS are dictionary-encoded int32 codes (-1 when
+    missing) and NUMERIC_COLUMNS are float64 (NaN when missing).
+    schema.json records the row count, dtypes and dictionaries. Documents
+    are written as they arrive, so a generator can be passed in.
+    
+    Args:
+        documents: Any iterable of LlamaIndex documents
+        output_dir: Directory to write the columns into
+        
+    Returns:
+        Number of documents written
+    """
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    
+    strings = {name: _StringColumnWriter(directory, name) for name in ("id", "text", "metadata")}
+    codes = {name: _ColumnWriter(directory / f"{name}.codes.i32", '<i4') for name in CATEGORICAL_COLUMNS}
+    numbers = {name: _ColumnWriter(directory / f"{name}.f64", '<f8') for name in NUMERIC_COLUMNS}
+    dictionaries = {name: {} for name in CATEGORICAL_COLUMNS}
+    count = 0
+    try:
+        for doc in documents:
+            metadata = doc.metadata or {}
+            strings["id"].append(doc.id_)
+            strings["text"].append(doc.text)
+            # Full metadata keeps the export lossless; typed columns are copies for scanning
+            strings["metadata"].append(json_dumps_line(metadata)[:-1].decode('utf-8'))
+            for name in CATEGORICAL_COLUMNS:
+                value = metadata.get(name)
+                if value is None or value == "":
+                    codes[name].append(-1)
+                else:
+                    codes[name].append(dictionaries[name].setdefault(str(value), len(dictionaries[name])))
+            for name in NUMERIC_COLUMNS:
+                numbers[name].append(_to_float(metadata.get(name)))
+            count += 1
+    finally:
+        for writer in (*strings.values(), *codes.values(), *numbers.values()):
+            writer.close()
+    
+    schema = {
+        'count': count,
+        'strings': ["id", "text", "metadata"],
+        'categorical': {name: list(values) for name, values in dictionaries.items()},
+        'numeric': list(NUMERIC_COLUMNS),
+    }
+    with open(directory / COLUMNAR_SCHEMA_FILE, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, indent=2)
+    
+    print(f"Wrote {count} documents in columnar format to {directory}")
+    return count
+
+class ColumnarCorpus:
+    """
+    Read-only view of a corpus written by write_columnar_corpus
+    
+    Every column is memory-mapped, so opening is O(1) regardless of size
+    and scans touch only the columns they use. Documents are only built on
+    request.
+    """
+
+    def __init__(self, corpus_dir: str):
+        self.dir = Path(corpus_dir)
+        with open(self.dir / COLUMNAR_SCHEMA_FILE, 'r', encoding='utf-8') as f:
+            self.schema = json.load(f)
+        self.count = self.schema['count']
+        self.dictionaries = self.schema['categorical']
+        self.columns = {}
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def _map(self, filename: str, dtype: str, length: int) -> np.ndarray:
+        if filename not in self.columns:
+            if length == 0:
+                self.columns[filename] = np.empty(0, dtype=dtype)
+            else:
+                self.columns[filename] = np.memmap(self.dir / filename, dtype=dtype, mode='r', shape=(length,))
+        return self.columns[filename]
+    
+    def _string(self, name: str, row: int) -> str:
+        offsets = self._map(f"{name}.offsets.i64", '<i8', self.count + 1)
+        data = self._map(f"{name}.bin", np.uint8, int(offsets[-1]))
+        return data[offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+    
+    def codes(self, name: str) -> np.ndarray:
+        """Dictionary codes of a categorical column (-1 = missing)"""
+        return self._map(f"{name}.codes.i32", '<i4', self.count)
+    
+    def numeric(self, name: str) -> np.ndarray:
+        """A numeric column as float64 (NaN = missing)"""
+        return self._map(f"{name}.f64", '<f8', self.count)
+    
+    def value_counts(self, name: str) -> Dict[str, int]:
+        """Count rows per value of a categorical column, e.g. documents by doc_type"""
+        codes = self.codes(name)
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.dictionaries[name]))
+        return {value: int(n) for value, n in zip(self.dictionaries[name], counts)}
+    
+    def mask(self, name: str, values: Optional[Iterable[str]] = None,
+             min_value: Optional[float] = None, max_value: Optional[float] = None) -> np.ndarray:
+        """
+        Boolean row mask for a categorical value set or a numeric range
+        
+        Args:
+            name: Column name
+            values: Allowed values of a categorical column
+            min_value: Inclusive lower bound of a numeric column
+            max_value: Inclusive upper bound of a numeric column
+            
+        Returns:
+            Boolean array with one entry per document
+        """
+        if name in self.dictionaries:
+            lookup = {value: code for code, value in enumerate(self.dictionaries[name])}
+            wanted = [lookup[v] for v in (values or []) if v in lookup]
+            return np.isin(self.codes(name), wanted)
+        column = self.numeric(name)
+        mask = ~np.isnan(column)
+        if min_value is not None:
+            mask &= column >= min_value
+        if max_value is not None:
+            mask &= column <= max_value
+        return mask
+    
+    def document(self, row: int) -> Document:
+        """Build the Document stored at a row"""
+        return Document(
+            text=self._string("text", row),
+            metadata=json_loads(self._string("metadata", row)),
+            id_=self._string("id", row)
+        )
+    
+    def iter_documents(self, rows: Optional[Iterable[int]] = None) -> Iterator[Document]:
+        """Yield Documents for the given rows (all rows by default), e.g. np.flatnonzero(mask)"""
+        for row in (range(self.count) if rows is None else rows):
+            yield self.document(int(row))
+
 def export_documents_as_text(documents: List[Document], output_file: str = "tourism_documents.txt") -> str:
     """
     Export documents to a human-readable text file
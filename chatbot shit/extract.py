@@ -1,14 +1,34 @@
+import argparse
 import json
+import os
 import re
-import uuid
+import sys
+import tempfile
+import time
+import unicodedata
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
 from llama_index.core import Document
+from document_process import iter_json_records, json_dumps_line, make_document_id, open_jsonl
+
+# Regular expression to match attraction name from URL pattern
+ATTRACTION_NAME_PATTERN = re.compile(r'AttractionProductDetail-[^-]+-[^-]+-([^-]+)-')
+# The whole name slug, including hyphens, for matching URLs to details
+ATTRACTION_SLUG_PATTERN = re.compile(r'AttractionProductDetail-g\d+-d\d+-(.+)-[^-]+\.html')
+LOCATION_PATTERN = re.compile(r'-([^-]+)_([^_]+)(?:_([^\.]+))?\.html')
+NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+# Minimum trigram Dice similarity for a fuzzy name match
+MATCH_THRESHOLD = 0.8
+# Words a slug may drop or add without changing which attraction it names
+STOP_WORDS = frozenset(["a", "an", "and", "at", "de", "du", "for", "from", "in", "la", "le", "of", "on", "the", "with"])
 
 def extract_attraction_name_from_url(url: str) -> str:
     """Extract the attraction name from TripAdvisor URL."""
-    # Regular expression to match attraction name from URL pattern
-    match = re.search(r'AttractionProductDetail-[^-]+-[^-]+-([^-]+)-', url)
+    match = ATTRACTION_NAME_PATTERN.search(url)
     if match:
         # Replace underscores with spaces and capitalize words
         name = match.group(1).replace('_', ' ').title()
@@ -20,7 +40,7 @@ def extract_location_from_url(url: str) -> Dict[str, str]:
     location = {"country": "", "province": "", "city": ""}
     
     # Pattern: .html","category":"featured_tours_and_tickets"},{"attraction":"https:\/\/tripadvisor.ca\/AttractionProductDetail-g154943-d11450219-Vancouver_City_Sightseeing_Tour-Vancouver_British_Columbia
-    match = re.search(r'-([^-]+)_([^_]+)(?:_([^\.]+))?\.html', url)
+    match = LOCATION_PATTERN.search(url)
     if match:
         location_parts = match.group(0).split('-')
         if len(location_parts) >= 2:
@@ -43,9 +63,6 @@ def create_attraction_document(category_data: Dict[str, Any], details_data: Dict
     Returns:
         A dictionary representing a document for the vector store
     """
-    # Generate a unique ID for the document
-    doc_id = str(uuid.uuid4())
-    
     # Extract information from category data
     attraction_url = category_data.get("attraction", "")
     category = category_data.get("category", "Unknown")
@@ -117,6 +134,9 @@ def create_attraction_document(category_data: Dict[str, Any], details_data: Dict
     # Add URL to text
     text += f"URL: {attraction_url}\n"
     
+    # The URL identifies the attraction, so the ID only changes with its content
+    doc_id = make_document_id("tripadvisor_attraction", attraction_url, text, metadata)
+    
     return {
         "text": text,
         "metadata": metadata,
@@ -132,41 +152,197 @@ def load_json_file(file_path: str) -> List[Dict[str, Any]]:
         print(f"Error loading {file_path}: {e}")
         return []
 
-def match_attractions(categories: List[Dict[str, Any]], details: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
-    """Match attractions from categories with their details based on name similarity."""
-    # Create a dictionary of details by name (normalized)
-    details_by_name = {}
-    for detail in details:
-        name = detail.get("name", "").lower()
-        if name:
-            details_by_name[name] = detail
+def normalize_name(name: str) -> str:
+    """Lowercase a name or slug, drop accents and reduce punctuation and underscores to single spaces."""
+    name = unicodedata.normalize('NFKD', name.lower()).encode('ascii', 'ignore').decode('ascii')
+    return NON_ALPHANUMERIC.sub(' ', name).strip()
+
+def name_trigrams(name: str) -> set:
+    """Character trigrams of a normalized name, padded so short names still have some."""
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def same_word(a: str, b: str) -> bool:
+    """Whether two normalized words are the same, allowing one typo (edit) in words of 5+ letters."""
+    if a == b:
+        return True
+    if min(len(a), len(b)) < 5 or abs(len(a) - len(b)) > 1 or a.isdigit() or b.isdigit():
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    # One substitution, or one insertion into the shorter word
+    return a[i + 1:] == b[i + 1:] if len(a) == len(b) else a[i:] == b[i + 1:]
+
+def words_agree(query: str, candidate: str) -> bool:
+    """
+    Whether every distinguishing word of a fuzzy match lines up.
+    
+    Each word of query must match the next word of candidate, in order
+    (one typo allowed), so a different city, time of day, vehicle, activity
+    or travel direction rejects the match however similar the rest is. Only
+    stop words may be skipped on either side, and candidate words left after
+    the last query word are the tail a truncated slug dropped. The last query
+    word may itself be truncated.
+    """
+    query_words, candidate_words = query.split(), candidate.split()
+    i = j = 0
+    while i < len(query_words):
+        word = query_words[i]
+        if j < len(candidate_words) and (same_word(word, candidate_words[j]) or (
+                i == len(query_words) - 1 and len(word) >= 3 and candidate_words[j].startswith(word))):
+            i, j = i + 1, j + 1
+        elif word in STOP_WORDS:
+            i += 1
+        elif j < len(candidate_words) and candidate_words[j] in STOP_WORDS:
+            j += 1
+        else:
+            return False
+    return True
+
+class NameMatcher:
+    """
+    Index of detail names for fuzzy lookup.
+    
+    Candidates come from a word index: only the postings of the query's
+    rarest words are counted, so each lookup touches a handful of short
+    lists no matter how many names there are, and matching N URLs against
+    M names takes roughly O(N + M) time instead of O(N x M). The
+    best-counted candidates are then scored by character trigram Dice
+    similarity, which tolerates truncated slugs and small spelling changes.
+    A fuzzy candidate must also pass words_agree: trigram similarity alone
+    pairs "Axe Throwing in Hamilton" with "Axe Throwing in Ottawa".
+    """
+    
+    def __init__(self, details: List[Dict[str, Any]], rare_words: int = 4, candidates: int = 10):
+        self.details = []
+        self.names = []
+        self.exact = {}
+        self.postings = {}
+        self.rare_words = rare_words
+        self.candidates = candidates
+        for detail in details:
+            name = normalize_name(detail.get("name", ""))
+            if not name:
+                continue
+            position = len(self.details)
+            self.details.append(detail)
+            self.names.append(name)
+            # Later details win on duplicate names, as with the old name dictionary
+            self.exact[name] = position
+            for word in set(name.split()):
+                self.postings.setdefault(word, []).append(position)
+    
+    def lookup(self, name: str, threshold: float = MATCH_THRESHOLD) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Find the detail whose name is most similar to name.
+        
+        Args:
+            name: Attraction name or URL slug
+            threshold: Minimum trigram Dice similarity, 1.0 for exact matches only
+            
+        Returns:
+            (detail, score), or (None, best score seen) when no candidate whose
+            words agree reaches the threshold
+        """
+        name = normalize_name(name)
+        position = self.exact.get(name)
+        if position is not None:
+            return self.details[position], 1.0
+        if threshold >= 1.0 or not name:
+            return None, 0.0
+        
+        postings = sorted((self.postings[word] for word in set(name.split()) if word in self.postings), key=len)
+        counts = Counter()
+        for posting in postings[:self.rare_words]:
+            counts.update(posting)
+        
+        grams = name_trigrams(name)
+        best, best_score = None, 0.0
+        for position, _ in counts.most_common(self.candidates):
+            if not words_agree(name, self.names[position]):
+                continue
+            candidate = name_trigrams(self.names[position])
+            score = 2 * len(grams & candidate) / (len(grams) + len(candidate))
+            if score > best_score:
+                best, best_score = position, score
+        if best is None or best_score < threshold:
+            return None, best_score
+        return self.details[best], best_score
+
+def url_match_name(url: str) -> str:
+    """The name slug of an attraction URL, for NameMatcher.lookup."""
+    slug = ATTRACTION_SLUG_PATTERN.search(url)
+    return slug.group(1) if slug else extract_attraction_name_from_url(url)
+
+def match_attractions(categories: List[Dict[str, Any]], details: List[Dict[str, Any]],
+                      threshold: float = MATCH_THRESHOLD, stats: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Match attractions from categories with their details based on name similarity.
+    
+    The URL's name slug is looked up in a NameMatcher: exact normalized
+    names first, then the most similar name by character trigrams if it
+    reaches the threshold and all its distinguishing words agree.
+    
+    Args:
+        categories: Category records with an "attraction" URL
+        details: Detail records with a "name"
+        threshold: Minimum similarity for a fuzzy match; 1.0 keeps exact matching only
+        stats: If given, filled with match counts and timings
+        
+    Returns:
+        Dictionary from URL to {"category", "details", "match_score"}; details is None when unmatched
+    """
+    start = time.perf_counter()
+    matcher = NameMatcher(details)
+    indexed = time.perf_counter()
     
     # Match each category with its detail
     matched = {}
     for category in categories:
         url = category.get("attraction", "")
-        # Extract name from URL
-        name_from_url = extract_attraction_name_from_url(url).lower().replace(' ', '_')
-        
-        # Look for matching detail
-        if name_from_url in details_by_name:
-            matched[url] = {
-                "category": category,
-                "details": details_by_name[name_from_url]
-            }
-        else:
-            # No match found, just store category
-            matched[url] = {
-                "category": category,
-                "details": None
-            }
+        detail, score = matcher.lookup(url_match_name(url), threshold)
+        matched[url] = {
+            "category": category,
+            "details": detail,
+            "match_score": round(score, 3)
+        }
     
+    # A URL listed under several categories keeps its last category, as before
+    counts = Counter()
+    used = set()
+    for entry in matched.values():
+        if entry["details"] is None:
+            counts["unmatched"] += 1
+        else:
+            counts["exact" if entry["match_score"] == 1.0 else "fuzzy"] += 1
+            used.add(id(entry["details"]))
+    report = {
+        "categories": len(categories),
+        "urls": len(matched),
+        "exact": counts["exact"],
+        "fuzzy": counts["fuzzy"],
+        "unmatched": counts["unmatched"],
+        "details": len(matcher.details),
+        "details_unused": len(matcher.details) - len(used),
+        "threshold": threshold,
+        "index_seconds": round(indexed - start, 3),
+        "match_seconds": round(time.perf_counter() - indexed, 3),
+    }
+    print(f"Matched {report['exact']} exact and {report['fuzzy']} fuzzy of {report['urls']} attraction URLs "
+          f"({report['unmatched']} unmatched, {report['details_unused']} details unused) "
+          f"in {report['index_seconds'] + report['match_seconds']:.2f}s")
+    if stats is not None:
+        stats.update(report)
     return matched
 
 def create_documents_from_attraction_data(
     categories_file: str, 
     details_file: str, 
-    output_file: str = "attraction_documents.jsonl"
+    output_file: str = "attraction_documents.jsonl",
+    threshold: float = MATCH_THRESHOLD
 ) -> List[Document]:
     """
     Create vector store documents from attraction data files.
@@ -175,6 +351,7 @@ def create_documents_from_attraction_data(
         categories_file: Path to the categories JSON file
         details_file: Path to the details JSON file
         output_file: Path to save the output JSONL file
+        threshold: Minimum similarity for a fuzzy name match
         
     Returns:
         List of LlamaIndex documents
@@ -187,8 +364,7 @@ def create_documents_from_attraction_data(
     print(f"Loaded {len(details)} attraction details from {details_file}")
     
     # Match attractions with their details
-    matched_attractions = match_attractions(categories, details)
-    print(f"Matched {len(matched_attractions)} attractions with their details")
+    matched_attractions = match_attractions(categories, details, threshold)
     
     documents = []
     
@@ -216,11 +392,245 @@ def create_documents_from_attraction_data(
     print(f"Created {len(documents)} documents and saved to {output_file}")
     return documents
 
+# Set in the parent before the pool starts, so forked workers share it
+_MATCHER = None
+
+def _init_matcher(details_files: List[str]):
+    """Pool initializer: build the matcher in workers that were not forked from the parent."""
+    global _MATCHER
+    if _MATCHER is None:
+        _MATCHER = NameMatcher(iter_details(details_files))
+
+def iter_details(details_files: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Stream detail records from several batch files (JSON arrays or JSONL), in order."""
+    return chain.from_iterable(iter_json_records(path) for path in details_files)
+
+def _document_lines(args: Tuple[List[Dict[str, Any]], float]) -> Tuple[bytes, Counter]:
+    """Match and build the documents of one chunk of categories; returns JSONL bytes and match counts."""
+    categories, threshold = args
+    lines = []
+    counts = Counter()
+    for category in categories:
+        detail, score = _MATCHER.lookup(url_match_name(category.get("attraction", "")), threshold)
+        counts["unmatched" if detail is None else "exact" if score == 1.0 else "fuzzy"] += 1
+        lines.append(json_dumps_line(create_attraction_document(category, detail)))
+    return b"".join(lines), counts
+
+def stream_documents_from_attraction_data(
+    categories_file: str,
+    details_files: List[str],
+    output_file: str = "attraction_documents.jsonl",
+    workers: Optional[int] = None,
+    chunk_size: int = 1000,
+    threshold: float = MATCH_THRESHOLD
+) -> Dict[str, Any]:
+    """
+    Create the same documents as create_documents_from_attraction_data, streaming and in parallel.
+    
+    Input files are parsed incrementally and the details may be split over
+    several batch files. Categories are grouped in chunks that a process
+    pool turns into JSONL; at most 2 * workers chunks are in flight and they
+    are written in input order, so the output matches the serial path.
+    
+    The documents are never held in memory, but the details index and one
+    category record per distinct URL are: a URL listed under several
+    categories keeps its last category, which is only known once the whole
+    categories file has been read. On the bundled feed that is 2109 of the
+    3658 category records.
+    
+    Args:
+        categories_file: Path to the categories JSON (or JSONL) file
+        details_files: Paths to the details batch files
+        output_file: Path to the output JSONL file; ".gz" / ".zst" are compressed
+        workers: Number of processes (default: CPU count); 1 runs in this process
+        chunk_size: Categories per task
+        threshold: Minimum similarity for a fuzzy name match
+        
+    Returns:
+        Dictionary with documents, exact, fuzzy, unmatched and seconds
+    """
+    global _MATCHER
+    start = time.perf_counter()
+    details_files = list(details_files)
+    _MATCHER = NameMatcher(iter_details(details_files))
+    
+    # A URL listed under several categories keeps its first position and last category,
+    # so every distinct URL's record is held until the file has been read
+    categories_by_url = {}
+    for category in iter_json_records(categories_file):
+        categories_by_url[category.get("attraction", "")] = category
+    print(f"Indexed {len(_MATCHER.details)} attraction details from {len(details_files)} files "
+          f"and read {len(categories_by_url)} attraction URLs from {categories_file}")
+    
+    values = iter(categories_by_url.values())
+    tasks = iter(lambda: (list(islice(values, chunk_size)), threshold), ([], threshold))
+    workers = workers or os.cpu_count() or 1
+    counts = Counter()
+    with open_jsonl(output_file, 'wb') as f:
+        if workers == 1:
+            for task in tasks:
+                lines, chunk_counts = _document_lines(task)
+                f.write(lines)
+                counts.update(chunk_counts)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_matcher,
+                                     initargs=(details_files,)) as executor:
+                pending = deque()
+                for task in tasks:
+                    pending.append(executor.submit(_document_lines, task))
+                    if len(pending) >= 2 * workers:
+                        lines, chunk_counts = pending.popleft().result()
+                        f.write(lines)
+                        counts.update(chunk_counts)
+                while pending:
+                    lines, chunk_counts = pending.popleft().result()
+                    f.write(lines)
+                    counts.update(chunk_counts)
+    
+    stats = {
+        "documents": sum(counts.values()),
+        "exact": counts["exact"],
+        "fuzzy": counts["fuzzy"],
+        "unmatched": counts["unmatched"],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    print(f"Created {stats['documents']} documents ({stats['exact']} exact, {stats['fuzzy']} fuzzy, "
+          f"{stats['unmatched']} unmatched) in {stats['seconds']:.2f}s and saved to {output_file}")
+    return stats
+
+# Self-test fixtures: detail names and the URL slugs that should (not) match them
+SELF_TEST_DETAILS = [
+    "Vancouver City Sightseeing Tour",
+    "Vancouver to Victoria and Butchart Gardens Tour by Bus",
+    "Montmorency Falls Day Trip from Quebec City",
+    "Café de l'Opéra Walking Tour",
+    "Whistler Bungee Jump",
+    "Axe Throwing and Beer Tasting Experience in Ottawa",
+    "Niagara Falls Morning Bike Tour",
+    "Thousand Islands Sightseeing Tour by Kayak",
+    "Whistler Blackcomb Ski Rental Package",
+    "Private Transfer from Niagara Falls to Hamilton Airport",
+]
+SELF_TEST_CASES = [
+    # (slug, expected detail name or None, kind)
+    ("Vancouver_City_Sightseeing_Tour", "Vancouver City Sightseeing Tour", "exact"),
+    ("Cafe_de_l_Opera_Walking_Tour", "Café de l'Opéra Walking Tour", "exact"),
+    ("Vancouver_to_Victoria_and_Butchart_Gardens_Tour", "Vancouver to Victoria and Butchart Gardens Tour by Bus", "fuzzy"),
+    ("Montmorancy_Falls_Day_Trip_from_Quebec_City", "Montmorency Falls Day Trip from Quebec City", "fuzzy"),
+    ("Whale_Watching_in_Tofino", None, "unmatched"),
+    ("Vancouver_Whale_Watching_Tour", None, "unmatched"),
+    # Trigram-similar names of a different attraction: the near miss must be rejected
+    ("Axe_Throwing_and_Beer_Tasting_Experience_in_Hamilton", "Axe Throwing and Beer Tasting Experience in Ottawa",
+     "rejected"),
+    ("Niagara_Falls_Evening_Bike_Tour", "Niagara Falls Morning Bike Tour", "rejected"),
+    ("Thousand_Islands_Sightseeing_Tour_by_Zodiac_Boat", "Thousand Islands Sightseeing Tour by Kayak", "rejected"),
+    ("Whistler_Blackcomb_Snowboard_Rental_Package", "Whistler Blackcomb Ski Rental Package", "rejected"),
+    ("Private_Transfer_from_Hamilton_Airport_to_Niagara_Falls",
+     "Private Transfer from Niagara Falls to Hamilton Airport", "rejected"),
+]
+
+def self_test(threshold: float = MATCH_THRESHOLD) -> bool:
+    """
+    Check URL-to-detail matching on a small fixed feed.
+    
+    Covers exact (accent and punctuation insensitive), fuzzy (truncated or
+    misspelled slug) and unmatched names, near misses that are trigram
+    similar but name a different attraction, exact-only matching at
+    threshold 1.0, and that the serial and streaming builds produce the
+    same documents.
+    
+    Returns:
+        True when every check passed
+    """
+    details = [{"name": name} for name in SELF_TEST_DETAILS]
+    categories = [
+        {"attraction": f"https://tripadvisor.ca/AttractionProductDetail-g1-d{i}-{slug}-Vancouver_British_Columbia.html",
+         "category": "self_test"}
+        for i, (slug, _, _) in enumerate(SELF_TEST_CASES)
+    ]
+    failures = []
+    
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failures.append(label)
+    
+    matcher = NameMatcher(details)
+    for slug, expected, kind in SELF_TEST_CASES:
+        detail, score = matcher.lookup(slug, threshold)
+        name = detail["name"] if detail else None
+        if kind == "exact":
+            check(f"{kind:<9} {slug} -> {name} ({score:.2f})", name == expected and score == 1.0)
+        elif kind == "fuzzy":
+            check(f"{kind:<9} {slug} -> {name} ({score:.2f})", name == expected and threshold <= score < 1.0)
+            check(f"exact-only {slug} -> unmatched", matcher.lookup(slug, 1.0)[0] is None)
+        elif kind == "rejected":
+            grams, near_miss = name_trigrams(normalize_name(slug)), name_trigrams(normalize_name(expected))
+            similarity = 2 * len(grams & near_miss) / (len(grams) + len(near_miss))
+            # The near miss has to clear the threshold, or the case would not test words_agree
+            check(f"{kind:<9} {slug} (trigram {similarity:.2f} to {expected!r})",
+                  detail is None and similarity >= threshold)
+        else:
+            check(f"{kind:<9} {slug} (best {score:.2f})", detail is None and score < threshold)
+    
+    stats = {}
+    matched = match_attractions(categories, details, threshold, stats)
+    expected_counts = Counter("unmatched" if kind == "rejected" else kind for _, _, kind in SELF_TEST_CASES)
+    check(f"match_attractions counts {stats['exact']}/{stats['fuzzy']}/{stats['unmatched']}",
+          [stats[kind] for kind in ("exact", "fuzzy", "unmatched")] ==
+          [expected_counts[kind] for kind in ("exact", "fuzzy", "unmatched")])
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        categories_file = os.path.join(tmp, "categories.json")
+        details_file = os.path.join(tmp, "details.json")
+        for path, records in ((categories_file, categories), (details_file, details)):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(records, f)
+        serial_file = os.path.join(tmp, "serial.jsonl")
+        stream_file = os.path.join(tmp, "stream.jsonl")
+        create_documents_from_attraction_data(categories_file, details_file, serial_file, threshold)
+        stream_documents_from_attraction_data(categories_file, [details_file], stream_file, workers=1,
+                                              threshold=threshold)
+        with open(serial_file, 'r', encoding='utf-8') as f:
+            serial = [json.loads(line) for line in f]
+        with open(stream_file, 'r', encoding='utf-8') as f:
+            stream = [json.loads(line) for line in f]
+        check(f"stream build matches serial build ({len(stream)} documents)",
+              len(serial) == len(matched) and serial == stream)
+    
+    print(f"{len(failures)} of the checks failed" if failures else "All checks passed")
+    return not failures
+
 def main():
+    parser = argparse.ArgumentParser(description="Create vector store documents from the TripAdvisor attraction feed")
+    parser.add_argument("--categories", default="attractions_cat.json")
+    parser.add_argument("--details", nargs="+", default=["attractions_details_batch1.json"],
+                        help="Details batch files; more than one needs --stream")
+    parser.add_argument("--output", default="attraction_documents.jsonl")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse incrementally and build documents in a process pool")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for --stream (default: CPU count)")
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD, help="Fuzzy name match threshold")
+    parser.add_argument("--self-test", action="store_true",
+                        help="Check exact, fuzzy and unmatched URL matching on a small fixed feed and exit")
+    args = parser.parse_args()
+    
+    if args.self_test:
+        sys.exit(0 if self_test(args.threshold) else 1)
+    
+    if args.stream:
+        stream_documents_from_attraction_data(args.categories, args.details, args.output,
+                                              workers=args.workers, threshold=args.threshold)
+        return
+    if len(args.details) > 1:
+        parser.error("Several --details files need --stream")
+    
     # Example usage
     documents = create_documents_from_attraction_data(
-        "attractions_cat.json",
-        "attractions_details_batch1.json"
+        args.categories,
+        args.details[0],
+        args.output,
+        threshold=args.threshold
     )
     
     # Print sample document
@@ -0,0 +1,289 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+from llama_index.core import Document
+from document_process import content_hash, import_documents_from_file
+
+MANIFEST_FILE = "ingest_manifest.json"
+# Per-doc_type shards, each a storage directory of its own (backend/sharded_index.py)
+SHARDS_DIR = "shards"
+# Files and directories the backend derives from the FAISS index and docstore:
+# mmap_store.py tables, quantized_index.py codes, sharded_index.py router and
+# the lexical_index.py, metadata_index.py and geo_index.py directories. They
+# describe the old node positions, so update_index removes them.
+DERIVED_ARTIFACTS = (
+    "node_ids.npy", "nodes.bin", "node_offsets.npy", "mmap_store.json",
+    "quantized_codes.faiss", "quantized_codes.json", "vectors.f32",
+    "router_centroids.npy", "router.json",
+    "lexical", "metadata", "geo",
+)
+
+def shard_dir(persist_dir: str, doc_type: str) -> str:
+    """Storage directory of the shard holding one doc_type"""
+    return os.path.join(persist_dir, SHARDS_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', doc_type))
+
+def group_by_doc_type(items: List[Any], metadata=lambda item: item.metadata) -> Dict[str, List[Any]]:
+    """Group documents (or nodes / records via `metadata`) by their doc_type, in input order"""
+    groups = {}
+    for item in items:
+        groups.setdefault(metadata(item).get('doc_type') or 'unknown', []).append(item)
+    return groups
+
+def load_manifest(persist_dir: str) -> Dict[str, str]:
+    """
+    Load the ingestion manifest of a storage directory
+
+    Args:
+        persist_dir: Storage directory
+
+    Returns:
+        Dictionary mapping document ID to content hash; empty if there is no manifest
+    """
+    manifest_path = Path(persist_dir) / MANIFEST_FILE
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)['documents']
+
+def save_manifest(persist_dir: str, manifest: Dict[str, str]) -> None:
+    """Write the ingestion manifest of a storage directory"""
+    with open(Path(persist_dir) / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'documents': manifest}, f, indent=2, sort_keys=True)
+
+def plan_update(documents: List[Document], manifest: Dict[str, str]) -> Tuple[List[Document], List[str], List[str]]:
+    """
+    Compare documents to ingest with what the manifest says is already indexed
+
+    Args:
+        documents: Full current set of documents
+        manifest: Document ID -> content hash of the indexed documents
+
+    Returns:
+        (documents to embed, IDs to keep, IDs to delete)
+    """
+    to_add = []
+    to_keep = []
+    current_ids = set()
+    for doc in documents:
+        current_ids.add(doc.id_)
+        if manifest.get(doc.id_) == content_hash(doc.text, doc.metadata):
+            to_keep.append(doc.id_)
+        else:
+            to_add.append(doc)
+    to_delete = [doc_id for doc_id in manifest if doc_id not in current_ids]
+    return to_add, to_keep, to_delete
+
+# File FaissVectorStore.persist writes the FAISS index to inside a storage directory
+VECTOR_STORE_FILE = "default__vector_store.json"
+
+def _read_faiss_index(persist_dir: str):
+    """
+    Read the FAISS index of a storage directory, refusing ones whose vectors cannot be carried over
+
+    Returns:
+        The FAISS index, or None if there is none yet
+    """
+    import faiss
+
+    path = os.path.join(persist_dir, VECTOR_STORE_FILE)
+    if not os.path.exists(path):
+        return None
+    faiss_index = faiss.read_index(path)
+    # Kept vectors are read back from FAISS, which is only exact for full-precision indexes
+    if not isinstance(faiss_index, (faiss.IndexFlat, faiss.IndexIVFFlat, faiss.IndexHNSWFlat)):
+        raise ValueError(f"Cannot carry vectors over from a {type(faiss_index).__name__} in {persist_dir}: "
+                         "its codes are lossy. Rebuild the index from the source documents "
+                         "(e.g. ingest.py --build-index) instead")
+    return faiss_index
+
+def _load_existing_nodes(persist_dir: str, faiss_index, keep_ids: List[str], embed_model) -> List:
+    """Load the indexed nodes of the kept documents with their stored embeddings attached"""
+    import faiss
+    from llama_index.core import StorageContext, load_index_from_storage
+    from llama_index.vector_stores.faiss import FaissVectorStore
+
+    vector_store = FaissVectorStore(faiss_index=faiss_index)
+    storage_context = StorageContext.from_defaults(vector_store=vector_store, persist_dir=persist_dir)
+    index = load_index_from_storage(storage_context=storage_context, embed_model=embed_model)
+
+    if isinstance(faiss_index, faiss.IndexIVF):
+        faiss_index.make_direct_map()
+    vectors = faiss_index.reconstruct_n(0, faiss_index.ntotal)
+    keep = set(keep_ids)
+    nodes = []
+    for position, node_id in index.index_struct.nodes_dict.items():
+        node = index.docstore.get_node(node_id)
+        if node.ref_doc_id in keep:
+            node.embedding = vectors[int(position)].tolist()
+            nodes.append(node)
+    return nodes
+
+def _rebuild_like(template, flat_index):
+    """
+    Rebuild a flat index as the same index type as template, retrained on its vectors
+
+    IVF-Flat keeps its nlist (capped at the number of vectors) and nprobe,
+    HNSW-Flat its M, efConstruction and efSearch. Positions are unchanged, so
+    the index_store stays valid.
+    """
+    import faiss
+
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+    d = flat_index.d
+    if isinstance(template, faiss.IndexIVFFlat):
+        nlist = max(1, min(template.nlist, len(vectors)))
+        index = faiss.index_factory(d, f"IVF{nlist},Flat", template.metric_type)
+        index.nprobe = template.nprobe
+        index.train(vectors)
+    else:
+        index = faiss.IndexHNSWFlat(d, template.hnsw.nb_neighbors(1), template.metric_type)
+        index.hnsw.efConstruction = template.hnsw.efConstruction
+        index.hnsw.efSearch = template.hnsw.efSearch
+    index.add(vectors)
+    return index
+
+def update_index(documents: List[Document],
+                 persist_dir: str = "./storage",
+                 embed_model=None,
+                 chunk_size: int = 8000,
+                 dim: int = 1536) -> Dict[str, int]:
+    """
+    Bring a persisted FAISS index up to date with a set of documents
+
+    Only documents that are new or whose content changed are split and
+    embedded. Nodes of unchanged documents are carried over with the vectors
+    already stored in FAISS (flat, IVF-Flat or HNSW-Flat; lossy IVF-PQ codes
+    are refused), and removed documents are dropped. The index is rebuilt in
+    a temporary directory as the same type it was (IVF-Flat is retrained
+    with its nlist and nprobe, HNSW-Flat rebuilt with its M and ef
+    settings) and then swapped in. The derived
+    artifacts in DERIVED_ARTIFACTS are deleted first, since their node
+    positions no longer match; re-run ann_index.py convert, mmap_store.py
+    export, quantized_index.py build and the lexical_index.py,
+    metadata_index.py and geo_index.py builds afterwards if used.
+
+    Args:
+        documents: Full current set of documents, with IDs from make_document_id
+        persist_dir: Storage directory to update
+        embed_model: Embedding model for new documents
+        chunk_size: Chunk size for splitting new documents
+        dim: Embedding dimension, used when there is no existing index
+
+    Returns:
+        Counts of added, kept and deleted documents and total nodes
+    """
+    import faiss
+    from llama_index.core import StorageContext, VectorStoreIndex
+    from llama_index.core.node_parser import SentenceSplitter
+    from llama_index.vector_stores.faiss import FaissVectorStore
+
+    manifest = load_manifest(persist_dir)
+    to_add, to_keep, to_delete = plan_update(documents, manifest)
+    print(f"{len(to_add)} documents to embed, {len(to_keep)} unchanged, {len(to_delete)} to delete")
+
+    existing_index = _read_faiss_index(persist_dir)
+    kept_nodes = []
+    if to_keep:
+        kept_nodes = _load_existing_nodes(persist_dir, existing_index, to_keep, embed_model)
+        dim = len(kept_nodes[0].embedding) if kept_nodes else dim
+    new_nodes = SentenceSplitter(chunk_size=chunk_size).get_nodes_from_documents(to_add)
+
+    # Build into a scratch directory so a failure leaves the old index intact
+    scratch_dir = tempfile.mkdtemp(prefix="storage_update_", dir=str(Path(persist_dir).resolve().parent))
+    try:
+        vector_store = FaissVectorStore(faiss_index=faiss.IndexFlatL2(dim))
+        storage_context = StorageContext.from_defaults(vector_store=vector_store)
+        index = VectorStoreIndex(kept_nodes + new_nodes, storage_context=storage_context,
+                                 embed_model=embed_model, show_progress=True)
+        index.storage_context.persist(persist_dir=scratch_dir)
+        if existing_index is not None and not isinstance(existing_index, faiss.IndexFlat) and vector_store.client.ntotal:
+            rebuilt = _rebuild_like(existing_index, vector_store.client)
+            faiss.write_index(rebuilt, os.path.join(scratch_dir, VECTOR_STORE_FILE))
+            print(f"Rebuilt as {type(rebuilt).__name__}")
+
+        new_manifest = {doc.id_: content_hash(doc.text, doc.metadata) for doc in documents}
+        save_manifest(scratch_dir, new_manifest)
+
+        Path(persist_dir).mkdir(parents=True, exist_ok=True)
+        removed = []
+        for name in DERIVED_ARTIFACTS:
+            path = os.path.join(persist_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+                removed.append(name)
+            elif os.path.exists(path):
+                os.remove(path)
+                removed.append(name)
+        if removed:
+            print(f"Removed derived artifacts, rebuild them if used: {', '.join(removed)}")
+        for name in os.listdir(scratch_dir):
+            os.replace(os.path.join(scratch_dir, name), os.path.join(persist_dir, name))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    summary = {
+        'added': len(to_add),
+        'kept': len(to_keep),
+        'deleted': len(to_delete),
+        'nodes': len(kept_nodes) + len(new_nodes),
+    }
+    print(f"Updated index in {persist_dir}: {summary}")
+    return summary
+
+def update_shards(documents: List[Document],
+                  persist_dir: str = "./storage",
+                  embed_model=None,
+                  chunk_size: int = 8000,
+                  dim: int = 1536) -> Dict[str, Dict[str, int]]:
+    """
+    Update the per-doc_type shards of a storage directory
+
+    Only the shards of doc types present in documents are touched, and each
+    is updated like a whole index by update_index: passing just the
+    attraction feed refreshes the attraction shard and leaves the statistics
+    shards as they are. Router centroids of a changed shard are rebuilt the
+    next time the backend loads it; re-run metadata_index.py / geo_index.py
+    build, which cover every shard, if filters or proximity queries are used.
+
+    Returns:
+        doc_type -> update_index summary
+    """
+    summaries = {}
+    os.makedirs(os.path.join(persist_dir, SHARDS_DIR), exist_ok=True)
+    for doc_type, group in group_by_doc_type(documents).items():
+        print(f"Shard {doc_type}:")
+        summaries[doc_type] = update_index(group, shard_dir(persist_dir, doc_type), embed_model=embed_model,
+                                           chunk_size=chunk_size, dim=dim)
+    return summaries
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Incrementally update the persisted index from JSONL exports. "
+                    "Documents missing from the inputs are deleted, so any input that is "
+                    "missing or has undecodable lines aborts the update. Flat, IVF-Flat and "
+                    "HNSW-Flat indexes keep their type (IVF is retrained); IVF-PQ is refused.")
+    parser.add_argument("inputs", nargs="+", help="JSONL files written by export_documents_to_file")
+    parser.add_argument("--storage", default="./storage", help="Storage directory to update")
+    parser.add_argument("--chunk-size", type=int, default=8000)
+    parser.add_argument("--sharded", action="store_true",
+                        help="Update storage/shards/<doc_type> for the doc types in the inputs only")
+    args = parser.parse_args()
+
+    from llama_index.embeddings.openai import OpenAIEmbedding
+
+    documents = []
+    for input_file in args.inputs:
+        documents.extend(import_documents_from_file(input_file, strict=True))
+    embed_model = OpenAIEmbedding(model="text-embedding-3-small", embed_batch_size=10)
+    if args.sharded:
+        update_shards(documents, args.storage, embed_model=embed_model, chunk_size=args.chunk_size)
+    else:
+        update_index(documents, args.storage, embed_model=embed_model, chunk_size=args.chunk_size)
+
+if __name__ == "__main__":
+    main()
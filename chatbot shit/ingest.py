@@ -0,0 +1,431 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Iterable, Optional
+
+import numpy as np
+
+from document_process import content_hash, iter_document_dicts
+
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.jsonl"
+STATE_FILE = "state.json"
+
+class OpenAIEmbeddingBackend:
+    """Embeds batches with OpenAI through llama_index, as the notebook does"""
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 1536):
+        from llama_index.embeddings.openai import OpenAIEmbedding
+
+        self.model = model
+        self.dim = dim
+        # Batching and retries are handled by the pipeline, not the client
+        self.client = OpenAIEmbedding(model=model, embed_batch_size=2048, max_retries=0)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.client.get_text_embedding_batch(texts)
+
+class FakeEmbeddingBackend:
+    """
+    Deterministic local embeddings for tests and benchmarks
+
+    Each text maps to a unit vector seeded by its SHA-256, so the same text
+    always gets the same vector. fail_every makes every n-th call raise a
+    rate-limit error to exercise backoff.
+    """
+
+    def __init__(self, dim: int = 1536, latency: float = 0.0, fail_every: int = 0):
+        self.model = "fake"
+        self.dim = dim
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_every and calls % self.fail_every == 0:
+            raise RuntimeError("429 Rate limit reached (fake backend)")
+        return [fake_embedding(text, self.dim) for text in texts]
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector for a text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Best-effort check for a provider rate-limit error"""
+    return "RateLimit" in type(error).__name__ or "429" in str(error) or "rate limit" in str(error).lower()
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that halves on rate limits and creeps back up on success
+
+    Starts at max_concurrency; after a rate-limit error the limit is halved
+    (never below 1) and it grows by one again after every `recover_after`
+    successful batches.
+    """
+
+    def __init__(self, max_concurrency: int, recover_after: int = 10):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.recover_after = recover_after
+        self.active = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, rate_limited: bool = False):
+        with self.condition:
+            self.active -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.successes >= self.recover_after and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+@lru_cache(maxsize=1)
+def _token_encoding():
+    """The tokenizer of the OpenAI embedding models, or None if tiktoken or its data is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(texts: List[str]) -> int:
+    """Count tokens with tiktoken when available, otherwise estimate 4 characters per token"""
+    encoding = _token_encoding()
+    if encoding is None:
+        return sum(len(text) // 4 for text in texts)
+    return sum(len(tokens) for tokens in encoding.encode_batch(texts))
+
+def iter_records(input_files: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream document dicts ({'text', 'metadata', 'id'}) from JSONL files, one line at a time
+
+    Undecodable lines raise: a skipped line would shift every later document
+    and silently leave it out of the index.
+    """
+    for input_file in input_files:
+        yield from iter_document_dicts(input_file, strict=True)
+
+def node_id(doc_id: str, position: int) -> str:
+    """Deterministic ID of the position-th node of a document, so a resumed run makes the same nodes"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{doc_id}#{position}"))
+
+def iter_node_records(input_files: Iterable[str], chunk_size: int = 8000) -> Iterator[Dict[str, Any]]:
+    """
+    Split the documents of JSONL files into checkpoint records, one per node
+
+    Documents are split with SentenceSplitter(chunk_size) like VectorStoreIndex
+    and incremental_index.py do, so all paths index the same nodes.
+
+    Returns:
+        Iterator of {'id': document ID, 'hash': document content hash, 'node': TextNode dict}
+    """
+    from llama_index.core import Document
+    from llama_index.core.node_parser import SentenceSplitter
+
+    splitter = SentenceSplitter(chunk_size=chunk_size, id_func=lambda i, doc: node_id(doc.id_, i))
+    for record in iter_records(input_files):
+        metadata = record.get('metadata', {})
+        doc_hash = content_hash(record['text'], metadata)
+        doc_id = record.get('id') or str(uuid.uuid5(uuid.NAMESPACE_URL, doc_hash))
+        document = Document(text=record['text'], metadata=metadata, id_=doc_id)
+        for node in splitter.get_nodes_from_documents([document]):
+            yield {'id': doc_id, 'hash': doc_hash, 'node': node.to_dict()}
+
+def embed_text(record: Dict[str, Any]) -> str:
+    """Text a node record is embedded with: its text plus metadata, as VectorStoreIndex embeds nodes"""
+    from llama_index.core.schema import MetadataMode, TextNode
+
+    return TextNode.from_dict(record['node']).get_content(metadata_mode=MetadataMode.EMBED)
+
+class Checkpoint:
+    """
+    Append-only record of embedded nodes in a directory
+
+    vectors.f32 holds one float32 row per node and records.jsonl the
+    matching node record. state.json says how many rows are committed; anything
+    past that (a batch half-written when the run died) is truncated on resume.
+    """
+
+    def __init__(self, checkpoint_dir: str, input_files: List[str], dim: int, model: str, chunk_size: int):
+        self.dir = Path(checkpoint_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.committed = 0
+
+        state_path = self.dir / STATE_FILE
+        if state_path.exists():
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if (state['inputs'] != input_files or state['dim'] != dim or state['model'] != model
+                    or state.get('chunk_size') != chunk_size):
+                raise ValueError(f"Checkpoint in {self.dir} was made for different inputs, model or chunk size; "
+                                 f"use another --checkpoint-dir or delete it")
+            self.committed = state['committed']
+        self.state = {'inputs': input_files, 'dim': dim, 'model': model, 'chunk_size': chunk_size}
+        self._truncate()
+
+        self.vectors_file = open(self.dir / VECTORS_FILE, 'ab')
+        self.records_file = open(self.dir / RECORDS_FILE, 'a', encoding='utf-8')
+
+    def _truncate(self):
+        vectors_path = self.dir / VECTORS_FILE
+        with open(vectors_path, 'ab') as f:
+            f.truncate(self.committed * self.dim * 4)
+        records_path = self.dir / RECORDS_FILE
+        kept = 0
+        with open(records_path, 'a+b') as f:
+            f.seek(0)
+            for _ in range(self.committed):
+                if not f.readline():
+                    break
+                kept += 1
+            f.truncate(f.tell())
+        if kept != self.committed:
+            raise ValueError(f"Checkpoint in {self.dir} is corrupt: {kept} records for {self.committed} committed rows")
+
+    def commit(self, records: List[Dict[str, Any]], vectors: List[List[float]]):
+        self.vectors_file.write(np.asarray(vectors, dtype=np.float32).tobytes())
+        for record in records:
+            self.records_file.write(json.dumps(record) + '\n')
+        self.vectors_file.flush()
+        self.records_file.flush()
+        os.fsync(self.vectors_file.fileno())
+        os.fsync(self.records_file.fileno())
+
+        self.committed += len(records)
+        tmp_path = self.dir / (STATE_FILE + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({**self.state, 'committed': self.committed}, f)
+        os.replace(tmp_path, self.dir / STATE_FILE)
+
+    def close(self):
+        self.vectors_file.close()
+        self.records_file.close()
+
+    def load(self):
+        """Return (records, vectors) for everything committed so far"""
+        with open(self.dir / RECORDS_FILE, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in islice(f, self.committed)]
+        vectors = np.fromfile(self.dir / VECTORS_FILE, dtype=np.float32, count=self.committed * self.dim)
+        return records, vectors.reshape(self.committed, self.dim)
+
+def embed_with_retry(backend, texts: List[str], limiter: AdaptiveLimiter,
+                     max_retries: int = 8, base_delay: float = 1.0, max_delay: float = 60.0) -> List[List[float]]:
+    """Embed one batch, backing off exponentially with jitter on errors"""
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        rate_limited = False
+        try:
+            return backend.embed_batch(texts)
+        except Exception as e:
+            rate_limited = is_rate_limit_error(e)
+            if attempt == max_retries:
+                raise
+            error = e
+        finally:
+            limiter.release(rate_limited=rate_limited)
+        delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+        print(f"Embedding batch failed ({error}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+def run_ingestion(input_files: List[str],
+                  backend,
+                  checkpoint_dir: str = "ingest_checkpoint",
+                  batch_size: int = 256,
+                  concurrency: int = 4,
+                  base_delay: float = 1.0,
+                  chunk_size: int = 8000) -> Dict[str, float]:
+    """
+    Embed every node of the documents in the JSONL inputs, resuming from the checkpoint
+
+    Documents are split into nodes by iter_node_records and each node is
+    embedded with its metadata, the same text VectorStoreIndex would embed.
+    Batches run concurrently but are committed strictly in input order, so
+    the checkpoint is always a prefix of the node stream and a restarted run
+    just skips that many nodes.
+
+    Args:
+        input_files: JSONL files written by export_documents_to_file
+        backend: Object with embed_batch(texts), model and dim
+        checkpoint_dir: Directory for the checkpoint
+        batch_size: Nodes per embedding request
+        concurrency: Maximum requests in flight
+        base_delay: First retry delay in seconds
+        chunk_size: SentenceSplitter chunk size
+
+    Returns:
+        Throughput statistics for this run
+    """
+    checkpoint = Checkpoint(checkpoint_dir, list(input_files), backend.dim, backend.model, chunk_size)
+    if checkpoint.committed:
+        print(f"Resuming after {checkpoint.committed} already embedded nodes")
+
+    records = islice(iter_node_records(input_files, chunk_size), checkpoint.committed, None)
+    limiter = AdaptiveLimiter(concurrency)
+    nodes = 0
+    tokens = 0
+    start = time.perf_counter()
+
+    def embed(batch):
+        texts = [embed_text(record) for record in batch]
+        return embed_with_retry(backend, texts, limiter, base_delay=base_delay), count_tokens(texts)
+
+    # Batch number -> (batch, future); at most 2 * concurrency batches are held in memory
+    pending = {}
+    next_submit = 0
+    next_commit = 0
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        exhausted = False
+        while not exhausted or pending:
+            while not exhausted and len(pending) < 2 * concurrency:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    exhausted = True
+                    break
+                pending[next_submit] = (batch, executor.submit(embed, batch))
+                next_submit += 1
+            if not pending:
+                break
+            wait([pending[next_commit][1]], return_when=FIRST_COMPLETED)
+            while next_commit in pending and pending[next_commit][1].done():
+                batch, future = pending.pop(next_commit)
+                vectors, batch_tokens = future.result()
+                checkpoint.commit(batch, vectors)
+                nodes += len(batch)
+                tokens += batch_tokens
+                next_commit += 1
+                elapsed = time.perf_counter() - start
+                print(f"Embedded {checkpoint.committed} nodes "
+                      f"({nodes / elapsed:.1f} nodes/s, {tokens / elapsed:.0f} tokens/s, "
+                      f"concurrency {limiter.limit})")
+    finally:
+        # On failure, drop queued batches instead of embedding them for nothing
+        executor.shutdown(wait=True, cancel_futures=True)
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'nodes': nodes,
+        'tokens': tokens,
+        'seconds': elapsed,
+        'nodes_per_second': nodes / elapsed if elapsed else 0.0,
+        'tokens_per_second': tokens / elapsed if elapsed else 0.0,
+        'total_committed': checkpoint.committed,
+    }
+    print(f"Ingestion finished: {stats}")
+    return stats
+
+def build_index_from_checkpoint(checkpoint_dir: str, persist_dir: str, sharded: bool = False,
+                                doc_types: Optional[List[str]] = None) -> int:
+    """
+    Persist a FAISS index from a finished checkpoint without embedding anything
+
+    Each checkpointed node is indexed with its vector, and the ingestion
+    manifest used by incremental_index.py is written alongside.
+    With sharded, every doc_type gets its own index in
+    <persist_dir>/shards/<doc_type> instead; doc_types limits the build to
+    those shards so the others are left untouched.
+
+    Returns:
+        Number of nodes indexed
+    """
+    import faiss
+    from llama_index.core import MockEmbedding, StorageContext, VectorStoreIndex
+    from llama_index.core.schema import TextNode
+    from llama_index.vector_stores.faiss import FaissVectorStore
+    from incremental_index import group_by_doc_type, save_manifest, shard_dir
+
+    with open(Path(checkpoint_dir) / STATE_FILE, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    dim = state['dim']
+    checkpoint = Checkpoint(checkpoint_dir, state['inputs'], dim, state['model'], state.get('chunk_size'))
+    checkpoint.close()
+    records, vectors = checkpoint.load()
+
+    nodes = []
+    for record, vector in zip(records, vectors):
+        node = TextNode.from_dict(record['node'])
+        node.embedding = vector.tolist()
+        nodes.append(node)
+
+    def persist(target_dir, group):
+        vector_store = FaissVectorStore(faiss_index=faiss.IndexFlatL2(dim))
+        storage_context = StorageContext.from_defaults(vector_store=vector_store)
+        # Every node already has an embedding, so the embedding model is never called
+        index = VectorStoreIndex([node for node, _ in group], storage_context=storage_context,
+                                 embed_model=MockEmbedding(embed_dim=dim))
+        index.storage_context.persist(persist_dir=target_dir)
+        save_manifest(target_dir, {record['id']: record['hash'] for _, record in group})
+        print(f"Indexed {len(group)} nodes into {target_dir}")
+
+    pairs = list(zip(nodes, records))
+    if not sharded:
+        persist(persist_dir, pairs)
+        return len(nodes)
+    indexed = 0
+    for doc_type, group in group_by_doc_type(pairs, metadata=lambda pair: pair[0].metadata).items():
+        if doc_types is None or doc_type in doc_types:
+            persist(shard_dir(persist_dir, doc_type), group)
+            indexed += len(group)
+    return indexed
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable batch embedding of JSONL document exports")
+    parser.add_argument("inputs", nargs="+", help="JSONL files written by export_documents_to_file")
+    parser.add_argument("--checkpoint-dir", default="ingest_checkpoint")
+    parser.add_argument("--backend", choices=["openai", "fake"], default="openai")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=256, help="Nodes per embedding request")
+    parser.add_argument("--chunk-size", type=int, default=8000, help="SentenceSplitter chunk size, as in incremental_index.py")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--build-index", action="store_true", help="Persist a FAISS index when embedding finishes")
+    parser.add_argument("--storage", default="./storage", help="Where --build-index persists the index")
+    parser.add_argument("--sharded", action="store_true",
+                        help="With --build-index, write one index per doc_type under <storage>/shards")
+    parser.add_argument("--doc-types", nargs="+", default=None,
+                        help="With --sharded, only (re)build the shards of these doc types")
+    args = parser.parse_args()
+
+    if args.backend == "fake":
+        backend = FakeEmbeddingBackend(dim=args.dim)
+    else:
+        backend = OpenAIEmbeddingBackend(model=args.model, dim=args.dim)
+
+    run_ingestion(args.inputs, backend, args.checkpoint_dir,
+                  batch_size=args.batch_size, concurrency=args.concurrency, chunk_size=args.chunk_size)
+    if args.build_index:
+        build_index_from_checkpoint(args.checkpoint_dir, args.storage, sharded=args.sharded,
+                                    doc_types=args.doc_types)
+
+if __name__ == "__main__":
+    main()
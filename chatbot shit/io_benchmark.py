@@ -0,0 +1,209 @@
+import argparse
+import json
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from llama_index.core import Document
+from document_process import (ColumnarCorpus, export_tourism_documents, import_documents_from_file,
+                              iter_document_dicts, iter_documents, orjson, parallel_iter_document_dicts,
+                              write_columnar_corpus, write_documents)
+from extract import create_documents_from_attraction_data, stream_documents_from_attraction_data
+
+DOC_TYPES = ["attraction", "city", "place", "monument"]
+
+def synthetic_documents(count: int, seed: int = 0) -> Iterator[Document]:
+    """Generate attraction-like documents of about 1 KB each"""
+    rng = random.Random(seed)
+    words = ["museum", "park", "tour", "garden", "historic", "river", "market", "temple", "beach", "view"]
+    for i in range(count):
+        text = f"Name: Attraction {i}\n" + " ".join(rng.choice(words) for _ in range(150))
+        metadata = {
+            "doc_type": DOC_TYPES[i % len(DOC_TYPES)],
+            "name": f"Attraction {i}",
+            "city": f"City {i % 500}",
+            "price": round(rng.uniform(0, 300), 2),
+            "rating": round(rng.uniform(1, 5), 1),
+            "latitude": rng.uniform(-60, 70),
+            "longitude": rng.uniform(-180, 180),
+        }
+        yield Document(text=text, metadata=metadata, id_=f"doc-{i}")
+
+def write_attraction_feed(count: int, workdir: Path, seed: int = 0) -> None:
+    """
+    Write a TripAdvisor-like feed: attractions_cat.json plus the details as one
+    file (details.json, for the serial path) and as two batch files.
+    """
+    rng = random.Random(seed)
+    words = ["museum", "park", "tour", "garden", "historic", "river", "market", "temple", "beach", "view"]
+    categories, details = [], []
+    for i in range(count):
+        name = "_".join(rng.choice(words) for _ in range(3)) + f"_{i}"
+        slug = name.replace("_", " ").title().replace(" ", "_")
+        categories.append({
+            "attraction": f"https://tripadvisor.ca/AttractionProductDetail-g{i % 500}-d{i}-{slug}-City_{i % 500}.html",
+            "category": rng.choice(["featured_tours_and_tickets", "day_trips", "food_and_drink"]),
+        })
+        details.append({
+            "attraction_id": i, "name": name, "country": "canada", "province": f"province_{i % 13}",
+            "city": f"city_{i % 500}", "location": {"lat": rng.uniform(42, 70), "lng": rng.uniform(-140, -52)},
+            "price": round(rng.uniform(0, 300), 2), "rating": round(rng.uniform(1, 5), 1),
+        })
+    half = count // 2
+    for name, records in [("attractions_cat.json", categories), ("details.json", details),
+                          ("details_batch1.json", details[:half]), ("details_batch2.json", details[half:])]:
+        with open(workdir / name, 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+
+def _legacy_import_documents(input_file: str) -> List[Document]:
+    """The original import_documents_from_file: stdlib json into a full list"""
+    documents = []
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            doc_dict = json.loads(line.strip())
+            documents.append(Document(text=doc_dict['text'], metadata=doc_dict.get('metadata', {}),
+                                      id_=doc_dict.get('id')))
+    return documents
+
+def _legacy_export_tourism_documents(documents: List[Document], base_path: Path) -> None:
+    """The original export_tourism_documents: group everything by type in memory, then write"""
+    doc_types = {}
+    for doc in documents:
+        doc_types.setdefault(doc.metadata.get('doc_type', 'unknown'), []).append(doc)
+    base_path.mkdir(parents=True, exist_ok=True)
+    for doc_type, docs in doc_types.items():
+        with open(base_path / f"{doc_type}_documents.jsonl", 'w', encoding='utf-8') as f:
+            for doc in docs:
+                f.write(json.dumps({'text': doc.text, 'metadata': doc.metadata, 'id': doc.id_}) + '\n')
+
+def run_case(case: str, workdir: Path, count: int, workers: int) -> int:
+    """Run one benchmark case and return the number of documents it processed"""
+    corpus = str(workdir / "corpus.jsonl")
+    if case == "import_legacy":
+        return len(_legacy_import_documents(corpus))
+    if case == "import_list":
+        return len(import_documents_from_file(corpus))
+    if case == "stream_json":
+        return sum(1 for _ in iter_documents(corpus, loads=json.loads))
+    if case == "stream_fast":
+        return sum(1 for _ in iter_documents(corpus))
+    if case == "stream_dicts":
+        return sum(1 for _ in iter_document_dicts(corpus))
+    if case == "stream_gzip":
+        return sum(1 for _ in iter_documents(str(workdir / "corpus.jsonl.gz")))
+    if case == "parallel_dicts":
+        return sum(1 for _ in parallel_iter_document_dicts(corpus, workers=workers))
+    if case == "scan_jsonl":
+        # Count documents by doc_type and those rated 4.5+, the way it is done without columns
+        by_type, rated = {}, 0
+        for record in iter_document_dicts(corpus):
+            doc_type = record['metadata'].get('doc_type')
+            by_type[doc_type] = by_type.get(doc_type, 0) + 1
+            rated += record['metadata'].get('rating', 0) >= 4.5
+        return sum(by_type.values())
+    if case == "scan_columnar":
+        columnar = ColumnarCorpus(str(workdir / "corpus_columnar"))
+        by_type = columnar.value_counts("doc_type")
+        rated = int(columnar.mask("rating", min_value=4.5).sum())
+        return sum(by_type.values())
+    if case == "columnar_documents":
+        return sum(1 for _ in ColumnarCorpus(str(workdir / "corpus_columnar")).iter_documents())
+    if case == "export_legacy":
+        documents = list(synthetic_documents(count))
+        _legacy_export_tourism_documents(documents, workdir / "export_legacy")
+        return len(documents)
+    if case == "export_stream":
+        files = export_tourism_documents(synthetic_documents(count), str(workdir / "export_stream"))
+        return sum(1 for path in files.values() for _ in open(path, 'rb'))
+    if case == "extract_serial":
+        return len(create_documents_from_attraction_data(
+            str(workdir / "attractions_cat.json"), str(workdir / "details.json"), str(workdir / "extract_serial.jsonl")))
+    if case == "extract_stream":
+        stats = stream_documents_from_attraction_data(
+            str(workdir / "attractions_cat.json"),
+            [str(workdir / "details_batch1.json"), str(workdir / "details_batch2.json")],
+            str(workdir / "extract_stream.jsonl"), workers=workers)
+        return stats["documents"]
+    raise ValueError(f"Unknown case {case!r}")
+
+EXTRACT_CASES = ["extract_serial", "extract_stream"]
+CASES = ["import_legacy", "import_list", "stream_json", "stream_fast", "stream_dicts",
+         "stream_gzip", "parallel_dicts", "scan_jsonl", "scan_columnar", "columnar_documents",
+         "export_legacy", "export_stream", *EXTRACT_CASES]
+
+def benchmark(count: int, workers: int, cases: List[str]) -> List[Dict]:
+    """
+    Write a synthetic corpus and time each case in a fresh process.
+
+    Returns:
+        One dict per case with documents, seconds, docs_per_second and peak_rss_mb
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="io_benchmark_"))
+    try:
+        write_documents(synthetic_documents(count), str(workdir / "corpus.jsonl"))
+        write_documents(synthetic_documents(count), str(workdir / "corpus.jsonl.gz"))
+        write_columnar_corpus(synthetic_documents(count), str(workdir / "corpus_columnar"))
+        size_mb = (workdir / "corpus.jsonl").stat().st_size / 2**20
+        print(f"Corpus: {count} documents, {size_mb:.1f} MB (orjson {'on' if orjson else 'off'})")
+        if any(case in EXTRACT_CASES for case in cases):
+            write_attraction_feed(count, workdir)
+
+        results = []
+        for case in cases:
+            output = subprocess.run(
+                [sys.executable, __file__, "_case", case, "--workdir", str(workdir),
+                 "--count", str(count), "--workers", str(workers)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result["case"] = case
+            result["docs_per_second"] = result["documents"] / result["seconds"]
+            results.append(result)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSONL document import/export: docs/s and peak RSS")
+    subparsers = parser.add_subparsers(dest="command")
+
+    child = subparsers.add_parser("_case")
+    child.add_argument("case", choices=CASES)
+    child.add_argument("--workdir", required=True)
+    child.add_argument("--count", type=int, required=True)
+    child.add_argument("--workers", type=int, default=4)
+
+    parser.add_argument("--count", type=int, default=100_000, help="Number of synthetic documents")
+    parser.add_argument("--workers", type=int, default=4, help="Processes for parallel_dicts and extract_stream")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--output", default=None, help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.command == "_case":
+        start = time.perf_counter()
+        documents = run_case(args.case, Path(args.workdir), args.count, args.workers)
+        seconds = time.perf_counter() - start
+        # ru_maxrss is in kB on Linux; children of parallel cases are counted separately
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        print(json.dumps({"documents": documents, "seconds": seconds,
+                          "peak_rss_mb": peak_kb / 1024, "peak_child_rss_mb": children_kb / 1024}))
+        return
+
+    results = benchmark(args.count, args.workers, args.cases)
+    print(f"{'case':<20} {'docs':>9} {'seconds':>9} {'docs/s':>10} {'peak MB':>9} {'child MB':>9}")
+    for r in results:
+        print(f"{r['case']:<20} {r['documents']:>9} {r['seconds']:>9.2f} {r['docs_per_second']:>10.0f} "
+              f"{r['peak_rss_mb']:>9.1f} {r['peak_child_rss_mb']:>9.1f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()